@@ -1,5 +1,11 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from functools import lru_cache
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,17 +15,157 @@ POSTGRES_PASSWORD = os.getenv('POSTGRES_PASSWORD')
 POSTGRES_HOSTNAME = os.getenv('POSTGRES_HOSTNAME')
 POSTGRES_PORT = os.getenv('POSTGRES_PORT')
 POSTGRES_DATABASE = os.getenv('POSTGRES_DATABASE')
-DATABASE_URL = f"postgresql+psycopg2://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOSTNAME}:{POSTGRES_PORT}/{POSTGRES_DATABASE}"
+# psycopg2 (default) or psycopg, the psycopg 3 driver, which can prepare statements server-side
+POSTGRES_DRIVER = os.getenv("POSTGRES_DRIVER", "psycopg2")
+# DATABASE_URL, when set, replaces the POSTGRES_* settings (e.g. sqlite:///data.db)
+DATABASE_URL = os.getenv("DATABASE_URL") or (
+    f"postgresql+{POSTGRES_DRIVER}://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOSTNAME}:{POSTGRES_PORT}/{POSTGRES_DATABASE}"
+)
+# Comma-separated URLs of read replicas; the stats endpoints read from them
+DATABASE_READ_URLS = [url.strip() for url in os.getenv("DATABASE_READ_URLS", "").split(",") if url.strip()]
 APP_ENV = os.getenv("APP_ENV", "production")
 
-engine = create_engine(DATABASE_URL, echo=(APP_ENV == "development"))
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits for a connection."""
 
-def get_session(engine=engine):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wait_lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            with self._wait_lock:
+                self.checkouts += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+def env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    return default if value is None else value.strip().lower() in ("1", "true", "yes", "on")
+
+def pool_options_from_env() -> dict:
+    """Connection pool settings for create_engine(), overridable per deployment."""
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": env_bool("DB_POOL_PRE_PING", True),
+    }
+
+def connect_args_from_env(driver: str = POSTGRES_DRIVER) -> dict:
+    """
+    Driver connection arguments. psycopg 3 turns a statement into a server-side
+    prepared statement once a connection has run it DB_PREPARE_THRESHOLD times
+    (unset or negative disables); the stats queries always send the same SQL,
+    so they are parsed and planned once per connection. psycopg2 cannot prepare.
+    SQLite connections are shared by the request threads through the pool.
+    """
+    if driver == "pysqlite":
+        return {"check_same_thread": False}
+    if driver != "psycopg":
+        return {}
+    threshold = int(os.getenv("DB_PREPARE_THRESHOLD", "5"))
+    return {"prepare_threshold": threshold if threshold >= 0 else None}
+
+def pool_status(pool) -> dict:
+    """Occupancy and checkout wait figures of an engine's pool, for sizing pools per worker."""
+    status = {"pool_class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            status[name] = getattr(pool, name)()
+    if hasattr(pool, "timeout"):
+        status["timeout"] = pool.timeout()
+    if isinstance(pool, InstrumentedQueuePool):
+        status["checkouts"] = pool.checkouts
+        status["wait_seconds_total"] = round(pool.wait_seconds_total, 6)
+        status["wait_seconds_max"] = round(pool.wait_seconds_max, 6)
+        status["wait_seconds_avg"] = round(pool.wait_seconds_total / pool.checkouts, 6) if pool.checkouts else 0.0
+    return status
+
+@lru_cache(maxsize=None)
+def get_engine():
+    """
+    The application engine, built on the first call. app.main makes that call
+    when it creates its module-level app, at import; tools that only import
+    this module, and apps given engine_override, never load the driver or read
+    the pool settings. Building the engine opens no connection.
+    """
+    url = make_url(DATABASE_URL)
+    engine = create_engine(
+        url, echo=(APP_ENV == "development"), connect_args=connect_args_from_env(url.get_driver_name()), **pool_options_from_env()
+    )
+    # SQLite from DATABASE_URL gets the embedded-backend pragmas (WAL, ...)
+    return set_sqlite_pragmas(engine) if url.get_backend_name() == "sqlite" else engine
+
+@lru_cache(maxsize=None)
+def get_read_engines() -> tuple:
+    """Engines of DATABASE_READ_URLS, each with its own pool (same DB_POOL_* settings)."""
+    engines = []
+    for read_url in DATABASE_READ_URLS:
+        url = make_url(read_url)
+        engine = create_engine(url, connect_args=connect_args_from_env(url.get_driver_name()), **pool_options_from_env())
+        engines.append(set_sqlite_pragmas(engine) if url.get_backend_name() == "sqlite" else engine)
+    return tuple(engines)
+
+def __getattr__(name):
+    # `app.database.engine` still works, and builds the engine on first access
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def get_session(engine=None):
     """Yield a session for FastAPI dependency injection."""
     def _get_session():
-        with Session(engine) as session:
+        with Session(engine or get_engine()) as session:
             yield session
     return _get_session
 
-def create_db_and_tables(engine=engine):
-    SQLModel.metadata.create_all(engine)
\ No newline at end of file
+def create_db_and_tables(engine=None, partition_hires: bool | None = None):
+    """
+    Create missing tables. A one-time step: app.serve runs it once before
+    starting the workers, which then skip it (DB_CREATE_SCHEMA=false).
+
+    With `partition_hires` (default: HIRES_PARTITIONING=year) a new
+    hiredemployee is created partitioned by year, see app.utils.partitions.
+    """
+    engine = engine or get_engine()
+    if partition_hires is None:
+        partition_hires = os.getenv("HIRES_PARTITIONING", "").lower() == "year"
+    if partition_hires:
+        from app.utils.partitions import create_partitioned_hires
+        create_partitioned_hires(engine)
+    SQLModel.metadata.create_all(engine)
+
+def set_sqlite_pragmas(engine, journal_mode="WAL", synchronous="NORMAL", cache_size=-64000, temp_store="MEMORY"):
+    """
+    Apply connection pragmas to every new SQLite connection of `engine`.
+
+    The defaults suit SQLite as an embedded backend: WAL lets readers run while
+    an upload writes, synchronous=NORMAL is durable under WAL, a negative
+    cache_size is in KiB. Pass None to leave a pragma at SQLite's default.
+    """
+    pragmas = {
+        "journal_mode": journal_mode,
+        "synchronous": synchronous,
+        "cache_size": cache_size,
+        "temp_store": temp_store,
+    }
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            if value is not None:
+                cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return engine
@@ -1,34 +1,199 @@
 import app.database as app_db
 from fastapi import FastAPI
-from app.routes import upload, stats
-from app.utils import upsert_postgres, stats_postgres
+from app.routes import upload, stats, internal, metrics
+from app.utils import stats_sql
+from app.utils.ingest import DEFAULT_CHUNK_BYTES
+from app.utils.cache import StatsCache
+from app.utils.export import ORJSONResponse
+from app.utils.jobs import IngestionJobs
+from app.utils.metrics import MetricsMiddleware, instrument_engine
+from app.utils.replicas import ReadRouter
+from app.utils.warmup import warm
+import os
+import tempfile
+import threading
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from sqlalchemy.orm import sessionmaker
 from sqlmodel import Session
 
-def create_app(engine_override=None, stats_function=None, upsert_function=None) -> FastAPI:
-    # Decide which engine to use
-    engine = engine_override or app_db.engine
+def create_app(
+    engine_override=None,
+    stats_function=None,
+    upsert_function=None,
+    upload_chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    stats_cache_size: int = 256,
+    stats_cache_ttl: float | None = None,
+    parse_executor: str = "process",
+    parse_workers: int = 2,
+    write_workers: int = 4,
+    max_pending_chunks: int = 2,
+    max_concurrent_uploads: int = 4,
+    upload_wait_timeout: float | None = 30,
+    job_workers: int = 2,
+    job_spool_dir: str | None = None,
+    slow_query_threshold_ms: float | None = None,
+    check_references: bool = True,
+    create_schema: bool | None = None,
+    warmup: bool = True,
+    read_engines=None,
+    replica_retry_after: float = 5.0,
+    generation_poll_interval: float | None = None,
+) -> FastAPI:
+    # Decide which engines to use: uploads write to `engine`, stats read from
+    # `read_engines` (DATABASE_READ_URLS for the default engine) when there are any
+    engine = engine_override or app_db.get_engine()
+    if read_engines is None:
+        read_engines = () if engine_override is not None else app_db.get_read_engines()
 
     @asynccontextmanager
     async def lifespan(app):
-        app_db.create_db_and_tables(engine)
+        # Schema creation is a deployment step; app.serve runs it once and
+        # sets DB_CREATE_SCHEMA=false so its workers skip it
+        if create_schema if create_schema is not None else app_db.env_bool("DB_CREATE_SCHEMA", True):
+            await asyncio.to_thread(app_db.create_db_and_tables, engine)
+        # CSV parsing is CPU-bound and goes to a process pool by default;
+        # DB writes release the GIL and share a bounded thread pool
+        executor_class = ProcessPoolExecutor if parse_executor == "process" else ThreadPoolExecutor
+        app.state.parse_executor = executor_class(max_workers=parse_workers)
+        app.state.write_executor = ThreadPoolExecutor(max_workers=write_workers, thread_name_prefix="upload-write")
+        app.state.upload_slots = asyncio.Semaphore(max_concurrent_uploads)
+        await app.state.ingestion_jobs.start()
+        # The data as of startup is what the stats will load
+        app.state.data_generation = await asyncio.to_thread(app.state.read_router.poll)
+        # Open the pool's connections and compile the stats queries before serving
+        if warmup:
+            await asyncio.to_thread(warm, [engine, *read_engines], app.state.stats_function)
         yield
+        await app.state.ingestion_jobs.stop()
+        app.state.parse_executor.shutdown(cancel_futures=True)
+        app.state.write_executor.shutdown(cancel_futures=True)
     
-    app = FastAPI(lifespan=lifespan)
+    app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+    app.add_middleware(MetricsMiddleware)
+
+    # Per-statement timings; statements over the threshold also go to the app.slow_query log
+    if slow_query_threshold_ms is None and os.getenv("SLOW_QUERY_THRESHOLD_MS"):
+        slow_query_threshold_ms = float(os.getenv("SLOW_QUERY_THRESHOLD_MS"))
+    for instrumented in (engine, *read_engines):
+        instrument_engine(
+            instrumented, slow_query_threshold=None if slow_query_threshold_ms is None else slow_query_threshold_ms / 1000
+        )
 
     # Include routers
     app.include_router(stats.router, prefix="/stats", tags=["stats"])
     app.include_router(upload.router, prefix="/upload", tags=["upload"])
+    app.include_router(internal.router, prefix="/internal", tags=["internal"])
+    app.include_router(metrics.router, tags=["internal"])
 
-    # Utils (default: Postgres, can override with SQLite in tests)
+    # Utils (default: Postgres upserts; the SQL stats queries also run on SQLite)
+    app.state.engine = engine
     app.state.sessionmaker = sessionmaker(
         bind=engine, class_=Session, expire_on_commit=False
     )
-    app.state.stats_function = stats_function or stats_postgres
-    utils_module = upsert_function or upsert_postgres
-    app.state.upsert_dataframe = lambda df, model, **kw: utils_module.upsert_dataframe(
-        df, model, engine=engine, **kw
+    app.state.stats_function = stats_function or stats_sql
+    # Stats sessions: a replica that has this process's writes, else the primary.
+    # Other processes' writes are looked for every generation_poll_interval
+    # seconds (GENERATION_POLL_INTERVAL, default 1)
+    if generation_poll_interval is None:
+        generation_poll_interval = float(os.getenv("GENERATION_POLL_INTERVAL", "1"))
+    app.state.read_router = ReadRouter(
+        engine, read_engines, app.state.sessionmaker,
+        retry_after=replica_retry_after, poll_interval=generation_poll_interval,
+    )
+    # Cached stats responses, invalidated by every upsert (of any process) and
+    # expired after stats_cache_ttl seconds (STATS_CACHE_TTL, default 60; 0 disables caching)
+    if stats_cache_ttl is None:
+        stats_cache_ttl = float(os.getenv("STATS_CACHE_TTL", "60"))
+    app.state.stats_cache = StatsCache(maxsize=stats_cache_size, ttl=stats_cache_ttl) if stats_cache_size and stats_cache_ttl else None
+
+    def utils_module():
+        # The default upsert module, for the engine's dialect, is imported on
+        # first use: it needs pandas
+        if upsert_function is not None:
+            return upsert_function
+        if engine.dialect.name == "sqlite":
+            from app.utils import upsert_sqlite
+            return upsert_sqlite
+        from app.utils import upsert_postgres
+        return upsert_postgres
+
+    # Generation the stats held by this process (cache, stats_inmemory snapshot) reflect
+    app.state.data_generation = 0
+    generation_lock = threading.Lock()
+
+    def record_write():
+        generation = app.state.read_router.record_write()
+        with generation_lock:
+            # Only this process's write since the last one seen: nothing to reload
+            if generation == app.state.data_generation + 1:
+                app.state.data_generation = generation
+        if app.state.stats_cache is not None:
+            app.state.stats_cache.bump()
+
+    def sync_generation():
+        """Drop the stats this process holds once another process has changed the data."""
+        generation = app.state.read_router.poll()
+        with generation_lock:
+            if generation <= app.state.data_generation:
+                return
+            app.state.data_generation = generation
+        if app.state.stats_cache is not None:
+            app.state.stats_cache.bump()
+        after_external_write = getattr(app.state.stats_function, "after_external_write", None)
+        if after_external_write is not None:
+            # Stats answered from the old copy meanwhile are dropped again once the new one is in
+            stats_cache = app.state.stats_cache
+            after_external_write(engine, on_reload=stats_cache.bump if stats_cache is not None else None)
+
+    app.state.sync_generation = sync_generation
+
+    def upsert_dataframe(df, model, **kw):
+        result = utils_module().upsert_dataframe(df, model, engine=engine, **kw)
+        # Only writes that changed rows reach the stats layers (upserts that
+        # report no counts are assumed to have changed something)
+        if result is None or result["inserted"] or result["updated"]:
+            # Stats backends holding their own copy of the data (stats_inmemory) fold in committed rows
+            after_upsert = getattr(app.state.stats_function, "after_upsert", None)
+            if after_upsert is not None:
+                after_upsert(df, model, engine)
+            record_write()
+        return result
+
+    def delete_missing(model, keep_ids):
+        deleted = utils_module().delete_missing(model, keep_ids, engine=engine)
+        if len(deleted):
+            after_delete = getattr(app.state.stats_function, "after_delete", None)
+            if after_delete is not None:
+                after_delete(deleted, model, engine)
+            record_write()
+        return len(deleted)
+
+    app.state.upsert_dataframe = upsert_dataframe
+    # Full snapshot uploads (?delete_missing=true) delete the rows they no longer contain
+    app.state.delete_missing = delete_missing
+    # Upload pipeline: bytes per parsed chunk, parsed chunks allowed to queue
+    # for the writer, and how long an upload waits for one of the upload slots
+    app.state.upload_chunk_bytes = upload_chunk_bytes
+    app.state.max_pending_chunks = max_pending_chunks
+    app.state.upload_wait_timeout = upload_wait_timeout
+
+    # Hires naming an unknown department or job are rejected unless checks are off
+    def load_reference_ids(model):
+        from app.utils import schema
+        with engine.connect() as connection:
+            return schema.load_reference_ids(connection, model)
+
+    app.state.load_reference_ids = load_reference_ids if check_references else None
+    # Uploads sent with ?async=true are spooled to disk and processed by job workers;
+    # the default spool directory is local, so only workers on this host can resume them
+    app.state.ingestion_jobs = IngestionJobs(
+        app.state,
+        workers=job_workers,
+        spool_dir=job_spool_dir
+        or os.getenv("INGESTION_SPOOL_DIR")
+        or os.path.join(tempfile.gettempdir(), "employee-analytics-uploads"),
     )
 
     return app
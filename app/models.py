@@ -1,12 +1,23 @@
 from sqlmodel import SQLModel, Field
-from datetime import datetime
+from sqlalchemy import Index
+from datetime import datetime, timezone
 
 class HiredEmployee(SQLModel, table=True):
+    __table_args__ = (
+        # Serves the year-range filter of every stats query; carries the join keys
+        # (and id on Postgres) so those queries can be answered from the index alone
+        Index(
+            "ix_hiredemployee_datetime_department_id_job_id",
+            "datetime", "department_id", "job_id",
+            postgresql_include=["id"],
+        ),
+    )
+
     id: int = Field(primary_key=True)
     name: str | None
     datetime: datetime | None
-    department_id: int | None
-    job_id: int | None
+    department_id: int | None = Field(default=None, index=True)
+    job_id: int | None = Field(default=None, index=True)
 
 class Department(SQLModel, table=True):
     id: int = Field(primary_key=True)
@@ -14,4 +25,42 @@ class Department(SQLModel, table=True):
 
 class Job(SQLModel, table=True):
     id: int = Field(primary_key=True)
-    job: str | None
\ No newline at end of file
+    job: str | None
+
+class HiredEmployeeQuarterly(SQLModel, table=True):
+    """Hire counts per (year, quarter, department, job), kept in step with HiredEmployee by the upserts."""
+    year: int = Field(primary_key=True)
+    quarter: int = Field(primary_key=True)
+    department_id: int = Field(primary_key=True)
+    job_id: int = Field(primary_key=True)
+    hired_count: int = 0
+
+
+class IngestionJob(SQLModel, table=True):
+    """An upload accepted with ?async=true, processed by the in-process job workers."""
+    id: str = Field(primary_key=True)
+    table: str
+    state: str = Field(default="queued", index=True)  # queued | running | succeeded | failed
+    owner: str | None = None  # the IngestionJobs instance that claimed the job
+    heartbeat_at: datetime | None = None  # refreshed by the owner while the job runs
+    file_path: str | None = None
+    rows_processed: int = 0
+    rows_rejected: int = 0
+    rows_inserted: int = 0
+    rows_updated: int = 0
+    rows_unchanged: int = 0
+    rows_deleted: int = 0
+    delete_missing: bool = False
+    rows_per_sec: float | None = None
+    error: str | None = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class DataGeneration(SQLModel, table=True):
+    """
+    Counter bumped on the primary after every committed upload change. It
+    replicates like any other row, so a replica that has it has the data too.
+    """
+    id: int = Field(default=1, primary_key=True)
+    generation: int = 0
@@ -5,5 +5,7 @@ API routes package.
 
 from .upload import router as upload_router
 from .stats import router as stats_router
+from .internal import router as internal_router
+from .metrics import router as metrics_router
 
-__all__ = ["upload_router", "stats_router"]
\ No newline at end of file
+__all__ = ["upload_router", "stats_router", "internal_router", "metrics_router"]
\ No newline at end of file
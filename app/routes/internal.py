@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Request
+from app.database import pool_status
+
+router = APIRouter()
+
+@router.get("/pool")
+def get_pool_status(request: Request):
+    status = pool_status(request.app.state.engine.pool)
+    replicas = request.app.state.read_router.status()
+    if replicas:
+        status["replicas"] = replicas
+    return status
@@ -1,5 +1,9 @@
-from fastapi import APIRouter, Request, Depends
+from typing import Literal
+from fastapi import APIRouter, Request, Depends, Response, Path, Query, HTTPException
 from sqlmodel import Session
+from app.utils.cache import CachedBody, strong_etag
+from app.utils.export import MEDIA_TYPES, ORJSONResponse, available, dumps, negotiate, stream_query
+from app.utils.stats_sql import MAX_SERIES_YEARS, MAX_YEAR, MIN_YEAR
 
 router = APIRouter()
 
@@ -7,33 +11,148 @@ router = APIRouter()
 def get_stats_function(request: Request):
     return request.app.state.stats_function
 
-# Dependency to fetch a database session (sessionmaker is set in app.state by create_app)
+def min_generation(request: Request) -> int:
+    """The data generation the client requires (X-Min-Generation, 0 when absent)."""
+    try:
+        return int(request.headers.get("x-min-generation", 0))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="X-Min-Generation must be an integer")
+
+def read_session(request: Request):
+    """
+    A read session from the app's ReadRouter: on a replica that has this
+    process's writes and the X-Min-Generation the client sends, else the primary.
+    Other processes' writes seen since the last request invalidate the stats
+    this process holds first.
+    """
+    required = min_generation(request)
+    request.app.state.sync_generation()
+    return request.app.state.read_router.session(required)
+
+# Dependency to fetch a database session; the session is closed, returning
+# its connection to the pool, once the request is done
 def get_session(request: Request):
-    return request.app.state.sessionmaker()
+    with read_session(request) as session:
+        yield session
+
+def _encode(data) -> CachedBody:
+    body = dumps(data)
+    return CachedBody(body=body, etag=strong_etag(body))
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in [tag.removeprefix("W/") for tag in candidates]
+
+def cached_response(request: Request, key: tuple, compute) -> Response:
+    """
+    Serve `compute()` through the app's stats cache with a strong ETag,
+    answering a matching If-None-Match with an empty 304. The client's
+    X-Min-Generation is part of the key, so a body computed before a write the
+    client has seen is not served to it.
+    """
+    cache = request.app.state.stats_cache
+    key = (min_generation(request), *key)
+    entry = cache.get_or_compute(key, lambda: _encode(compute())) if cache else _encode(compute())
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+    if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+def stats_response(request: Request, key: tuple, compute, build_query) -> Response:
+    """
+    JSON (the default) is served from `compute()` through cached_response; CSV,
+    NDJSON, Arrow and Parquet stream the rows of `build_query()` from the cursor.
+    """
+    fmt = negotiate(request.headers.get("accept"))
+    if fmt is None or not available(fmt):
+        raise HTTPException(status_code=406, detail=f"Supported formats: {', '.join(MEDIA_TYPES.values())}")
+    if fmt == "json":
+        return cached_response(request, key, compute)
+    return stream_query(lambda: read_session(request), build_query(), fmt, headers={"Vary": "Accept"})
+
+@router.get("/hired_employees")
+def get_hired_employees_series(
+    request: Request,
+    from_year: int = Query(alias="from", ge=MIN_YEAR, le=MAX_YEAR),
+    to_year: int = Query(alias="to", ge=MIN_YEAR, le=MAX_YEAR),
+    granularity: Literal["quarter", "month", "week"] = "quarter",
+    stats_function=Depends(get_stats_function),
+    session: Session = Depends(get_session),
+):
+    # Every bucket of the range in one grouped query, returned as parallel columns
+    if to_year < from_year:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if to_year - from_year >= MAX_SERIES_YEARS:
+        raise HTTPException(status_code=400, detail=f"A series spans at most {MAX_SERIES_YEARS} years")
+    return stats_response(
+        request,
+        ("hired_employees_series", from_year, to_year, granularity),
+        lambda: stats_function.get_hired_employees_series(from_year, to_year, granularity, session),
+        lambda: stats_function.hired_employees_series_query(from_year, to_year, granularity),
+    )
 
 @router.get("/hired_employees/{year}")
 def get_hired_employees_stats(
-    year: int,
+    request: Request,
+    year: int = Path(ge=MIN_YEAR, le=MAX_YEAR),
     stats_function=Depends(get_stats_function),
     session: Session = Depends(get_session),
 ):
     # Call the injected implementation
-    return stats_function.get_hired_employees_stats(year, session)
+    return stats_response(
+        request,
+        ("hired_employees", year),
+        lambda: stats_function.get_hired_employees_stats(year, session),
+        lambda: stats_function.hired_employees_stats_query(year),
+    )
 
 
 @router.get("/top_departments/{year}")
 def get_top_departments(
-    year: int,
+    request: Request,
+    year: int = Path(ge=MIN_YEAR, le=MAX_YEAR),
     stats_function=Depends(get_stats_function),
     session: Session = Depends(get_session),
 ):
     # Call the injected implementation
-    return stats_function.get_top_departments(year, session)
+    return stats_response(
+        request,
+        ("top_departments", year),
+        lambda: stats_function.get_top_departments(year, session),
+        lambda: stats_function.top_departments_query(year),
+    )
 
 @router.get("/inspect_hired_employees")
 def get_hired_employees(
+    request: Request,
+    after_id: int | None = None,
+    limit: int = Query(100, ge=1, le=10_000),
+    year: int | None = Query(None, ge=MIN_YEAR, le=MAX_YEAR),
+    department_id: int | None = None,
+    job_id: int | None = None,
+    export: bool = False,
     stats_function=Depends(get_stats_function),
     session: Session = Depends(get_session),
 ):
-    # Call the injected implementation
-    return stats_function.get_hired_employees(session)
\ No newline at end of file
+    """
+    Hires in id order, `limit` at a time: pass the last id of a page as
+    `after_id` to get the next one (also given in the `Link: rel="next"` header).
+    With `export=true`, every matching hire is streamed in the negotiated format.
+    """
+    filters = {"year": year, "department_id": department_id, "job_id": job_id}
+    if export:
+        fmt = negotiate(request.headers.get("accept"))
+        if fmt is None or not available(fmt):
+            raise HTTPException(status_code=406, detail=f"Supported formats: {', '.join(MEDIA_TYPES.values())}")
+        query = stats_function.hired_employees_query(after_id, **filters)
+        return stream_query(lambda: read_session(request), query, fmt, headers={"Vary": "Accept"})
+
+    rows = stats_function.get_hired_employees(session, after_id=after_id, limit=limit, **filters)
+    response = ORJSONResponse(rows)
+    if len(rows) == limit:
+        params = {name: value for name, value in filters.items() if value is not None}
+        next_url = request.url.include_query_params(after_id=rows[-1]["id"], limit=limit, **params)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response
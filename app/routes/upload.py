@@ -1,53 +1,102 @@
-from fastapi import APIRouter, UploadFile, HTTPException, Request
-import pandas as pd
-import numpy as np
-from app.models import HiredEmployee, Department, Job
+import asyncio
+from fastapi import APIRouter, UploadFile, HTTPException, Request, Query
+from app.utils.export import ORJSONResponse
+from app.utils.ingest import UploadValidationError, committed_counts, ingest_upload, open_upload
+from app.utils.metrics import record_upload
 
 router = APIRouter()
 
-@router.post("/hired_employees")
-async def upload_hired_employees(file: UploadFile, request: Request):
-    try:
-        df = pd.read_csv(file.file)
-        expected_cols = {"id", "name", "datetime", "department_id", "job_id"}
-        if not expected_cols.issubset(df.columns):
-            raise HTTPException(status_code=400, detail="Invalid schema for hired_employees.csv")
+def _failed(status_code: int, error: Exception) -> ORJSONResponse:
+    # Chunks commit one at a time, so a failed upload reports what it already wrote
+    return ORJSONResponse(
+        status_code=status_code,
+        content={"detail": str(error), "committed": getattr(error, "committed", committed_counts({}))},
+    )
 
+async def _ingest(file: UploadFile, request: Request, table: str, run_async: bool = False, delete_missing: bool = False):
+    state = request.app.state
+    if run_async:
         try:
-            df["datetime"] = pd.to_datetime(df["datetime"], errors="raise", utc=False).replace({pd.NaT: None})
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Invalid datetime format: {e}")
-        
-        try:
-            df.replace({np.nan: None}, inplace=True)
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Invalid integer: {e}")
-
-        request.app.state.upsert_dataframe(df, HiredEmployee)
-        return {"message": "hired_employees uploaded successfully"}
+            job = await state.ingestion_jobs.submit(file, table, delete_missing=delete_missing)
+        except UploadValidationError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+        return ORJSONResponse(
+            status_code=202,
+            content={"job_id": job.id, "state": job.state, "status_url": f"/upload/jobs/{job.id}"},
+        )
+    try:
+        await asyncio.wait_for(state.upload_slots.acquire(), timeout=state.upload_wait_timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Too many concurrent uploads", headers={"Retry-After": "5"})
+    try:
+        # The format comes from the part's Content-Encoding, the file name, its Content-Type or its first bytes
+        blocks, parse = await open_upload(
+            file.file,
+            table,
+            state.upload_chunk_bytes,
+            filename=file.filename,
+            content_type=file.content_type,
+            content_encoding=file.headers.get("content-encoding"),
+        )
+        report = await ingest_upload(
+            blocks,
+            table,
+            state.upsert_dataframe,
+            state.parse_executor,
+            state.write_executor,
+            max_pending_chunks=state.max_pending_chunks,
+            load_reference_ids=state.load_reference_ids,
+            parse=parse,
+            delete_missing=state.delete_missing if delete_missing else None,
+        )
+        record_upload(table, report)
+        if state.read_router.replicas:
+            # Sent back as X-Min-Generation, stats reads are sure to include this upload
+            report["generation"] = state.read_router.generation
+        return {"message": f"{table} uploaded successfully", **report}
+    except UploadValidationError as e:
+        return _failed(e.status_code, e)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return _failed(500, e)
+    finally:
+        state.upload_slots.release()
+
+@router.post("/hired_employees")
+async def upload_hired_employees(
+    file: UploadFile, request: Request, run_async: bool = Query(False, alias="async"), delete_missing: bool = False
+):
+    return await _ingest(file, request, "hired_employees", run_async, delete_missing)
 
 @router.post("/departments")
-async def upload_departments(file: UploadFile, request: Request):
-    try:
-        df = pd.read_csv(file.file)
-        expected_cols = {"id", "department"}
-        if not expected_cols.issubset(df.columns):
-            raise HTTPException(status_code=400, detail="Invalid schema for departments.csv")
-        request.app.state.upsert_dataframe(df, Department)
-        return {"message": "departments uploaded successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def upload_departments(
+    file: UploadFile, request: Request, run_async: bool = Query(False, alias="async"), delete_missing: bool = False
+):
+    return await _ingest(file, request, "departments", run_async, delete_missing)
 
 @router.post("/jobs")
-async def upload_jobs(file: UploadFile, request: Request):
-    try:
-        df = pd.read_csv(file.file)
-        expected_cols = {"id", "job"}
-        if not expected_cols.issubset(df.columns):
-            raise HTTPException(status_code=400, detail="Invalid schema for jobs.csv")
-        request.app.state.upsert_dataframe(df, Job)
-        return {"message": "jobs uploaded successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+async def upload_jobs(
+    file: UploadFile, request: Request, run_async: bool = Query(False, alias="async"), delete_missing: bool = False
+):
+    return await _ingest(file, request, "jobs", run_async, delete_missing)
+
+
+@router.get("/jobs/{job_id}")
+async def get_upload_job(job_id: str, request: Request):
+    job = await asyncio.to_thread(request.app.state.ingestion_jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return {
+        "job_id": job.id,
+        "table": job.table,
+        "state": job.state,
+        "rows_processed": job.rows_processed,
+        "rows_rejected": job.rows_rejected,
+        "rows_inserted": job.rows_inserted,
+        "rows_updated": job.rows_updated,
+        "rows_unchanged": job.rows_unchanged,
+        "rows_deleted": job.rows_deleted,
+        "rows_per_sec": job.rows_per_sec,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
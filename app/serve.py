@@ -0,0 +1,48 @@
+"""
+Production entry point.
+
+    python -m app.serve --workers 4 --host 0.0.0.0 --port 8000
+
+Creates the schema once, then starts uvicorn with `--workers` processes
+(default: WEB_CONCURRENCY, or the number of CPUs). Each worker imports
+app.main with schema creation turned off and warms its own connection pool
+and stats queries before it accepts requests. Every worker has its own pool
+(DB_POOL_SIZE + DB_MAX_OVERFLOW connections at most) and its own parse
+processes, so size them together with the worker count. Workers notice each
+other's uploads through the primary's data generation (GENERATION_POLL_INTERVAL)
+and drop the stats they hold.
+"""
+import argparse
+import os
+import uvicorn
+
+def default_workers() -> int:
+    return int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the Employee Analytics API with several worker processes.")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    parser.add_argument("--skip-schema", action="store_true", help="do not create missing tables (e.g. when migrations own the schema)")
+    args = parser.parse_args(argv)
+
+    from app import database
+    if not args.skip_schema:
+        database.create_db_and_tables()
+    # Workers open their own connections; none of this process's are handed down
+    database.get_engine().dispose()
+    os.environ["DB_CREATE_SCHEMA"] = "false"
+
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+        proxy_headers=True,
+    )
+
+if __name__ == "__main__":
+    main()
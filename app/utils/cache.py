@@ -0,0 +1,82 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+
+@dataclass(frozen=True)
+class CachedBody:
+    body: bytes
+    etag: str
+
+def strong_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+class StatsCache:
+    """
+    Bounded LRU cache of encoded stats responses.
+
+    Entries are keyed by the data generation they were computed at, so bumping
+    the generation after an upload commits invalidates everything at once; stale
+    entries simply age out of the LRU. Concurrent misses for the same key are
+    coalesced: one caller computes, the others wait for its result.
+
+    Entries also expire `ttl` seconds after they were computed (None keeps them
+    until invalidated), a bound on staleness should a change from another
+    process not be noticed otherwise (create_app bumps the cache when the
+    shared data generation moves).
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float | None = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._inflight: dict = {}
+        self._lock = threading.Lock()
+
+    def bump(self) -> int:
+        """Start a new data generation; everything cached so far becomes unreachable."""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            return self.generation
+
+    def get_or_compute(self, key: tuple, compute) -> CachedBody:
+        """Return the cached body for `key`, running `compute()` (once across threads) on a miss."""
+        with self._lock:
+            full_key = (self.generation, *key)
+            cached = self._entries.get(full_key)
+            if cached is not None:
+                entry, expires = cached
+                if expires is None or time.monotonic() < expires:
+                    self._entries.move_to_end(full_key)
+                    return entry
+                del self._entries[full_key]
+            future = self._inflight.get(full_key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[full_key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            entry = compute()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(full_key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._inflight.pop(full_key, None)
+            # A result computed across an invalidation is handed to its waiters but not kept
+            if full_key[0] == self.generation:
+                self._entries[full_key] = (entry, None if self.ttl is None else time.monotonic() + self.ttl)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        future.set_result(entry)
+        return entry
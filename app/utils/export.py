@@ -0,0 +1,201 @@
+"""
+Response encoding.
+
+JSON goes through orjson. Results can also be negotiated from the Accept
+header as CSV, NDJSON, Arrow IPC or Parquet and streamed (JSON too, as one array): rows are fetched from the database cursor
+in batches of `STREAM_BATCH_ROWS` and each batch is encoded and sent before the
+next is read, so a result never exists in memory as a whole.
+
+Arrow and Parquet need pyarrow, which is optional; without it those formats
+are answered with 406.
+"""
+import csv
+import io
+from decimal import Decimal
+import orjson
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import Boolean, Date, DateTime, Integer, Numeric, String
+
+STREAM_BATCH_ROWS = 10_000
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+_ACCEPTED = {
+    "*/*": "json",
+    "application/*": "json",
+    "application/json": "json",
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/vnd.apache.arrow.stream": "arrow",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+}
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dumps(data) -> bytes:
+    return orjson.dumps(data, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+class ORJSONResponse(JSONResponse):
+    """Default response class: orjson, with Decimal (Postgres AVG/SUM) and NumPy values supported."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+def negotiate(accept: str | None) -> str | None:
+    """Format for an Accept header ("json" when absent), or None when no offered type is supported."""
+    if not accept:
+        return "json"
+    offers = []
+    for position, part in enumerate(accept.split(",")):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0 and media_type.lower() in _ACCEPTED:
+            offers.append((-quality, position, _ACCEPTED[media_type.lower()]))
+    return min(offers)[2] if offers else None
+
+def _pyarrow():
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+    return pyarrow
+
+def available(fmt: str) -> bool:
+    if fmt not in ("arrow", "parquet"):
+        return True
+    try:
+        _pyarrow()
+    except ImportError:
+        return False
+    return True
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last take()."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _arrow_schema(pa, columns):
+    """Arrow schema from the SQL column types; None when a type has no fixed mapping (then inferred)."""
+    fields = []
+    for name, sql_type in columns:
+        if isinstance(sql_type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(sql_type, Numeric):
+            arrow_type = pa.float64()
+        elif isinstance(sql_type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(sql_type, DateTime):
+            arrow_type = pa.timestamp("us")
+        elif isinstance(sql_type, Date):
+            arrow_type = pa.date32()
+        elif isinstance(sql_type, String):
+            arrow_type = pa.string()
+        else:
+            return None
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+def _encode_with_pyarrow(new_writer, columns, batches):
+    pa = _pyarrow()
+    names = [name for name, _ in columns]
+    schema = _arrow_schema(pa, columns)
+    sink = _Sink()
+    writer = None
+    for rows in batches:
+        batch = pa.RecordBatch.from_pydict(dict(zip(names, map(list, zip(*rows)))), schema=schema)
+        if writer is None:
+            schema = batch.schema
+            writer = new_writer(pa, sink, schema)
+        writer.write_batch(batch)
+        yield sink.take()
+    if writer is None:
+        writer = new_writer(pa, sink, schema or pa.schema([pa.field(name, pa.null()) for name in names]))
+    writer.close()
+    yield sink.take()
+
+def encode_json(columns, batches):
+    """A JSON array of row objects, written batch by batch."""
+    names = [name for name, _ in columns]
+    separator = b"["
+    for rows in batches:
+        yield separator + b",".join(dumps(dict(zip(names, row))) for row in rows)
+        separator = b","
+    yield b"[]" if separator == b"[" else b"]"
+
+def encode_csv(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    yield buffer.getvalue().encode()
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+
+def encode_ndjson(columns, batches):
+    names = [name for name, _ in columns]
+    for rows in batches:
+        yield b"".join(dumps(dict(zip(names, row))) + b"\n" for row in rows)
+
+def encode_arrow(columns, batches):
+    return _encode_with_pyarrow(lambda pa, sink, schema: pa.ipc.new_stream(sink, schema), columns, batches)
+
+def encode_parquet(columns, batches):
+    # One row group per batch, sent as soon as it is written; the footer comes last
+    return _encode_with_pyarrow(lambda pa, sink, schema: pa.parquet.ParquetWriter(sink, schema), columns, batches)
+
+ENCODERS = {
+    "json": encode_json,
+    "csv": encode_csv,
+    "ndjson": encode_ndjson,
+    "arrow": encode_arrow,
+    "parquet": encode_parquet,
+}
+
+def stream_query(sessionmaker, query, fmt: str, headers: dict | None = None, batch_rows: int = STREAM_BATCH_ROWS):
+    """
+    Stream the rows of `query` in `fmt`. The session is opened by the response
+    body itself, so it lives exactly as long as the stream.
+    """
+    columns = [(c.name, c.type) for c in query.selected_columns]
+
+    def batches():
+        with sessionmaker() as session:
+            result = session.exec(query.execution_options(yield_per=batch_rows))
+            yield from result.partitions()
+
+    return StreamingResponse(ENCODERS[fmt](columns, batches()), media_type=MEDIA_TYPES[fmt], headers=headers)
@@ -0,0 +1,439 @@
+import asyncio
+import gzip
+import io
+import os
+import time
+import zlib
+from app.models import HiredEmployee, Department, Job
+
+# pandas, numpy and app.utils.schema (which needs both) are imported by the
+# functions that use them: the app imports this module at startup, and only
+# the first upload, or a parse worker process, should pay for loading them
+
+DEFAULT_CHUNK_BYTES = 8 * 1024 * 1024
+
+class UploadValidationError(ValueError):
+    """An uploaded file does not match the expected schema (reported as HTTP 400)."""
+    status_code = 400
+
+class UnsupportedUploadError(UploadValidationError):
+    """An upload format or encoding this server cannot read (reported as HTTP 415)."""
+    status_code = 415
+
+# Upload name -> (model, file name used in error messages)
+TABLES = {
+    "hired_employees": (HiredEmployee, "hired_employees.csv"),
+    "departments": (Department, "departments.csv"),
+    "jobs": (Job, "jobs.csv"),
+}
+
+def _is_unquoted(buffer: bytes, pos: int) -> bool:
+    return buffer.count(b'"', 0, pos) % 2 == 0
+
+def record_boundary(buffer: bytes) -> int:
+    """
+    Offset just past the last complete CSV record in `buffer` (0 if there is none).
+
+    `buffer` must start at a record boundary; a newline ends a record only when
+    it is outside a quoted field, i.e. preceded by an even number of quotes.
+    """
+    end = buffer.rfind(b"\n")
+    while end != -1:
+        if _is_unquoted(buffer, end):
+            return end + 1
+        end = buffer.rfind(b"\n", 0, end)
+    return 0
+
+def _first_record_end(buffer: bytes) -> int:
+    end = buffer.find(b"\n")
+    while end != -1:
+        if _is_unquoted(buffer, end):
+            return end + 1
+        end = buffer.find(b"\n", end + 1)
+    return 0
+
+async def iter_csv_blocks(file, chunk_bytes: int = DEFAULT_CHUNK_BYTES):
+    """
+    Yield (header, block) pairs from an UploadFile, where each block holds whole
+    CSV records and about `chunk_bytes` bytes, so every block parses on its own.
+    A header-only file yields one empty block so its schema is still checked.
+    """
+    header = None
+    pending = b""
+    yielded = False
+    eof = False
+    while not eof:
+        data = await file.read(chunk_bytes)
+        eof = not data
+        pending += data
+        if header is None:
+            end = len(pending) if eof else _first_record_end(pending)
+            if not end:
+                continue
+            header, pending = pending[:end], pending[end:]
+        cut = len(pending) if eof else record_boundary(pending)
+        if cut:
+            yield header, pending[:cut]
+            yielded = True
+            pending = pending[cut:]
+    if not header:
+        raise UploadValidationError("Empty upload")
+    if not yielded:
+        yield header, b""
+
+# -------------------------------------------------------------------
+# Upload formats: CSV (plain, gzip or zstd), Parquet and Arrow IPC.
+# Declared hints (Content-Encoding, file extension, Content-Type) come
+# first; otherwise the leading bytes decide
+# -------------------------------------------------------------------
+
+_ENCODINGS = {"gzip": "gzip", "x-gzip": "gzip", "zstd": "zstd", "identity": None}
+_COMPRESSED_EXTENSIONS = {".gz": "gzip", ".gzip": "gzip", ".zst": "zstd", ".zstd": "zstd"}
+_COMPRESSED_TYPES = {"application/gzip": "gzip", "application/x-gzip": "gzip", "application/zstd": "zstd"}
+_FORMAT_EXTENSIONS = {
+    ".csv": "csv", ".txt": "csv",
+    ".parquet": "parquet", ".pq": "parquet",
+    ".arrow": "arrow", ".arrows": "arrow", ".feather": "arrow", ".ipc": "arrow",
+}
+_FORMAT_TYPES = {
+    "text/csv": "csv",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+    "application/vnd.apache.arrow.file": "arrow",
+    "application/vnd.apache.arrow.stream": "arrow",
+}
+# Spool file suffixes that keep the detected format of an async upload
+SUFFIXES = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow", "gzip": ".gz", "zstd": ".zst"}
+
+def _sniff(head: bytes) -> tuple[str | None, str | None]:
+    if head.startswith(b"\x1f\x8b"):
+        return None, "gzip"
+    if head.startswith(b"\x28\xb5\x2f\xfd"):
+        return None, "zstd"
+    if head.startswith(b"PAR1"):
+        return "parquet", None
+    if head.startswith(b"ARROW1") or head.startswith(b"\xff\xff\xff\xff"):
+        return "arrow", None
+    return None, None
+
+def detect_format(head: bytes, filename: str | None = None, content_type: str | None = None, content_encoding: str | None = None):
+    """(format, compression) of an upload: format is csv, parquet or arrow, compression gzip, zstd or None."""
+    compression = None
+    if content_encoding:
+        encoding = content_encoding.strip().lower()
+        if encoding not in _ENCODINGS:
+            raise UnsupportedUploadError(f"Unsupported Content-Encoding {content_encoding!r}")
+        compression = _ENCODINGS[encoding]
+    root, extension = os.path.splitext((filename or "").lower())
+    if extension in _COMPRESSED_EXTENSIONS:
+        compression = compression or _COMPRESSED_EXTENSIONS[extension]
+        extension = os.path.splitext(root)[1]
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    compression = compression or _COMPRESSED_TYPES.get(media_type)
+    sniffed_format, sniffed_compression = _sniff(head)
+    compression = compression or sniffed_compression
+    fmt = _FORMAT_EXTENSIONS.get(extension) or _FORMAT_TYPES.get(media_type)
+    if fmt is None and compression is None:
+        fmt = sniffed_format
+    return fmt or "csv", compression
+
+class _AsyncReader:
+    """async read() over a blocking binary file; reads run in a thread, decompression errors become 400s."""
+
+    def __init__(self, file, errors: tuple = ()):
+        self._file = file
+        self._errors = errors
+
+    async def read(self, size: int) -> bytes:
+        try:
+            return await asyncio.to_thread(self._file.read, size)
+        except self._errors as e:
+            raise UploadValidationError(f"Cannot decompress upload: {e}") from e
+
+def _decompressed(file, compression: str):
+    """A file object streaming the decompressed bytes of `file`, with the errors its reads can raise."""
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=file, mode="rb"), (OSError, EOFError, zlib.error)
+    try:
+        import zstandard
+    except ImportError:
+        raise UnsupportedUploadError("zstd uploads need the zstandard package, which is not installed")
+    return zstandard.ZstdDecompressor().stream_reader(file, read_across_frames=True), (zstandard.ZstdError,)
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise UnsupportedUploadError("Parquet and Arrow uploads need pyarrow, which is not installed")
+    return pyarrow
+
+async def _arrow_call(pa, function, *args):
+    try:
+        return await asyncio.to_thread(function, *args)
+    except pa.ArrowException as e:
+        raise UploadValidationError(f"Invalid Arrow/Parquet upload: {e}") from e
+
+def _next_batch(reader):
+    try:
+        return reader.read_next_batch()
+    except StopIteration:
+        return None
+
+def _slices(table, chunk_bytes: int):
+    """Zero-copy slices of an Arrow table of about `chunk_bytes` each."""
+    rows = max(1, int(table.num_rows * chunk_bytes / table.nbytes)) if table.nbytes else table.num_rows
+    for offset in range(0, table.num_rows, rows):
+        yield table.slice(offset, rows)
+
+def _columns(schema, table: str) -> list[str]:
+    model, _ = TABLES[table]
+    return [c.name for c in model.__table__.columns if c.name in schema.names]
+
+async def iter_parquet_batches(file, table: str, chunk_bytes: int = DEFAULT_CHUNK_BYTES):
+    """
+    Yield (arrow table,) blocks of a Parquet file, one row group at a time (sliced
+    to about `chunk_bytes`), reading only the model's columns.
+    """
+    pa = _pyarrow()
+    parquet = await _arrow_call(pa, pa.parquet.ParquetFile, file)
+    columns = _columns(parquet.schema_arrow, table)
+    for index in range(parquet.num_row_groups):
+        group = await _arrow_call(pa, parquet.read_row_group, index, columns)
+        for block in _slices(group, chunk_bytes):
+            yield (block,)
+    if not parquet.num_row_groups:
+        yield (parquet.schema_arrow.empty_table(),)
+
+async def iter_arrow_batches(file, table: str, chunk_bytes: int = DEFAULT_CHUNK_BYTES, random_access: bool = False):
+    """
+    Yield (arrow table,) blocks of an Arrow IPC stream (or file, with random_access),
+    record batches being gathered up to about `chunk_bytes`.
+    """
+    pa = _pyarrow()
+    if random_access:
+        reader = await _arrow_call(pa, pa.ipc.open_file, file)
+        batches = (reader.get_batch(index) for index in range(reader.num_record_batches))
+
+        async def next_batch():
+            return await _arrow_call(pa, next, batches, None)
+    else:
+        reader = await _arrow_call(pa, pa.ipc.open_stream, file)
+
+        async def next_batch():
+            return await _arrow_call(pa, _next_batch, reader)
+
+    columns = _columns(reader.schema, table)
+    schema = pa.schema([reader.schema.field(name) for name in columns])
+    pending, pending_bytes, yielded = [], 0, False
+    while (batch := await next_batch()) is not None:
+        pending.append(batch.select(columns))
+        pending_bytes += batch.nbytes
+        if pending_bytes >= chunk_bytes:
+            yield (pa.Table.from_batches(pending, schema=schema),)
+            pending, pending_bytes, yielded = [], 0, True
+    if pending or not yielded:
+        yield (pa.Table.from_batches(pending, schema=schema),)
+
+async def open_upload(file, table: str, chunk_bytes: int = DEFAULT_CHUNK_BYTES, filename=None, content_type=None, content_encoding=None):
+    """
+    Blocks of an uploaded binary file and the function that parses one block,
+    for ingest_upload. CSV (plain, gzip or zstd) is decompressed as it is read;
+    Parquet and Arrow stay columnar up to validation. Parquet and Arrow files
+    must be seekable, which uploads and spooled files are.
+    """
+    head = await asyncio.to_thread(file.read, 8)
+    await asyncio.to_thread(file.seek, 0)
+    fmt, compression = detect_format(head, filename, content_type, content_encoding)
+    errors = ()
+    if compression is not None:
+        if fmt == "parquet":
+            raise UnsupportedUploadError("Parquet files are compressed internally; upload them without an outer compression")
+        file, errors = _decompressed(file, compression)
+    if fmt == "csv":
+        return iter_csv_blocks(_AsyncReader(file, errors), chunk_bytes), parse_csv_block
+    if fmt == "parquet":
+        return iter_parquet_batches(file, table, chunk_bytes), parse_arrow_block
+    return iter_arrow_batches(file, table, chunk_bytes, random_access=compression is None and head.startswith(b"ARROW1")), parse_arrow_block
+
+def _seen_ids(raw):
+    """Every integer id in the block, rejected rows included, so delete_missing never deletes a row the file still names."""
+    import numpy as np
+    import pandas as pd
+    ids = pd.to_numeric(raw, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    return ids[~np.isnan(ids) & (ids % 1 == 0)].astype(np.int64)
+
+def _validated(df, table: str, started: float):
+    from app.utils.schema import validate
+    model, filename = TABLES[table]
+    if not {c.name for c in model.__table__.columns}.issubset(df.columns):
+        raise UploadValidationError(f"Invalid schema for {filename}")
+    frame, rejections = validate(df, model)
+    nbytes = int(frame.memory_usage(deep=True).sum())
+    return frame, rejections, len(df), nbytes, time.perf_counter() - started, _seen_ids(df["id"])
+
+def parse_csv_block(header: bytes, block: bytes, table: str):
+    """
+    Parse and validate one block; runs in the parse executor (possibly another process).
+    Returns (accepted rows, rejections, rows parsed, accepted bytes, seconds, ids seen).
+    """
+    import pandas as pd
+    started = time.perf_counter()
+    return _validated(pd.read_csv(io.BytesIO(header + block)), table, started)
+
+def parse_arrow_block(block, table: str):
+    """
+    parse_csv_block for an Arrow table: integer and string columns convert
+    straight to nullable pandas columns, so validation takes its typed fast paths.
+    """
+    import pandas as pd
+    started = time.perf_counter()
+    pa = _pyarrow()
+
+    def pandas_type(arrow_type):
+        if pa.types.is_integer(arrow_type):
+            return pd.Int64Dtype()
+        if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+            return pd.StringDtype()
+        return None
+
+    return _validated(block.to_pandas(types_mapper=pandas_type), table, started)
+
+# Report counts that describe committed writes
+COMMITTED = ("rows", "inserted", "updated", "unchanged", "deleted")
+
+def committed_counts(report: dict) -> dict:
+    return {name: report.get(name, 0) for name in COMMITTED}
+
+def _rate(rows: int, started: float):
+    elapsed = time.perf_counter() - started
+    return round(rows / elapsed, 1) if elapsed > 0 else None
+
+async def ingest_upload(
+    blocks,
+    table: str,
+    upsert,
+    parse_executor,
+    write_executor,
+    max_pending_chunks: int = 2,
+    on_progress=None,
+    load_reference_ids=None,
+    parse=parse_csv_block,
+    delete_missing=None,
+):
+    """
+    Parse, validate and upsert an upload without blocking the event loop.
+
+    Each block is a tuple of arguments for `parse` (open_upload returns both).
+    Blocks are parsed on `parse_executor` while earlier chunks are written on
+    `write_executor`. Writes stay in upload order, one at a time, and at most
+    `max_pending_chunks` parsed chunks wait for the writer, which bounds memory
+    and pushes back on the reader. `on_progress(report)` is awaited after each
+    chunk is written. When `load_reference_ids()` is given, rows naming an
+    unknown department or job are rejected too. Returns throughput figures,
+    the inserted/updated/unchanged/deleted counts and the rejected-rows report
+    for the response.
+
+    A row whose id comes again later in the upload is rejected as superseded,
+    whichever chunks the two rows fall in, so the report does not depend on
+    the chunk size.
+
+    With `delete_missing(model, ids)`, the upload is a full snapshot: once every
+    chunk is written, rows whose id the file does not contain are deleted.
+
+    Each chunk commits on its own. When a later chunk fails, the chunks before
+    it stay written; the exception carries their counts as `committed`.
+    """
+    import numpy as np
+    from app.utils.schema import RejectionReport, check_references, drop_superseded, superseded_rows
+    loop = asyncio.get_running_loop()
+    model, _ = TABLES[table]
+    parsed = asyncio.Queue(maxsize=max_pending_chunks)
+    report = {
+        "rows": 0, "rows_parsed": 0, "inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0,
+        "peak_chunk_bytes": 0, "parse_seconds": 0.0, "write_seconds": 0.0,
+    }
+    # Ids of a snapshot upload, 8 bytes per row, kept until the deletion at the end
+    seen_ids = []
+    # Ids written so far (sorted, 16 bytes per row with their 0-based data row),
+    # so a later chunk repeating one supersedes the written row
+    written_ids = np.empty(0, dtype=np.int64)
+    written_rows = np.empty(0, dtype=np.int64)
+    rejected = RejectionReport()
+    started = time.perf_counter()
+    reference_ids = {}
+    if load_reference_ids is not None:
+        reference_ids = await loop.run_in_executor(write_executor, load_reference_ids, model)
+
+    async def read_and_parse():
+        try:
+            async for block in blocks:
+                await parsed.put(loop.run_in_executor(parse_executor, parse, *block, table))
+        finally:
+            await parsed.put(None)
+
+    reader = asyncio.create_task(read_and_parse())
+    try:
+        while (future := await parsed.get()) is not None:
+            df, rejections, rows_parsed, nbytes, parse_seconds, ids = await future
+            if delete_missing is not None:
+                seen_ids.append(ids)
+            rejected.add(rejections, report["rows_parsed"])
+            if reference_ids:
+                df, unknown = check_references(df, reference_ids)
+                rejected.add(unknown, report["rows_parsed"])
+            df, superseded = drop_superseded(df)
+            rejected.add(superseded, report["rows_parsed"])
+            ids = df["id"].to_numpy(dtype=np.int64)
+            rows = df.index.to_numpy(dtype=np.int64) + report["rows_parsed"]
+            position = np.searchsorted(written_ids, ids)
+            repeated = position < len(written_ids)
+            repeated[repeated] = written_ids[position[repeated]] == ids[repeated]
+            rejected.add(superseded_rows(written_rows[position[repeated]], ids[repeated]), 0)
+            written_rows[position[repeated]] = rows[repeated]
+            order = np.argsort(ids[~repeated], kind="stable")
+            written_ids = np.insert(written_ids, position[~repeated][order], ids[~repeated][order])
+            written_rows = np.insert(written_rows, position[~repeated][order], rows[~repeated][order])
+            report["rows_parsed"] += rows_parsed
+            report["parse_seconds"] += parse_seconds
+            report["peak_chunk_bytes"] = max(report["peak_chunk_bytes"], nbytes)
+            write_started = time.perf_counter()
+            if not repeated.all():
+                counts = await loop.run_in_executor(write_executor, upsert, df[~repeated], model)
+                for name, count in (counts or {}).items():
+                    report[name] += count
+            if repeated.any():
+                # Rewrites of ids this upload wrote already: each id keeps the
+                # inserted/updated/unchanged count of its first write
+                await loop.run_in_executor(write_executor, upsert, df[repeated], model)
+            report["write_seconds"] += time.perf_counter() - write_started
+            report["rows"] += int((~repeated).sum())
+            report["rejected"] = rejected.to_dict()
+            if on_progress is not None:
+                report["rows_per_sec"] = _rate(report["rows"], started)
+                await on_progress(report)
+        await reader
+        if delete_missing is not None:
+            keep = np.unique(np.concatenate(seen_ids)) if seen_ids else np.empty(0, dtype=np.int64)
+            if not len(keep):
+                # An empty snapshot would delete the whole table; far more likely a broken export
+                raise UploadValidationError("delete_missing needs an upload with at least one id")
+            write_started = time.perf_counter()
+            report["deleted"] = await loop.run_in_executor(write_executor, delete_missing, model, keep)
+            report["write_seconds"] += time.perf_counter() - write_started
+    except Exception as e:
+        e.committed = committed_counts(report)
+        raise
+    finally:
+        if not reader.done():
+            reader.cancel()
+            # Unblock a reader waiting on a full queue so it can observe the cancellation
+            while not parsed.empty():
+                parsed.get_nowait()
+
+    report["rows_per_sec"] = _rate(report["rows"], started)
+    report["rejected"] = rejected.to_dict()
+    report["parse_seconds"] = round(report["parse_seconds"], 3)
+    report["write_seconds"] = round(report["write_seconds"], 3)
+    return report
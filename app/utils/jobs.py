@@ -0,0 +1,226 @@
+import asyncio
+import logging
+import os
+import shutil
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, or_, update
+from sqlmodel import select
+from app.models import IngestionJob
+from app.utils.ingest import SUFFIXES, UploadValidationError, detect_format, ingest_upload, open_upload
+from app.utils.metrics import record_upload
+
+logger = logging.getLogger("app.jobs")
+
+def _counts(report: dict) -> dict:
+    """IngestionJob row counters from an ingest_upload report."""
+    return {
+        "rows_processed": report["rows"],
+        "rows_rejected": report["rejected"]["rows"],
+        **{f"rows_{name}": report.get(name, 0) for name in ("inserted", "updated", "unchanged", "deleted")},
+    }
+
+class IngestionJobs:
+    """
+    Queue of asynchronous uploads.
+
+    Accepted files are spooled to `spool_dir` and recorded as IngestionJob rows,
+    then processed by `workers` tasks on the app's event loop through the same
+    pipeline as synchronous uploads.
+
+    Several processes (app.serve workers) share the table. A job runs once it
+    is claimed by a single conditional UPDATE, so only one process gets it. Its
+    owner refreshes `heartbeat_at` every `heartbeat_interval` seconds while it
+    runs. On start, queued jobs are picked up again, and so are running jobs
+    whose heartbeat is older than `stale_after` seconds, i.e. whose process
+    died; every `stale_after` seconds each process looks for such jobs again.
+    A process that stops cleanly releases its running jobs at once. Upserts
+    are idempotent, so a partially loaded file is simply loaded again. The
+    spool file must be readable where the job resumes: processes on several
+    hosts need a `spool_dir` on storage they share, else a job taken over
+    from another host fails.
+    """
+
+    def __init__(self, state, workers: int = 2, spool_dir: str | None = None, heartbeat_interval: float = 5.0, stale_after: float = 30.0):
+        self.state = state
+        self.workers = workers
+        self.spool_dir = spool_dir
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue: asyncio.Queue | None = None
+        self._queued: set[str] = set()
+        self._tasks: list[asyncio.Task] = []
+
+    def _claimable(self, now: datetime):
+        stale = or_(IngestionJob.heartbeat_at.is_(None), IngestionJob.heartbeat_at < now - timedelta(seconds=self.stale_after))
+        return or_(IngestionJob.state == "queued", and_(IngestionJob.state == "running", stale))
+
+    def _claim(self, job_id: str) -> IngestionJob | None:
+        """Take the job if it is queued or abandoned; None when another process has it or it is done."""
+        now = datetime.now(timezone.utc)
+        claim = (
+            update(IngestionJob)
+            .where(IngestionJob.id == job_id, self._claimable(now))
+            .values(state="running", owner=self.owner, heartbeat_at=now, updated_at=now, error=None,
+                    **_counts({"rows": 0, "rejected": {"rows": 0}}))
+        )
+        with self.state.sessionmaker() as session:
+            claimed = session.exec(claim).rowcount == 1
+            session.commit()
+            return session.get(IngestionJob, job_id) if claimed else None
+
+    def _update(self, job_id: str, **fields):
+        """Update a job this process owns; a job claimed away from it is left alone."""
+        now = datetime.now(timezone.utc)
+        with self.state.sessionmaker() as session:
+            session.exec(
+                update(IngestionJob)
+                .where(IngestionJob.id == job_id, IngestionJob.owner == self.owner)
+                .values(updated_at=now, heartbeat_at=now, **fields)
+            )
+            session.commit()
+
+    def _pending_ids(self) -> list[str]:
+        with self.state.sessionmaker() as session:
+            query = (
+                select(IngestionJob.id)
+                .where(self._claimable(datetime.now(timezone.utc)))
+                .order_by(IngestionJob.created_at)
+            )
+            return list(session.exec(query))
+
+    def _release(self):
+        """Make this process's running jobs claimable right away (on a clean stop)."""
+        with self.state.sessionmaker() as session:
+            session.exec(
+                update(IngestionJob)
+                .where(IngestionJob.owner == self.owner, IngestionJob.state == "running")
+                .values(heartbeat_at=None)
+            )
+            session.commit()
+
+    def _enqueue(self, job_id: str):
+        if job_id not in self._queued:
+            self._queued.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def start(self):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._queue = asyncio.Queue()
+        self._queued = set()
+        for job_id in await asyncio.to_thread(self._pending_ids):
+            self._enqueue(job_id)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweep()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.to_thread(self._release)
+
+    async def _sweep(self):
+        # Jobs of processes that died while running them, and jobs queued by
+        # processes that stopped before getting to them
+        while True:
+            await asyncio.sleep(self.stale_after)
+            try:
+                for job_id in await asyncio.to_thread(self._pending_ids):
+                    self._enqueue(job_id)
+            except Exception:
+                logger.warning("Looking for abandoned upload jobs failed", exc_info=True)
+
+    async def submit(self, file, table: str, delete_missing: bool = False) -> IngestionJob:
+        """
+        Spool an UploadFile and queue it for processing. The spool file is named
+        after the detected format (e.g. .csv.gz), which is all the job needs later.
+        """
+        job_id = uuid.uuid4().hex
+
+        def spool():
+            head = file.file.read(8)
+            file.file.seek(0)
+            fmt, compression = detect_format(head, file.filename, file.content_type, file.headers.get("content-encoding"))
+            path = os.path.join(self.spool_dir, job_id + SUFFIXES[fmt] + (SUFFIXES[compression] if compression else ""))
+            with open(path, "wb") as out:
+                shutil.copyfileobj(file.file, out)
+            job = IngestionJob(id=job_id, table=table, file_path=path, delete_missing=delete_missing)
+            with self.state.sessionmaker() as session:
+                session.add(job)
+                session.commit()
+            return job
+
+        job = await asyncio.to_thread(spool)
+        self._enqueue(job_id)
+        return job
+
+    def get(self, job_id: str) -> IngestionJob | None:
+        with self.state.sessionmaker() as session:
+            return session.get(IngestionJob, job_id)
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            await asyncio.to_thread(self._update, job_id)
+
+    async def _run(self, job_id: str):
+        job = await asyncio.to_thread(self._claim, job_id)
+        if job is None:
+            return
+
+        async def on_progress(report):
+            await asyncio.to_thread(self._update, job_id, rows_per_sec=report["rows_per_sec"], **_counts(report))
+
+        if not await asyncio.to_thread(os.path.exists, job.file_path):
+            await asyncio.to_thread(
+                self._update, job_id, state="failed",
+                error=f"Spool file {job.file_path} not found on {socket.gethostname()}; "
+                "workers on several hosts need INGESTION_SPOOL_DIR on shared storage",
+            )
+            return
+
+        state = self.state
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            with open(job.file_path, "rb") as file:
+                blocks, parse = await open_upload(file, job.table, state.upload_chunk_bytes, filename=job.file_path)
+                report = await ingest_upload(
+                    blocks,
+                    job.table,
+                    state.upsert_dataframe,
+                    state.parse_executor,
+                    state.write_executor,
+                    max_pending_chunks=state.max_pending_chunks,
+                    on_progress=on_progress,
+                    load_reference_ids=state.load_reference_ids,
+                    parse=parse,
+                    delete_missing=state.delete_missing if job.delete_missing else None,
+                )
+        except asyncio.CancelledError:
+            # Shutting down: leave the job running; stop() releases it for the next start
+            raise
+        except UploadValidationError as e:
+            await asyncio.to_thread(self._update, job_id, state="failed", error=str(e))
+        except Exception as e:
+            await asyncio.to_thread(self._update, job_id, state="failed", error=f"{type(e).__name__}: {e}")
+        else:
+            record_upload(job.table, report)
+            await asyncio.to_thread(
+                self._update, job_id, state="succeeded", rows_per_sec=report["rows_per_sec"], **_counts(report)
+            )
+        finally:
+            heartbeat.cancel()
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
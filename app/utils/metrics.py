@@ -0,0 +1,211 @@
+"""
+Process-wide performance metrics rendered in the Prometheus text format.
+
+- http_request_duration_seconds: per-route latency histogram (MetricsMiddleware)
+- db_query_duration_seconds / db_query_rows_total: per-statement timings and
+  row counts from SQLAlchemy cursor events (instrument_engine)
+- upload_*: rows parsed and upserted, per-outcome row counts, parse time versus write time (record_upload)
+
+Like the usual Prometheus clients, the registry is global to the process; every
+worker exposes its own figures.
+"""
+import logging
+import re
+import threading
+import time
+import weakref
+from sqlalchemy import event
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+slow_query_logger = logging.getLogger("app.slow_query")
+
+def _format_labels(labelnames, values) -> str:
+    if not labelnames:
+        return ""
+    pairs = []
+    for name, value in zip(labelnames, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: dict = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[len(self.buckets)] += 1
+            state[-1] += value
+
+    def count(self, **labels) -> int:
+        state = self._values.get(tuple(labels[name] for name in self.labelnames))
+        return state[len(self.buckets)] if state else 0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        bucket_labels = self.labelnames + ("le",)
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, state):
+                    lines.append(f"{self.name}_bucket{_format_labels(bucket_labels, key + (repr(bound),))} {count}")
+                total = state[len(self.buckets)]
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels, key + ('+Inf',))} {total}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-1])}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {total}")
+        return lines
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status")
+)
+QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "SQL statement execution time.", ("operation", "table")
+)
+QUERY_ROWS = Counter(
+    "db_query_rows_total", "Rows affected or returned by SQL statements, where the driver reports them.",
+    ("operation", "table"),
+)
+UPLOAD_ROWS_PARSED = Counter("upload_rows_parsed_total", "Rows parsed from uploaded files.", ("table",))
+UPLOAD_ROWS_UPSERTED = Counter("upload_rows_upserted_total", "Rows written by uploads.", ("table",))
+UPLOAD_ROWS_BY_OUTCOME = Counter(
+    "upload_rows_by_outcome_total", "Rows inserted, updated, left unchanged or deleted by uploads.", ("table", "outcome")
+)
+UPLOAD_PARSE_SECONDS = Counter("upload_parse_seconds_total", "Time spent parsing and validating uploads.", ("table",))
+UPLOAD_WRITE_SECONDS = Counter("upload_write_seconds_total", "Time spent writing uploads to the database.", ("table",))
+
+REGISTRY = [
+    REQUEST_LATENCY,
+    QUERY_LATENCY,
+    QUERY_ROWS,
+    UPLOAD_ROWS_PARSED,
+    UPLOAD_ROWS_UPSERTED,
+    UPLOAD_ROWS_BY_OUTCOME,
+    UPLOAD_PARSE_SECONDS,
+    UPLOAD_WRITE_SECONDS,
+]
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def record_upload(table: str, report: dict):
+    UPLOAD_ROWS_PARSED.inc(report.get("rows_parsed", report["rows"]), table=table)
+    UPLOAD_ROWS_UPSERTED.inc(report["rows"], table=table)
+    for outcome in ("inserted", "updated", "unchanged", "deleted"):
+        UPLOAD_ROWS_BY_OUTCOME.inc(report.get(outcome, 0), table=table, outcome=outcome)
+    UPLOAD_PARSE_SECONDS.inc(report.get("parse_seconds", 0.0), table=table)
+    UPLOAD_WRITE_SECONDS.inc(report.get("write_seconds", 0.0), table=table)
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency per route template (e.g. /stats/hired_employees/{year})."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path_format", None) or getattr(route, "path", None) or "unmatched",
+                status=status["code"],
+            )
+
+_STATEMENT_TARGET = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE)\s+"?(\w+)', re.IGNORECASE)
+
+def statement_fingerprint(statement: str) -> tuple[str, str]:
+    """(operation, first table) of a SQL statement: low-cardinality labels for per-statement metrics."""
+    words = statement.lstrip().split(None, 1)
+    operation = words[0].upper() if words else ""
+    match = _STATEMENT_TARGET.search(statement)
+    return operation, match.group(1).lower() if match else ""
+
+_instrumented = weakref.WeakKeyDictionary()
+
+def instrument_engine(engine, slow_query_threshold: float | None = None):
+    """
+    Time every statement run on `engine`; statements slower than
+    `slow_query_threshold` seconds are also logged to the app.slow_query logger.
+    Instrumenting an engine again only updates the threshold.
+    """
+    already = engine in _instrumented
+    _instrumented[engine] = slow_query_threshold
+    if already:
+        return engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "handle_error")
+    def _failed(context):
+        if context.connection is not None and context.connection.info.get("query_started"):
+            context.connection.info["query_started"].pop()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        operation, table = statement_fingerprint(statement)
+        QUERY_LATENCY.observe(elapsed, operation=operation, table=table)
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            QUERY_ROWS.inc(cursor.rowcount, operation=operation, table=table)
+        threshold = _instrumented.get(engine)
+        if threshold is not None and elapsed >= threshold:
+            slow_query_logger.warning("slow query (%.1f ms): %s", elapsed * 1000, " ".join(statement.split()))
+
+    return engine
@@ -0,0 +1,189 @@
+"""
+Year-partitioned hiredemployee for Postgres (optional storage mode).
+
+With HIRES_PARTITIONING=year, schema creation declares hiredemployee as a
+table range-partitioned on datetime: one partition per year
+(hiredemployee_y2021 holds 2021) and a default partition for hires without a
+datetime. Each partition has its own heap and indexes, so a year's stats
+query reads that year's partition only (the stats queries filter on a
+half-open datetime range, which Postgres prunes on), and an upload's
+ON CONFLICT probes the partition of the row's year.
+
+A partitioned table's unique keys must include the partition key, so
+(id, datetime) is unique, NULLS NOT DISTINCT (Postgres 15+), in place of the
+primary key on id. The upserts keep ids unique themselves: a hire whose
+datetime changes is deleted (move_out) and inserted again under the new one,
+and writers of the same ids take turns (move_out locks them). Only writes
+through the upserts are covered; nothing in the database stops an id from
+being stored twice.
+Partitions for new years are created by the upserts before they write.
+
+Detaching a year only touches the catalog; the year's rows go with the table,
+and its rollup buckets are removed in the same transaction:
+    python -m app.utils.partitions list
+    python -m app.utils.partitions detach 2015 [--archive-schema archive | --drop]
+"""
+import argparse
+import re
+import sys
+import weakref
+import pandas as pd
+from sqlalchemy import Column, Index, MetaData, Table, delete, text
+from app.models import HiredEmployee, HiredEmployeeQuarterly
+from app.utils import rollup as hires_rollup
+from app.utils.replicas import bump_generation
+
+TABLE = HiredEmployee.__table__.name
+DEFAULT_PARTITION = f"{TABLE}_default"
+_YEAR_PARTITION = re.compile(rf"^{TABLE}_y(\d{{4}})$")
+
+# engine -> whether its hiredemployee is partitioned
+_partitioned = weakref.WeakKeyDictionary()
+
+def partition_name(year: int) -> str:
+    return f"{TABLE}_y{year}"
+
+def partitioned_table() -> Table:
+    """hiredemployee as a partitioned table, with the model's columns and indexes."""
+    source = HiredEmployee.__table__
+    table = Table(
+        source.name,
+        MetaData(),
+        *(Column(c.name, c.type, nullable=c.name != "id") for c in source.columns),
+        postgresql_partition_by="RANGE (datetime)",
+    )
+    Index(f"uq_{TABLE}_id_datetime", table.c.id, table.c.datetime, unique=True, postgresql_nulls_not_distinct=True)
+    for index in source.indexes:
+        Index(index.name, *(table.c[c.name] for c in index.columns), unique=index.unique, **index.dialect_kwargs)
+    return table
+
+def create_partitioned_hires(engine):
+    """Create hiredemployee partitioned by year, unless it already exists (partitioned or not)."""
+    if engine.dialect.name != "postgresql":
+        raise ValueError("Year partitioning needs Postgres")
+    with engine.begin() as connection:
+        if engine.dialect.has_table(connection, TABLE):
+            return
+        partitioned_table().create(connection)
+        connection.execute(text(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT'))
+    _partitioned.pop(engine, None)
+
+def is_partitioned(engine) -> bool:
+    """Whether `engine`'s hiredemployee is a partitioned table (looked up once per engine)."""
+    if engine.dialect.name != "postgresql":
+        return False
+    if engine not in _partitioned:
+        with engine.connect() as connection:
+            kind = connection.execute(
+                text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": TABLE}
+            ).scalar()
+        _partitioned[engine] = kind == "p"
+    return _partitioned[engine]
+
+def conflict_columns(engine, model) -> list[str]:
+    """The upsert conflict target of `model`: (id, datetime) for partitioned hires, else id."""
+    if model is HiredEmployee and is_partitioned(engine):
+        return ["id", "datetime"]
+    return ["id"]
+
+def attached_years(connection) -> set[int]:
+    names = connection.execute(
+        text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:name)"),
+        {"name": TABLE},
+    ).scalars()
+    return {int(match.group(1)) for name in names if (match := _YEAR_PARTITION.match(name))}
+
+def ensure_partitions(engine, datetimes) -> list[int]:
+    """
+    Create the partitions missing for the years of `datetimes`; returns the
+    years created. Runs in a short transaction of its own, which must not
+    overlap one that has read hiredemployee: attaching a partition locks the
+    parent table exclusively. The attached years are read from the catalog
+    every time, so a year detached by another process is seen.
+    """
+    years = {int(year) for year in pd.to_datetime(pd.Series(datetimes)).dt.year.dropna().unique()}
+    with engine.connect() as connection:
+        if years <= attached_years(connection):
+            return []
+    created = []
+    with engine.begin() as connection:
+        # One creator at a time across workers; the others then see its partitions
+        connection.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": TABLE})
+        for year in sorted(years - attached_years(connection)):
+            connection.execute(text(
+                f'CREATE TABLE "{partition_name(year)}" PARTITION OF "{TABLE}" '
+                f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+            ))
+            created.append(year)
+    return created
+
+def move_out(connection, df: pd.DataFrame) -> tuple[int, int]:
+    """
+    Delete the hires of `df` (one row per id) stored under a different
+    datetime, so inserting them under the new one cannot leave their id twice.
+    Returns how many were moved out and how many are stored under the same
+    datetime, i.e. will conflict. RETURNING cannot read xmax on a partitioned
+    table, so the upserts count inserted rows from these two numbers.
+
+    The ids are locked first (rollup.lock_hires) until the transaction ends:
+    a concurrent writer of the same id would otherwise find nothing to move
+    out, as the other row is not committed yet, and insert a second one.
+    """
+    hires_rollup.lock_hires(connection, df["id"])
+    values = df[["id", "datetime"]].astype(object).where(df[["id", "datetime"]].notna(), None)
+    return connection.execute(
+        text(
+            "WITH n AS (SELECT * FROM unnest(CAST(:ids AS integer[]), CAST(:datetimes AS timestamp[])) AS n(id, datetime)), "
+            f'moved AS (DELETE FROM "{TABLE}" AS h USING n WHERE h.id = n.id AND h.datetime IS DISTINCT FROM n.datetime RETURNING 1) '
+            "SELECT (SELECT count(*) FROM moved), "
+            f'(SELECT count(*) FROM "{TABLE}" AS h JOIN n ON h.id = n.id AND h.datetime IS NOT DISTINCT FROM n.datetime)'
+        ),
+        {"ids": [int(i) for i in values["id"]], "datetimes": values["datetime"].tolist()},
+    ).one()
+
+def detach_year(engine, year: int, archive_schema: str | None = "archive", drop: bool = False):
+    """
+    Detach a year's partition, and remove its buckets from the rollup. The
+    table is then moved to `archive_schema`, or dropped with `drop`, so a later
+    upload of that year gets a fresh partition. The data generation is bumped,
+    so the app's workers drop the stats they hold for that year.
+    """
+    name = partition_name(year)
+    rollup = HiredEmployeeQuarterly.__table__
+    with engine.begin() as connection:
+        if year not in attached_years(connection):
+            raise ValueError(f"{year} has no attached partition")
+        connection.execute(text(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"'))
+        connection.execute(delete(rollup).where(rollup.c.year == year))
+        if drop:
+            connection.execute(text(f'DROP TABLE "{name}"'))
+        elif archive_schema:
+            connection.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{archive_schema}"'))
+            connection.execute(text(f'ALTER TABLE "{name}" SET SCHEMA "{archive_schema}"'))
+    bump_generation(engine)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Manage the year partitions of hiredemployee (Postgres).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="attached year partitions")
+    detach = commands.add_parser("detach", help="detach a year's partition")
+    detach.add_argument("year", type=int)
+    detach.add_argument("--archive-schema", default="archive", help="schema the detached table is moved to")
+    detach.add_argument("--drop", action="store_true", help="drop the detached table instead")
+    args = parser.parse_args(argv)
+
+    from app.database import engine
+    if not is_partitioned(engine):
+        print(f"{TABLE} is not partitioned")
+        return 1
+    if args.command == "list":
+        with engine.connect() as connection:
+            for year in sorted(attached_years(connection)):
+                print(year, partition_name(year))
+        return 0
+    detach_year(engine, args.year, archive_schema=args.archive_schema, drop=args.drop)
+    print(f"{args.year} {'dropped' if args.drop else 'moved to ' + args.archive_schema}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
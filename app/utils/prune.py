@@ -0,0 +1,48 @@
+"""
+Deletion of the rows a full snapshot upload no longer contains
+(`?delete_missing=true`), shared by the upsert modules.
+"""
+import numpy as np
+from sqlalchemy import delete, select
+from app.models import HiredEmployee
+from app.utils import rollup as hires_rollup
+from app.utils.schema import REFERENCES
+
+def missing_ids(connection, model, keep_ids: np.ndarray, chunksize: int = 100_000) -> np.ndarray:
+    """Ids present in `model`'s table but not in `keep_ids`, read with a server-side cursor."""
+    table = model.__table__
+    result = connection.execution_options(yield_per=chunksize).execute(select(table.c.id))
+    existing = [np.array([row[0] for row in rows], dtype=np.int64) for rows in result.partitions()]
+    existing = np.concatenate(existing) if existing else np.empty(0, dtype=np.int64)
+    return np.setdiff1d(existing, keep_ids)
+
+def referenced_ids(connection, model, ids: np.ndarray, batch_size: int = 1000) -> np.ndarray:
+    """The ids among `ids` that rows of another table still reference (see schema.REFERENCES)."""
+    referenced = []
+    for source, columns in REFERENCES.items():
+        for column, target in columns.items():
+            if target is not model:
+                continue
+            table_column = source.__table__.c[column]
+            for i in range(0, len(ids), batch_size):
+                query = select(table_column).distinct().where(table_column.in_(ids[i:i + batch_size].tolist()))
+                referenced.append(np.array(connection.execute(query).scalars().all(), dtype=np.int64))
+    return np.unique(np.concatenate(referenced)) if referenced else np.empty(0, dtype=np.int64)
+
+def delete_missing(model, keep_ids: np.ndarray, engine=None, batch_size: int = 1000, rollup: bool = True) -> np.ndarray:
+    """
+    Delete every row of `model` whose id is not in `keep_ids`, in one
+    transaction, and return the deleted ids. Deleted hires leave the quarterly
+    rollup in the same transaction unless `rollup` is False. Departments and
+    jobs that hires still reference are kept, as there are no foreign keys to
+    refuse their deletion.
+    """
+    table = model.__table__
+    with engine.begin() as connection:
+        doomed = missing_ids(connection, model, np.asarray(keep_ids, dtype=np.int64))
+        doomed = np.setdiff1d(doomed, referenced_ids(connection, model, doomed))
+        if rollup and model is HiredEmployee and len(doomed):
+            hires_rollup.track_delete(connection, doomed)
+        for i in range(0, len(doomed), batch_size):
+            connection.execute(delete(table).where(table.c.id.in_(doomed[i:i + batch_size].tolist())))
+    return doomed
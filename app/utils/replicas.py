@@ -0,0 +1,174 @@
+"""
+Read replicas for the stats endpoints.
+
+Uploads always write to the primary engine. Stats reads go to the read
+engines in turn (round robin), skipping any that failed recently: a replica
+that cannot be reached, or drops a connection, is left out for
+`retry_after` seconds and then tried again. With no healthy replica, reads
+fall back to the primary.
+
+Read-your-writes: every committed upload change bumps a generation counter on
+the primary (DataGeneration), which replicates with the data. A read needs the
+latest generation this process wrote, or the one the client sends in
+X-Min-Generation (upload responses report it), whichever is higher. A
+replica that has not replayed it yet is passed over. Each replica's generation
+is only looked up again while a read needs a newer one.
+
+The generation is bumped with or without replicas, so it also tells the
+processes sharing a primary (app.serve workers) about each other's writes:
+`poll()` reads it from the primary at most every `poll_interval` seconds into
+`observed`. That only tells the process to drop the stats it holds; reads
+still need just this process's writes and X-Min-Generation, so another
+worker's upload does not move them off lagging replicas.
+
+Every read session carries the primary engine in `session.info["primary"]`,
+for stats backends that keep their own copy of the data (stats_inmemory): the
+copy is loaded from, and kept current with, the primary whichever engine the
+session is on.
+"""
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import event, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import Session
+from app.database import pool_status
+from app.models import DataGeneration
+
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+def bump_generation(engine) -> int:
+    """Increment the data generation on `engine` (the primary) and return it."""
+    table = DataGeneration.__table__
+    statement = (
+        _INSERTS[engine.dialect.name](table)
+        .values(id=1, generation=1)
+        .on_conflict_do_update(index_elements=["id"], set_={"generation": table.c.generation + 1})
+        .returning(table.c.generation)
+    )
+    with engine.begin() as connection:
+        return connection.execute(statement).scalar_one()
+
+def read_generation(connection) -> int:
+    """Data generation a database has replayed (0 before the first upload)."""
+    return connection.execute(select(DataGeneration.generation).where(DataGeneration.id == 1)).scalar() or 0
+
+class ReadRouter:
+    """Hands out read sessions on the replicas, or on the primary's `primary_sessionmaker`."""
+
+    def __init__(self, primary, replicas=(), primary_sessionmaker=None, retry_after: float = 5.0, poll_interval: float = 1.0):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.retry_after = retry_after
+        self.poll_interval = poll_interval
+        # Highest generation written through this process: the read-your-writes floor
+        self.generation = 0
+        # Highest generation seen on the primary, other processes' writes included
+        self.observed = 0
+        self._next_poll = 0.0
+        self._primary_sessionmaker = primary_sessionmaker or sessionmaker(bind=primary, class_=Session, expire_on_commit=False)
+        self._sessionmakers = {
+            engine: sessionmaker(bind=engine, class_=Session, info={"primary": primary}) for engine in self.replicas
+        }
+        self._seen = {engine: 0 for engine in self.replicas}
+        self._down_until = {engine: 0.0 for engine in self.replicas}
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        for engine in self.replicas:
+            event.listen(engine, "handle_error", self._on_error)
+
+    def _on_error(self, context):
+        # A connection lost mid-query takes the replica out of rotation
+        if context.is_disconnect:
+            self.mark_down(context.engine)
+
+    def mark_down(self, engine):
+        with self._lock:
+            self._down_until[engine] = time.monotonic() + self.retry_after
+
+    def healthy(self, engine) -> bool:
+        return self._down_until[engine] <= time.monotonic()
+
+    def _candidates(self):
+        """Healthy replicas, starting with the next one in turn."""
+        if not self.replicas:
+            return []
+        start = next(self._turn) % len(self.replicas)
+        ordered = self.replicas[start:] + self.replicas[:start]
+        return [engine for engine in ordered if self.healthy(engine)]
+
+    def _open(self, engine, required: int) -> Session | None:
+        """A session on `engine` if it answers and has replayed `required`, else None."""
+        session = self._sessionmakers[engine]()
+        try:
+            # Checking out the connection now lets an unreachable replica fail over here
+            connection = session.connection()
+            if required > self._seen[engine]:
+                seen = read_generation(connection)
+                with self._lock:
+                    self._seen[engine] = max(self._seen[engine], seen)
+                if required > seen:
+                    session.close()
+                    return None
+        except DBAPIError:
+            session.close()
+            self.mark_down(engine)
+            return None
+        return session
+
+    def record_write(self) -> int:
+        """Bump the data generation after a committed change."""
+        generation = bump_generation(self.primary)
+        with self._lock:
+            self.generation = max(self.generation, generation)
+            self.observed = max(self.observed, generation)
+        return generation
+
+    def poll(self) -> int:
+        """
+        The primary's generation, which includes other processes' writes, read
+        again once `poll_interval` seconds have passed (else the last one
+        known). An unreachable primary leaves the known generation as it is.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_poll:
+                return self.observed
+            self._next_poll = now + self.poll_interval
+        try:
+            with self.primary.connect() as connection:
+                generation = read_generation(connection)
+        except DBAPIError:
+            return self.observed
+        with self._lock:
+            self.observed = max(self.observed, generation)
+            return self.observed
+
+    @contextmanager
+    def session(self, min_generation: int = 0):
+        """A read session on a replica that has everything up to `min_generation` and this process's writes."""
+        required = max(min_generation, self.generation)
+        session = None
+        for engine in self._candidates():
+            session = self._open(engine, required)
+            if session is not None:
+                break
+        if session is None:
+            session = self._primary_sessionmaker()
+            session.info["primary"] = self.primary
+        with session:
+            yield session
+
+    def status(self) -> list[dict]:
+        return [
+            {
+                "url": engine.url.render_as_string(hide_password=True),
+                "healthy": self.healthy(engine),
+                "generation": self._seen[engine],
+                **pool_status(engine.pool),
+            }
+            for engine in self.replicas
+        ]
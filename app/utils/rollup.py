@@ -0,0 +1,162 @@
+"""
+Incremental maintenance of the HiredEmployeeQuarterly rollup.
+
+Every hire with a datetime contributes 1 to its (year, quarter, department_id,
+job_id) bucket; a missing department_id or job_id is bucketed under UNKNOWN_ID.
+The upserts call `track_upsert` (and deletions `track_delete`) inside their own
+transaction before writing, so the rollup always commits together with the
+hires it describes. On Postgres both first lock the hire ids (`lock_hires`),
+so concurrent uploads of the same ids take turns: otherwise two of them could
+both see a new id as absent and count it twice.
+
+Consistency check (rebuilds from hiredemployee and diffs against the table):
+    python -m app.utils.rollup check [--repair]
+"""
+import argparse
+import sys
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, delete, insert, text
+from app.models import HiredEmployee, HiredEmployeeQuarterly
+
+UNKNOWN_ID = -1
+KEY = ["year", "quarter", "department_id", "job_id"]
+
+# Keeps `IN (...)` lists under SQLite's bound-parameter limit
+_LOOKUP_BATCH = 5000
+
+# Hire ids are locked by stripe (id % LOCK_STRIPES), which bounds the advisory
+# locks a transaction holds however many ids it writes
+LOCK_STRIPES = 256
+_LOCK_NAMESPACE = 511  # first key of pg_advisory_xact_lock(int, int), for hire ids
+
+def rollup_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """Bucket key of each hire with a datetime."""
+    dt = pd.to_datetime(df["datetime"])
+    dated = dt.notna()
+    dt = dt[dated]
+    return pd.DataFrame({
+        "year": dt.dt.year.astype("int64"),
+        "quarter": dt.dt.quarter.astype("int64"),
+        "department_id": pd.to_numeric(df.loc[dated, "department_id"]).fillna(UNKNOWN_ID).astype("int64"),
+        "job_id": pd.to_numeric(df.loc[dated, "job_id"]).fillna(UNKNOWN_ID).astype("int64"),
+    })
+
+def count_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """Hire counts per bucket."""
+    return rollup_keys(df).value_counts().rename("hired_count").reset_index()
+
+def fetch_hires(connection, ids) -> pd.DataFrame:
+    """Current (id, datetime, department_id, job_id) of the given hire ids."""
+    ids = [int(i) for i in pd.unique(pd.Series(ids).dropna())]
+    frames = []
+    for i in range(0, len(ids), _LOOKUP_BATCH):
+        query = (
+            select(HiredEmployee.id, HiredEmployee.datetime, HiredEmployee.department_id, HiredEmployee.job_id)
+            .where(HiredEmployee.id.in_(ids[i:i + _LOOKUP_BATCH]))
+        )
+        frames.append(pd.DataFrame(connection.execute(query).all(), columns=["id", "datetime", "department_id", "job_id"]))
+    if not frames:
+        return pd.DataFrame(columns=["id", "datetime", "department_id", "job_id"])
+    return pd.concat(frames, ignore_index=True)
+
+def lock_hires(connection, ids):
+    """
+    Lock the stripes of `ids` until the transaction ends (Postgres; SQLite
+    already has a single writer). Stripes are taken in ascending order, so
+    transactions locking overlapping sets cannot deadlock.
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    stripes = np.unique(pd.to_numeric(pd.Series(ids)).dropna().to_numpy(dtype=np.int64) % LOCK_STRIPES)
+    connection.execute(
+        text("SELECT pg_advisory_xact_lock(:namespace, stripe) FROM unnest(CAST(:stripes AS integer[])) AS stripe"),
+        {"namespace": _LOCK_NAMESPACE, "stripes": stripes.tolist()},
+    )
+
+def apply_delta(connection, old: pd.DataFrame, new: pd.DataFrame):
+    """Move the rollup from describing the `old` hire rows to describing the `new` ones."""
+    delta = pd.concat([count_keys(new), count_keys(old).assign(hired_count=lambda d: -d["hired_count"])])
+    delta = delta.groupby(KEY, as_index=False)["hired_count"].sum()
+    delta = delta[delta["hired_count"] != 0]
+    if delta.empty:
+        return
+
+    table = HiredEmployeeQuarterly.__table__
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise NotImplementedError(f"Rollup maintenance is not implemented for {dialect}")
+
+    stmt = dialect_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=KEY,
+        set_={"hired_count": table.c.hired_count + stmt.excluded.hired_count},
+    )
+    connection.execute(stmt, delta.astype("int64").to_dict(orient="records"))
+    connection.execute(delete(table).where(table.c.hired_count == 0))
+
+def track_upsert(connection, df: pd.DataFrame):
+    """Apply the rollup delta of upserting the hires in `df` (last occurrence of an id wins)."""
+    new = df.drop_duplicates(subset="id", keep="last")
+    lock_hires(connection, new["id"])
+    apply_delta(connection, fetch_hires(connection, new["id"]), new)
+
+def track_delete(connection, ids):
+    """Apply the rollup delta of deleting the hires `ids`."""
+    gone = pd.DataFrame(columns=["id", "datetime", "department_id", "job_id"])
+    lock_hires(connection, ids)
+    apply_delta(connection, fetch_hires(connection, ids), gone)
+
+def expected_rollup(connection, chunksize: int = 100_000) -> pd.DataFrame:
+    """Rebuild the rollup from scratch out of the hiredemployee table."""
+    query = select(HiredEmployee.datetime, HiredEmployee.department_id, HiredEmployee.job_id)
+    counts = [
+        count_keys(pd.DataFrame(rows, columns=["datetime", "department_id", "job_id"]))
+        for rows in connection.execution_options(yield_per=chunksize).execute(query).partitions()
+    ]
+    if not counts:
+        return pd.DataFrame(columns=KEY + ["hired_count"], dtype="int64")
+    return pd.concat(counts).groupby(KEY, as_index=False)["hired_count"].sum()
+
+def diff_rollup(connection) -> pd.DataFrame:
+    """Buckets where the maintained rollup disagrees with a fresh rebuild."""
+    table = HiredEmployeeQuarterly.__table__
+    actual = pd.DataFrame(connection.execute(select(table)).all(), columns=KEY + ["hired_count"])
+    merged = expected_rollup(connection).merge(
+        actual, on=KEY, how="outer", suffixes=("_expected", "_actual")
+    ).fillna(0)
+    return merged[merged["hired_count_expected"] != merged["hired_count_actual"]].astype("int64")
+
+def rebuild_rollup(connection):
+    """Replace the rollup contents with a fresh rebuild."""
+    table = HiredEmployeeQuarterly.__table__
+    expected = expected_rollup(connection)
+    connection.execute(delete(table))
+    if not expected.empty:
+        connection.execute(insert(table), expected.astype("int64").to_dict(orient="records"))
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check the hiredemployeequarterly rollup against hiredemployee.")
+    parser.add_argument("command", choices=["check"])
+    parser.add_argument("--repair", action="store_true", help="rebuild the rollup when it is inconsistent")
+    args = parser.parse_args(argv)
+
+    from app.database import engine
+    with engine.begin() as connection:
+        mismatches = diff_rollup(connection)
+        if mismatches.empty:
+            print("rollup is consistent")
+            return 0
+        print(f"{len(mismatches)} inconsistent bucket(s):")
+        print(mismatches.to_string(index=False))
+        if args.repair:
+            rebuild_rollup(connection)
+            print("rollup rebuilt")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
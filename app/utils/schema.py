@@ -0,0 +1,156 @@
+"""
+Typed, vectorized validation of uploaded tables, driven by app.models.
+
+Each column is converted to the dtype its model column implies (nullable Int64,
+naive-UTC datetime64, string) with whole-column operations. Rows that cannot be
+loaded are set aside with a reason instead of failing the upload, and the
+accepted rows stay columnar until the upsert.
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype, is_integer_dtype
+from sqlalchemy import DateTime, Integer, select
+from app.models import HiredEmployee, Department, Job
+
+# Columns checked against a reference table (no database foreign keys, so
+# hires may still be loaded before their departments when checks are off)
+REFERENCES = {
+    HiredEmployee: {"department_id": Department, "job_id": Job},
+}
+
+REJECTION_COLUMNS = ["row", "column", "reason", "value"]
+
+def _to_int(raw: pd.Series):
+    if is_integer_dtype(raw):
+        return raw.astype("Int64"), None
+    numeric = pd.to_numeric(raw, errors="coerce")
+    bad = (numeric.isna() & raw.notna()) | (numeric.notna() & (numeric % 1 != 0))
+    return numeric.where(~bad).astype("Int64"), bad
+
+def _to_datetime(raw: pd.Series):
+    if is_datetime64_any_dtype(raw):
+        values = raw
+    else:
+        values = pd.to_datetime(raw, errors="coerce", utc=True, format="ISO8601")
+        retry = values.isna() & raw.notna()
+        if retry.any():
+            # Rare non-ISO inputs take the slower element-wise parser
+            values = values.copy()
+            values[retry] = pd.to_datetime(raw[retry], errors="coerce", utc=True, format="mixed")
+    if getattr(values.dt, "tz", None) is not None:
+        values = values.dt.tz_convert("UTC").dt.tz_localize(None)
+    values = values.astype("datetime64[ns]")
+    return values, values.isna() & raw.notna()
+
+def _rejections(mask: pd.Series, column: str, reason: str, raw: pd.Series) -> pd.DataFrame:
+    index = mask.index[mask.to_numpy(dtype=bool, na_value=False)]
+    return pd.DataFrame({
+        "row": index.to_numpy(dtype=np.int64),
+        "column": column,
+        "reason": reason,
+        "value": raw.loc[index].astype(str).to_numpy(),
+    })
+
+def validate(df: pd.DataFrame, model) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Convert `df` to the model's column dtypes.
+
+    Returns (accepted rows, rejections), where rejections has one row per
+    problem with the chunk-relative `row` position, `column`, `reason` and raw
+    `value`. Rows repeating an id are all kept; drop_superseded removes them
+    once the reference check has run.
+    """
+    df = df.reset_index(drop=True)
+    columns = {}
+    problems = []
+    for c in model.__table__.columns:
+        raw = df[c.name]
+        if isinstance(c.type, Integer):
+            values, bad = _to_int(raw)
+            reason = "not an integer"
+        elif isinstance(c.type, DateTime):
+            values, bad = _to_datetime(raw)
+            reason = "not a datetime"
+        else:
+            values, bad = raw.astype("string"), None
+        if bad is not None and bad.any():
+            problems.append(_rejections(bad, c.name, reason, raw))
+        if c.primary_key:
+            missing = values.isna() & raw.isna()
+            if missing.any():
+                problems.append(_rejections(missing, c.name, "missing", raw))
+        columns[c.name] = values
+    frame = pd.DataFrame(columns)
+
+    rejected = np.zeros(len(frame), dtype=bool)
+    for problem in problems:
+        rejected[problem["row"].to_numpy()] = True
+
+    rejections = pd.concat(problems, ignore_index=True) if problems else pd.DataFrame(columns=REJECTION_COLUMNS)
+    return frame[~rejected], rejections
+
+def load_reference_ids(connection, model) -> dict:
+    """Known ids of every reference table of `model`, by referencing column."""
+    return {
+        column: np.array(connection.execute(select(target.id)).scalars().all(), dtype=np.int64)
+        for column, target in REFERENCES.get(model, {}).items()
+    }
+
+def check_references(df: pd.DataFrame, reference_ids: dict) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Reject rows whose non-null reference columns name an id missing from the reference table."""
+    unknown = pd.Series(False, index=df.index)
+    problems = []
+    for column, known in reference_ids.items():
+        values = df[column]
+        missing = values.notna() & ~values.isin(known)
+        if missing.any():
+            problems.append(_rejections(missing, column, f"unknown {column.removesuffix('_id')}", values))
+            unknown |= missing
+    if not problems:
+        return df, pd.DataFrame(columns=REJECTION_COLUMNS)
+    return df[~unknown], pd.concat(problems, ignore_index=True)
+
+SUPERSEDED = "duplicate id, superseded by a later row"
+
+def drop_superseded(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Of several accepted rows with the same id keep only the last, matching how
+    later chunks overwrite earlier ones. Runs after check_references, so a row
+    is only superseded by one that will be written.
+    """
+    superseded = df["id"].duplicated(keep="last")
+    if not superseded.any():
+        return df, pd.DataFrame(columns=REJECTION_COLUMNS)
+    return df[~superseded], _rejections(superseded, "id", SUPERSEDED, df["id"])
+
+def superseded_rows(rows: np.ndarray, ids: np.ndarray) -> pd.DataFrame:
+    """drop_superseded's rejections for rows an earlier chunk wrote, by 0-based data row, once a later chunk repeats their ids."""
+    return pd.DataFrame({"row": rows, "column": "id", "reason": SUPERSEDED, "value": ids.astype(str)})
+
+class RejectionReport:
+    """Running summary of rejected rows: counts per problem and the first few examples."""
+
+    def __init__(self, max_examples: int = 20):
+        self.max_examples = max_examples
+        self.rows = 0
+        self.by_reason: dict = {}
+        self.examples: list = []
+
+    def add(self, rejections: pd.DataFrame, row_offset: int):
+        """Record chunk rejections; `row_offset` turns chunk positions into 1-based data row numbers."""
+        if rejections.empty:
+            return
+        self.rows += rejections["row"].nunique()
+        for (column, reason), count in rejections.groupby(["column", "reason"]).size().items():
+            key = f"{column}: {reason}"
+            self.by_reason[key] = self.by_reason.get(key, 0) + int(count)
+        for record in rejections.head(self.max_examples - len(self.examples)).itertuples(index=False):
+            self.examples.append({
+                "row": int(record.row) + row_offset + 1,
+                "column": record.column,
+                "reason": record.reason,
+                "value": record.value,
+            })
+
+    def to_dict(self) -> dict:
+        return {"rows": self.rows, "by_reason": self.by_reason, "examples": self.examples}
@@ -0,0 +1,473 @@
+"""
+In-memory columnar stats backend.
+
+Keeps a NumPy snapshot of the hires (sorted ids, int64 epoch seconds, int32
+department and job codes), of the department and job tables, and of a
+month x department x job count cube built from them with bincount. Quarterly
+stats, top departments and month/quarter series are reductions over a slice
+of the cube, so their cost follows the size of the answer rather than the
+number of hires; weekly series group the hire columns.
+
+The snapshot is loaded from the database on first use and kept current by
+`after_upsert`, which create_app calls after every committed upsert: changed
+hires are taken out of the cube and their new versions added, like the SQL
+rollup. Rows deleted by full snapshot uploads are taken out by `after_delete`.
+
+Results match stats_sql: hires only count when their department (and, except
+for top departments, job) exists, rows are grouped by department and job name,
+and the order is the same, except for hires before 1900 or after 2099: the
+cube stops at CUBE_MONTHS, so they are left out of the monthly and quarterly
+counts. The snapshot counts them (`outside_cube`), and a warning is logged
+when there are more of them.
+
+The snapshot belongs to the process: each worker applies its own uploads,
+and create_app calls `after_external_write` once another process's upload
+shows up in the data generation, which loads the snapshot again in a
+background thread; requests keep reading the current snapshot until the new
+one replaces it. There is one
+snapshot per primary engine; with read replicas it is still loaded from the
+primary, since that is where after_upsert's changes are committed. Streaming
+formats and the hire listing still go to the database.
+"""
+import logging
+import threading
+import weakref
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from sqlmodel import Session, select
+from app.models import HiredEmployee, Department, Job
+from app.utils.stats_rollup import hired_employees_series_query, hired_employees_stats_query, top_departments_query
+from app.utils.stats_sql import get_hired_employees, hired_employees_query, year_bounds
+
+NO_DATETIME = np.iinfo(np.int64).min
+NO_CODE = -1
+
+_LOAD_BATCH = 100_000
+
+logger = logging.getLogger("app.stats_inmemory")
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    Immutable columns; an upsert builds a new Snapshot rather than changing one
+    in place. Only `monthly` is shared with the next Snapshot and updated in
+    place (it is reallocated to grow), so a read overlapping an upsert may see
+    part of its counts.
+    """
+    ids: np.ndarray                 # int64, sorted
+    epoch: np.ndarray               # int64 seconds, NO_DATETIME when missing
+    department: np.ndarray          # int32 department code, NO_CODE when missing
+    job: np.ndarray                 # int32 job code, NO_CODE when missing
+    department_ids: np.ndarray      # int64 id of each department code
+    department_names: np.ndarray    # object; None for ids referenced by hires but not loaded
+    job_ids: np.ndarray
+    job_names: np.ndarray
+    monthly: np.ndarray             # int64 hires per [month - month_origin, department code, job code + 1]
+    month_origin: int               # months since 1970-01 of monthly[0]
+    department_groups: np.ndarray   # name group of each department code (see _name_groups), -1 if not loaded
+    department_labels: np.ndarray   # sorted distinct department names
+    job_groups: np.ndarray
+    job_labels: np.ndarray
+    outside_cube: int               # dated hires of a department left out of monthly, see CUBE_MONTHS
+
+class _Dimension:
+    """Append-only id -> dense code map, so existing hire codes never change."""
+
+    def __init__(self):
+        self.codes: dict[int, int] = {}
+        self.ids: list[int] = []
+        self.names: list = []
+
+    def encode(self, ids: pd.Series) -> np.ndarray:
+        values = pd.to_numeric(ids).astype("Int64")
+        missing = values.isna().to_numpy()
+        raw = values.fillna(0).to_numpy(dtype=np.int64)
+        unique, inverse = np.unique(raw[~missing], return_inverse=True)
+        unique_codes = np.array([self._code(int(i)) for i in unique], dtype=np.int32)
+        codes = np.full(len(raw), NO_CODE, dtype=np.int32)
+        codes[~missing] = unique_codes[inverse]
+        return codes
+
+    def set_names(self, ids: pd.Series, names: pd.Series):
+        for i, name in zip(pd.to_numeric(ids).astype("int64"), names.astype(object).where(names.notna(), None)):
+            self.names[self._code(int(i))] = name
+
+    def _code(self, i: int) -> int:
+        code = self.codes.get(i)
+        if code is None:
+            code = self.codes[i] = len(self.ids)
+            self.ids.append(i)
+            self.names.append(None)
+        return code
+
+    def arrays(self):
+        return np.array(self.ids, dtype=np.int64), np.array(self.names, dtype=object)
+
+# Months since 1970-01 the cube may hold, [start, stop): 1900-01 to 2099-12, so
+# one far-off datetime cannot make it span centuries
+CUBE_MONTHS = ((1900 - 1970) * 12, (2100 - 1970) * 12)
+
+def _to_epoch(values: pd.Series) -> np.ndarray:
+    stamps = pd.to_datetime(values)
+    epoch = stamps.to_numpy(dtype="datetime64[s]").astype(np.int64)
+    epoch[stamps.isna().to_numpy()] = NO_DATETIME
+    return epoch
+
+def _month(epoch: np.ndarray) -> np.ndarray:
+    return epoch.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+
+def _count_months(cube, origin, shape, epoch, department, job, sign):
+    """
+    Add (sign=1) or remove (sign=-1) hires in the month x department x job cube,
+    in place. The cube is only reallocated to grow: to `shape` (departments,
+    jobs + 1), or to hires' months before or after it within CUBE_MONTHS.
+    Returns (cube, origin) and the number of hires outside CUBE_MONTHS, which
+    are left out.
+    """
+    counted = (epoch != NO_DATETIME) & (department != NO_CODE)
+    months = _month(epoch[counted])
+    inside = (months >= CUBE_MONTHS[0]) & (months < CUBE_MONTHS[1])
+    outside = int(len(months) - np.count_nonzero(inside))
+    months = months[inside]
+    counted[counted] = inside
+    start, stop = origin, origin + cube.shape[0]
+    if len(months):
+        start = months.min() if not cube.shape[0] else min(start, months.min())
+        stop = months.max() + 1 if not cube.shape[0] else max(stop, months.max() + 1)
+    if (stop - start, *shape) != cube.shape:
+        grown = np.zeros((stop - start, *shape), dtype=np.int64)
+        grown[origin - start:origin - start + cube.shape[0], :cube.shape[1], :cube.shape[2]] = cube
+        cube, origin = grown, start
+    if len(months):
+        # Job code + 1, so hires without a job (NO_CODE) land in column 0
+        cells = np.ravel_multi_index((months - origin, department[counted], job[counted] + 1), cube.shape)
+        cells, counts = np.unique(cells, return_counts=True)
+        cube.reshape(-1)[cells] += sign * counts
+    return cube, int(origin), outside
+
+def _name_groups(names: np.ndarray):
+    """Group of each code by name, numbered in sorted name order (-1 when not loaded), and the group names."""
+    known = np.array([name is not None for name in names], dtype=bool)
+    groups = np.full(len(names), -1, dtype=np.int64)
+    labels = np.empty(0, dtype=str)
+    if known.any():
+        labels, groups[known] = np.unique(names[known].astype(str), return_inverse=True)
+    return groups, labels
+
+class _Store:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snapshot: Snapshot | None = None
+        self.departments = _Dimension()
+        self.jobs = _Dimension()
+        # While a background reload runs: the changes applied meanwhile, to
+        # replay on the reloaded store; `stale` once it must load again
+        self.journal: list | None = None
+        self.stale = False
+
+    def _shape(self):
+        return len(self.departments.ids), len(self.jobs.ids) + 1
+
+    def _publish(self, ids, epoch, department, job, monthly, month_origin, outside_cube, was_outside=0):
+        department_ids, department_names = self.departments.arrays()
+        job_ids, job_names = self.jobs.arrays()
+        if outside_cube > was_outside:
+            logger.warning(
+                "%d hires before 1900 or after 2099 are left out of the in-memory monthly and quarterly stats", outside_cube
+            )
+        self.snapshot = Snapshot(
+            ids, epoch, department, job, department_ids, department_names, job_ids, job_names, monthly, month_origin,
+            *_name_groups(department_names), *_name_groups(job_names), outside_cube,
+        )
+
+    def load(self, engine):
+        self.departments, self.jobs = _Dimension(), _Dimension()
+        parts = {"ids": [], "epoch": [], "department": [], "job": []}
+        with Session(engine) as session:
+            for model, dimension in ((Department, self.departments), (Job, self.jobs)):
+                rows = session.exec(select(model.id, getattr(model, model.__tablename__))).all()
+                frame = pd.DataFrame(rows, columns=["id", "name"])
+                dimension.set_names(frame["id"], frame["name"])
+            query = select(HiredEmployee.id, HiredEmployee.datetime, HiredEmployee.department_id, HiredEmployee.job_id)
+            for rows in session.exec(query.execution_options(yield_per=_LOAD_BATCH)).partitions():
+                frame = pd.DataFrame(rows, columns=["id", "datetime", "department_id", "job_id"])
+                parts["ids"].append(frame["id"].to_numpy(dtype=np.int64))
+                parts["epoch"].append(_to_epoch(frame["datetime"]))
+                parts["department"].append(self.departments.encode(frame["department_id"]))
+                parts["job"].append(self.jobs.encode(frame["job_id"]))
+        dtypes = {"ids": np.int64, "epoch": np.int64, "department": np.int32, "job": np.int32}
+        columns = {
+            name: np.concatenate(values) if values else np.empty(0, dtype=dtypes[name]) for name, values in parts.items()
+        }
+        order = np.argsort(columns["ids"], kind="stable")
+        ids, epoch, department, job = (columns[name][order] for name in ("ids", "epoch", "department", "job"))
+        monthly, origin, outside = _count_months(
+            np.zeros((0, 0, 0), dtype=np.int64), 0, self._shape(), epoch, department, job, 1
+        )
+        self._publish(ids, epoch, department, job, monthly, origin, outside)
+
+    def apply(self, df: pd.DataFrame, model):
+        current = self.snapshot
+        if model is Department or model is Job:
+            dimension = self.departments if model is Department else self.jobs
+            dimension.set_names(df["id"], df[model.__tablename__])
+            monthly, origin, _ = _count_months(
+                current.monthly, current.month_origin, self._shape(), *(np.empty(0, dtype=np.int64),) * 3, 1
+            )
+            self._publish(
+                current.ids, current.epoch, current.department, current.job, monthly, origin,
+                current.outside_cube, current.outside_cube,
+            )
+            return
+        if model is not HiredEmployee:
+            return
+
+        df = df.drop_duplicates("id", keep="last").sort_values("id")
+        new_ids = pd.to_numeric(df["id"]).to_numpy(dtype=np.int64)
+        new_epoch = _to_epoch(df["datetime"])
+        new_department = self.departments.encode(df["department_id"])
+        new_job = self.jobs.encode(df["job_id"])
+
+        position = np.searchsorted(current.ids, new_ids)
+        exists = position < len(current.ids)
+        exists[exists] = current.ids[position[exists]] == new_ids[exists]
+        replaced = position[exists]
+
+        monthly, origin, removed = _count_months(
+            current.monthly, current.month_origin, self._shape(),
+            current.epoch[replaced], current.department[replaced], current.job[replaced], -1,
+        )
+        monthly, origin, added = _count_months(monthly, origin, self._shape(), new_epoch, new_department, new_job, 1)
+
+        columns = []
+        for old, new in (
+            (current.ids, new_ids), (current.epoch, new_epoch), (current.department, new_department), (current.job, new_job)
+        ):
+            column = old.copy()
+            column[replaced] = new[exists]
+            # Inserting at the pre-insert positions keeps ids sorted
+            columns.append(np.insert(column, position[~exists], new[~exists]))
+        self._publish(*columns, monthly, origin, current.outside_cube - removed + added, current.outside_cube)
+
+    def remove(self, ids: np.ndarray, model):
+        current = self.snapshot
+        if model is Department or model is Job:
+            # A deleted department or job is one that is no longer loaded
+            self.apply(pd.DataFrame({"id": ids, model.__tablename__: None}), model)
+            return
+        if model is not HiredEmployee:
+            return
+
+        position = np.searchsorted(current.ids, ids)
+        exists = position < len(current.ids)
+        exists[exists] = current.ids[position[exists]] == ids[exists]
+        removed = position[exists]
+        monthly, origin, outside = _count_months(
+            current.monthly, current.month_origin, self._shape(),
+            current.epoch[removed], current.department[removed], current.job[removed], -1,
+        )
+        columns = (np.delete(column, removed) for column in (current.ids, current.epoch, current.department, current.job))
+        self._publish(*columns, monthly, origin, current.outside_cube - outside, current.outside_cube)
+
+_stores = weakref.WeakKeyDictionary()
+_stores_lock = threading.Lock()
+
+def _store(engine) -> _Store:
+    with _stores_lock:
+        store = _stores.get(engine)
+        if store is None:
+            store = _stores[engine] = _Store()
+        return store
+
+def snapshot(engine) -> Snapshot:
+    """Current snapshot of `engine`'s data, loading it on first use."""
+    store = _store(engine)
+    current = store.snapshot
+    if current is None:
+        with store.lock:
+            if store.snapshot is None:
+                store.load(engine)
+            current = store.snapshot
+    return current
+
+def after_external_write(engine, on_reload=None):
+    """
+    Another process changed the data: load a loaded snapshot again in a
+    background thread, calling `on_reload()` once the new one is in place.
+    Requests keep reading the current snapshot until then.
+    """
+    store = _store(engine)
+    with store.lock:
+        if store.snapshot is None:
+            return
+        if store.journal is not None:
+            # The running reload may have read the data before this write
+            store.stale = True
+            return
+        store.journal = []
+    threading.Thread(
+        target=_reload_in_background, args=(store, engine, on_reload), name="stats-inmemory-reload", daemon=True
+    ).start()
+
+def _reload_in_background(store: _Store, engine, on_reload):
+    while True:
+        fresh = _Store()
+        try:
+            fresh.load(engine)
+        except Exception:
+            logger.warning("Reloading the in-memory stats snapshot failed", exc_info=True)
+            with store.lock:
+                store.journal, store.stale = None, False
+            return
+        with store.lock:
+            # This process's uploads during the load may or may not be in it;
+            # applying a change twice leaves the same snapshot, so replay them all
+            for method, *args in store.journal:
+                method(fresh, *args)
+            store.snapshot, store.departments, store.jobs = fresh.snapshot, fresh.departments, fresh.jobs
+            done = not store.stale
+            store.journal, store.stale = (None if done else []), False
+        if on_reload is not None:
+            on_reload()
+        if done:
+            return
+
+def _session_snapshot(session: Session) -> Snapshot:
+    # Read sessions on a replica name the primary (see app.utils.replicas): its
+    # store is the one uploads update
+    return snapshot(session.info.get("primary") or session.get_bind())
+
+def reload(engine):
+    store = _store(engine)
+    with store.lock:
+        store.load(engine)
+
+def after_upsert(df: pd.DataFrame, model, engine):
+    """Fold committed rows into the snapshot; a snapshot not loaded yet will read them from the database."""
+    store = _store(engine)
+    with store.lock:
+        if store.snapshot is not None:
+            store.apply(df, model)
+            if store.journal is not None:
+                store.journal.append((_Store.apply, df, model))
+
+def after_delete(ids, model, engine):
+    """Drop deleted rows from the snapshot."""
+    store = _store(engine)
+    with store.lock:
+        if store.snapshot is not None:
+            ids = np.sort(np.asarray(ids, dtype=np.int64))
+            store.remove(ids, model)
+            if store.journal is not None:
+                store.journal.append((_Store.remove, ids, model))
+
+def _months(snap: Snapshot, from_year: int, to_year: int, with_job: bool = True) -> tuple[np.ndarray, int]:
+    """
+    Cube slice of the whole years from_year .. to_year that overlap the data,
+    zero for departments (jobs) not loaded, and the index of its first month
+    from Jan from_year. Years without data are left out, so the slice never
+    outgrows the cube.
+    """
+    first, stop = (from_year - 1970) * 12, (to_year - 1969) * 12
+    low, high = max(first, snap.month_origin), min(stop, snap.month_origin + snap.monthly.shape[0])
+    if low >= high:
+        return np.zeros((0, *snap.monthly.shape[1:]), dtype=np.int64), 0
+    start, end = first + (low - first) // 12 * 12, first + -(-(high - first) // 12) * 12
+    months = np.zeros((end - start, *snap.monthly.shape[1:]), dtype=np.int64)
+    months[low - start:high - start] = snap.monthly[low - snap.month_origin:high - snap.month_origin]
+    months[:, snap.department_groups < 0] = 0
+    if with_job:
+        months[:, :, 0] = 0
+        months[:, :, 1:][:, :, snap.job_groups < 0] = 0
+    return months, start - first
+
+def _grouped(snap: Snapshot, counts: np.ndarray):
+    """
+    Sum a (period, department code, job code + 1) count array per (period,
+    department name, job name), as SQL groups by the names. Returns parallel
+    arrays of period index, department name group, job name group and count,
+    in SQL's order, plus the department and job group names.
+    """
+    department_groups, department_labels = snap.department_groups, snap.department_labels
+    job_groups, job_labels = snap.job_groups, snap.job_labels
+    periods, departments, jobs = np.nonzero(counts)
+    values = counts[periods, departments, jobs]
+    department_group, job_group = department_groups[departments], job_groups[jobs - 1]
+    keep = (department_group >= 0) & (job_group >= 0) & (jobs > 0)
+    n_jobs = max(len(job_labels), 1)
+    width = max(len(department_labels), 1) * n_jobs
+    keys, inverse = np.unique(periods[keep] * width + department_group[keep] * n_jobs + job_group[keep], return_inverse=True)
+    sums = np.bincount(inverse, weights=values[keep], minlength=len(keys)).astype(np.int64)
+    return keys // width, keys % width // n_jobs, keys % n_jobs, sums, department_labels, job_labels
+
+def get_hired_employees_stats(year: int, session: Session):
+    snap = _session_snapshot(session)
+    months, _ = _months(snap, year, year)
+    quarters = months.reshape(months.shape[0] // 3, 3, *months.shape[1:]).sum(axis=1)
+    quarter, department, job, hired, department_labels, job_labels = _grouped(snap, quarters)
+    n_jobs = max(len(job_labels), 1)
+    pairs, pair = np.unique(department * n_jobs + job, return_inverse=True)
+    by_quarter = np.zeros((len(pairs), 4), dtype=np.int64)
+    by_quarter[pair, quarter] = hired
+    departments = department_labels[pairs // n_jobs].tolist()
+    jobs = job_labels[pairs % n_jobs].tolist()
+    return [
+        {"department": d, "job": j, "Q1": q1, "Q2": q2, "Q3": q3, "Q4": q4}
+        for d, j, (q1, q2, q3, q4) in zip(departments, jobs, by_quarter.tolist())
+    ]
+
+def get_top_departments(year: int, session: Session):
+    snap = _session_snapshot(session)
+    # Every hire of a known department counts, with or without a job
+    hired = _months(snap, year, year, with_job=False)[0].sum(axis=(0, 2))
+    present = np.flatnonzero(hired)
+    if not len(present):
+        return []
+    mean_value = hired[present].mean()
+    above = present[hired[present] > mean_value]
+    above = above[np.lexsort((snap.department_ids[above], -hired[above]))]
+    return [
+        {"id": int(snap.department_ids[code]), "department": snap.department_names[code], "hired": int(hired[code])}
+        for code in above
+    ]
+
+def _weekly(snap: Snapshot, from_year: int, to_year: int):
+    """Hires per (Monday, department code, job code + 1) from the hire columns, with the cube's layout."""
+    start, end = (np.datetime64(bound, "s").astype(np.int64) for bound in (year_bounds(from_year)[0], year_bounds(to_year)[1]))
+    known_department = np.append(snap.department_groups >= 0, False)
+    known_job = np.append(snap.job_groups >= 0, False)
+    # The trailing False is what a NO_CODE (-1) index picks up
+    mask = (snap.epoch >= start) & (snap.epoch < end) & known_department[snap.department] & known_job[snap.job]
+    days = snap.epoch[mask] // 86_400
+    # 1970-01-01 was a Thursday; weeks start on Monday
+    mondays = days - (days + 3) % 7
+    first = int(mondays.min()) if len(mondays) else 0
+    shape = (int(mondays.max()) - first + 1 if len(mondays) else 0, *snap.monthly.shape[1:])
+    cells = np.ravel_multi_index((mondays - first, snap.department[mask], snap.job[mask] + 1), shape)
+    return np.bincount(cells, minlength=int(np.prod(shape))).reshape(shape), np.datetime64(first, "D")
+
+def get_hired_employees_series(from_year: int, to_year: int, granularity: str, session: Session):
+    snap = _session_snapshot(session)
+    if granularity == "week":
+        counts, first = _weekly(snap, from_year, to_year)
+        period = lambda i: str(first + i)
+    elif granularity in ("quarter", "month"):
+        counts, offset = _months(snap, from_year, to_year)
+        if granularity == "quarter":
+            counts = counts.reshape(counts.shape[0] // 3, 3, *counts.shape[1:]).sum(axis=1)
+        step = 3 if granularity == "quarter" else 1
+        first = np.datetime64(f"{from_year:04d}-01", "M") + offset
+        period = lambda i: str((first + i * step).astype("datetime64[D]"))
+    else:
+        raise ValueError(f"Unknown granularity {granularity!r}")
+    index, department, job, hired, department_labels, job_labels = _grouped(snap, counts)
+    return {
+        "from": from_year,
+        "to": to_year,
+        "granularity": granularity,
+        "period": [period(i) for i in index.tolist()],
+        "department": department_labels[department].tolist(),
+        "job": job_labels[job].tolist(),
+        "hired": hired.tolist(),
+    }
@@ -0,0 +1,109 @@
+from sqlmodel import Session, select
+from sqlalchemy import func, case, cast, String
+from app.models import HiredEmployeeQuarterly, Department, Job
+from app.utils import stats_sql
+from app.utils.stats_sql import get_hired_employees, hired_employees_query
+
+def hired_employees_stats_query(year: int):
+    """
+    Rollup-backed rewrite of get_hired_employees_stats.
+    Reads only the year's HiredEmployeeQuarterly buckets, never the hires themselves.
+    """
+    rollup = HiredEmployeeQuarterly
+    query = (
+        select(
+            Department.department.label("department"),
+            Job.job.label("job"),
+            func.sum(case((rollup.quarter == 1, rollup.hired_count), else_=0)).label("Q1"),
+            func.sum(case((rollup.quarter == 2, rollup.hired_count), else_=0)).label("Q2"),
+            func.sum(case((rollup.quarter == 3, rollup.hired_count), else_=0)).label("Q3"),
+            func.sum(case((rollup.quarter == 4, rollup.hired_count), else_=0)).label("Q4"),
+        )
+        .join(Department, Department.id == rollup.department_id)
+        .join(Job, Job.id == rollup.job_id)
+        .filter(rollup.year == year)
+        .group_by(Department.department, Job.job)
+        .order_by(Department.department, Job.job)
+    )
+
+    return query
+
+def get_hired_employees_stats(year: int, session: Session):
+    results = session.exec(hired_employees_stats_query(year))
+
+    return [
+        {"department": r.department, "job": r.job, "Q1": r.Q1, "Q2": r.Q2, "Q3": r.Q3, "Q4": r.Q4}
+        for r in results
+    ]
+
+def hired_employees_series_query(from_year: int, to_year: int, granularity: str = "quarter"):
+    """
+    Quarters straight from the rollup; months and weeks are finer than its
+    buckets and come from the hires query of app.utils.stats_sql instead.
+    """
+    if granularity != "quarter":
+        return stats_sql.hired_employees_series_query(from_year, to_year, granularity)
+
+    rollup = HiredEmployeeQuarterly
+    first_month = case((rollup.quarter == 1, "-01-01"), (rollup.quarter == 2, "-04-01"), (rollup.quarter == 3, "-07-01"), else_="-10-01")
+    period = (cast(rollup.year, String) + first_month).label("period")
+    query = (
+        select(
+            period,
+            Department.department.label("department"),
+            Job.job.label("job"),
+            func.sum(rollup.hired_count).label("hired"),
+        )
+        .join(Department, Department.id == rollup.department_id)
+        .join(Job, Job.id == rollup.job_id)
+        .filter(rollup.year >= from_year, rollup.year <= to_year)
+        .group_by(rollup.year, rollup.quarter, Department.department, Job.job)
+        .order_by(rollup.year, rollup.quarter, Department.department, Job.job)
+    )
+
+    return query
+
+def get_hired_employees_series(from_year: int, to_year: int, granularity: str, session: Session):
+    results = session.exec(hired_employees_series_query(from_year, to_year, granularity)).all()
+    return {
+        "from": from_year,
+        "to": to_year,
+        "granularity": granularity,
+        "period": [str(r.period) for r in results],
+        "department": [r.department for r in results],
+        "job": [r.job for r in results],
+        "hired": [r.hired for r in results],
+    }
+
+def top_departments_query(year: int):
+    """
+    Rollup-backed rewrite of get_top_departments.
+    """
+    rollup = HiredEmployeeQuarterly
+    base_query = (
+        select(
+            Department.id,
+            Department.department,
+            func.sum(rollup.hired_count).label("hired"),
+        )
+        .join(Department, Department.id == rollup.department_id)
+        .filter(rollup.year == year)
+        .group_by(Department.id, Department.department)
+        .cte("base_query")
+    )
+
+    avg_query = select(func.avg(base_query.c.hired))
+    mean_value = avg_query.scalar_subquery()
+
+    query = (
+        select(base_query.c.id, base_query.c.department, base_query.c.hired)
+        .filter(base_query.c.hired > mean_value)
+        .order_by(base_query.c.hired.desc())
+    )
+
+    return query
+
+def get_top_departments(year: int, session: Session):
+    results = session.exec(top_departments_query(year))
+    return [{"id": r.id, "department": r.department, "hired": r.hired} for r in results]
+
@@ -0,0 +1,293 @@
+"""
+SQL stats backend for both Postgres and SQLite.
+
+The statements are built once, at import, with bound parameters for the year
+range, the keyset position and the page size. The only dialect-specific parts
+are the date functions below, which are compiled per dialect. Because every call
+executes the same statement object, SQLAlchemy finds its compiled form in the
+engine's compiled cache, and a request pays no construction or compilation cost.
+
+Postgres keeps no plan across executions through psycopg2. With the psycopg 3
+driver, repeated statements become server-side prepared statements
+(see app.database.connect_args_from_env).
+"""
+from datetime import datetime
+from functools import lru_cache
+from sqlmodel import Session, select
+from sqlalchemy import func, case, cast, bindparam, DateTime, Integer, String
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from app.models import HiredEmployee, Department, Job
+
+GRANULARITIES = ("quarter", "month", "week")
+
+# Years the stats accept: the range of `year` ends at Jan 1 of year + 1,
+# which must still be a valid datetime
+MIN_YEAR, MAX_YEAR = 1, 9998
+# Longest range of years one series request may span
+MAX_SERIES_YEARS = 100
+
+def year_bounds(year: int):
+    """
+    Half-open [start, end) datetime range of `year`, so the filter can use the
+    datetime index and, on a year-partitioned hiredemployee, reads only the
+    partitions of the years asked for (pruned at execution for a prepared plan).
+    """
+    return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+
+def _range(from_year: int, to_year: int) -> dict:
+    return {"start": year_bounds(from_year)[0], "end": year_bounds(to_year)[1]}
+
+# -------------------------------------------------------------------
+# Date functions. Each is a stateless construct, so statements using
+# them stay cacheable (inherit_cache); the SQL comes from the dialect
+# -------------------------------------------------------------------
+
+class quarter(FunctionElement):
+    """Quarter (1-4) of a datetime, as an integer."""
+    type = Integer()
+    inherit_cache = True
+
+class month_start(FunctionElement):
+    """First day of the datetime's month, as 'YYYY-MM-DD'."""
+    type = String()
+    inherit_cache = True
+
+class quarter_start(FunctionElement):
+    """First day of the datetime's quarter, as 'YYYY-MM-DD'."""
+    type = String()
+    inherit_cache = True
+
+class week_start(FunctionElement):
+    """Monday of the datetime's ISO week, as 'YYYY-MM-DD'."""
+    type = String()
+    inherit_cache = True
+
+PERIOD_STARTS = {"quarter": quarter_start, "month": month_start, "week": week_start}
+
+def period_start(column, granularity: str):
+    if granularity not in PERIOD_STARTS:
+        raise ValueError(f"Unknown granularity {granularity!r}")
+    return PERIOD_STARTS[granularity](column)
+
+def _argument(element):
+    return list(element.clauses)[0]
+
+@compiles(quarter, "postgresql")
+def _quarter_postgresql(element, compiler, **kw):
+    return f"CAST(EXTRACT(quarter FROM {compiler.process(element.clauses, **kw)}) AS INTEGER)"
+
+@compiles(quarter, "sqlite")
+def _quarter_sqlite(element, compiler, **kw):
+    month = cast(func.substr(_argument(element), 6, 2), Integer)
+    return compiler.process((month + 2) // 3, **kw)
+
+def _date_trunc_postgresql(field):
+    def _compile(element, compiler, **kw):
+        column = compiler.process(element.clauses, **kw)
+        return f"to_char(date_trunc('{field}', {column}), 'YYYY-MM-DD')"
+    return _compile
+
+for _construct, _field in ((month_start, "month"), (quarter_start, "quarter"), (week_start, "week")):
+    compiles(_construct, "postgresql")(_date_trunc_postgresql(_field))
+
+@compiles(month_start, "sqlite")
+def _month_start_sqlite(element, compiler, **kw):
+    return compiler.process(func.printf("%s-01", func.substr(_argument(element), 1, 7)), **kw)
+
+@compiles(quarter_start, "sqlite")
+def _quarter_start_sqlite(element, compiler, **kw):
+    column = _argument(element)
+    month = cast(func.substr(column, 6, 2), Integer)
+    return compiler.process(func.printf("%s-%02d-01", func.substr(column, 1, 4), (month - 1) // 3 * 3 + 1), **kw)
+
+@compiles(week_start, "sqlite")
+def _week_start_sqlite(element, compiler, **kw):
+    # The next Sunday (or the day itself), then back to its Monday
+    return compiler.process(func.date(_argument(element), "weekday 0", "-6 days"), **kw)
+
+# -------------------------------------------------------------------
+# Statements
+# -------------------------------------------------------------------
+
+_start = bindparam("start", type_=DateTime)
+_end = bindparam("end", type_=DateTime)
+
+def _build_stats():
+    hiredemployee_descriptions = (
+        select(
+            Department.department.label("department_id"),
+            Job.job.label("job_id"),
+            HiredEmployee.datetime,
+            HiredEmployee.id
+        )
+        .join(Department, Department.id == HiredEmployee.department_id)
+        .join(Job, Job.id == HiredEmployee.job_id)
+        .filter(HiredEmployee.datetime >= _start, HiredEmployee.datetime < _end)
+        .cte("hiredemployee_descriptions")
+    )
+
+    quarter_expr = quarter(hiredemployee_descriptions.c.datetime)
+    hiredemployee_aggregates = (
+        select(
+            hiredemployee_descriptions.c.department_id,
+            hiredemployee_descriptions.c.job_id,
+            quarter_expr.label("quarter"),
+            func.count(hiredemployee_descriptions.c.id).label("counted"),
+        )
+        .group_by(
+            hiredemployee_descriptions.c.department_id,
+            hiredemployee_descriptions.c.job_id,
+            quarter_expr,
+        )
+        .cte("hiredemployee_aggregates")
+    )
+
+    return (
+        select(
+            hiredemployee_aggregates.c.department_id.label("department"),
+            hiredemployee_aggregates.c.job_id.label("job"),
+            func.sum(case((hiredemployee_aggregates.c.quarter == 1, hiredemployee_aggregates.c.counted), else_=0)).label("Q1"),
+            func.sum(case((hiredemployee_aggregates.c.quarter == 2, hiredemployee_aggregates.c.counted), else_=0)).label("Q2"),
+            func.sum(case((hiredemployee_aggregates.c.quarter == 3, hiredemployee_aggregates.c.counted), else_=0)).label("Q3"),
+            func.sum(case((hiredemployee_aggregates.c.quarter == 4, hiredemployee_aggregates.c.counted), else_=0)).label("Q4"),
+        )
+        .group_by(
+            hiredemployee_aggregates.c.department_id,
+            hiredemployee_aggregates.c.job_id,
+        )
+        .order_by(
+            hiredemployee_aggregates.c.department_id,
+            hiredemployee_aggregates.c.job_id,
+        )
+    )
+
+def _build_series(granularity: str):
+    period = period_start(HiredEmployee.datetime, granularity).label("period")
+    return (
+        select(
+            period,
+            Department.department.label("department"),
+            Job.job.label("job"),
+            func.count(HiredEmployee.id).label("hired"),
+        )
+        .join(Department, Department.id == HiredEmployee.department_id)
+        .join(Job, Job.id == HiredEmployee.job_id)
+        .filter(HiredEmployee.datetime >= _start, HiredEmployee.datetime < _end)
+        .group_by(period, Department.department, Job.job)
+        .order_by(period, Department.department, Job.job)
+    )
+
+def _build_top_departments():
+    base_query = (
+        select(
+            Department.id,
+            Department.department,
+            func.count(HiredEmployee.id).label("hired"),
+        )
+        .join(Department, Department.id == HiredEmployee.department_id)
+        .filter(HiredEmployee.datetime >= _start, HiredEmployee.datetime < _end)
+        .group_by(Department.id, Department.department)
+        .cte("base_query")
+    )
+
+    mean_value = select(func.avg(base_query.c.hired)).scalar_subquery()
+
+    return (
+        select(base_query.c.id, base_query.c.department, base_query.c.hired)
+        .filter(base_query.c.hired > mean_value)
+        .order_by(base_query.c.hired.desc())
+    )
+
+HIRED_EMPLOYEES_STATS = _build_stats()
+HIRED_EMPLOYEES_SERIES = {granularity: _build_series(granularity) for granularity in GRANULARITIES}
+TOP_DEPARTMENTS = _build_top_departments()
+
+@lru_cache(maxsize=None)
+def _hired_employees_listing(after_id: bool, year: bool, department_id: bool, job_id: bool):
+    """One statement per combination of filters in use (16 at most), so each keeps its index-friendly form."""
+    query = select(
+        HiredEmployee.id, HiredEmployee.name, HiredEmployee.datetime, HiredEmployee.department_id, HiredEmployee.job_id
+    )
+    if after_id:
+        query = query.filter(HiredEmployee.id > bindparam("after_id", type_=Integer))
+    if year:
+        query = query.filter(HiredEmployee.datetime >= _start, HiredEmployee.datetime < _end)
+    if department_id:
+        query = query.filter(HiredEmployee.department_id == bindparam("department_id", type_=Integer))
+    if job_id:
+        query = query.filter(HiredEmployee.job_id == bindparam("job_id", type_=Integer))
+    query = query.order_by(HiredEmployee.id)
+    return query, query.limit(bindparam("limit", type_=Integer))
+
+def _listing(after_id=None, year=None, department_id=None, job_id=None):
+    statements = _hired_employees_listing(after_id is not None, year is not None, department_id is not None, job_id is not None)
+    params = {"after_id": after_id, "department_id": department_id, "job_id": job_id}
+    params = {name: value for name, value in params.items() if value is not None}
+    if year is not None:
+        params.update(_range(year, year))
+    return statements, params
+
+# -------------------------------------------------------------------
+# Backend interface. The *_query functions bind the values into a copy
+# of the statement, for callers that stream it (app.utils.export)
+# -------------------------------------------------------------------
+
+def hired_employees_stats_query(year: int):
+    return HIRED_EMPLOYEES_STATS.params(_range(year, year))
+
+def get_hired_employees_stats(year: int, session: Session):
+    results = session.exec(HIRED_EMPLOYEES_STATS, params=_range(year, year))
+
+    return [
+        {"department": r.department, "job": r.job, "Q1": r.Q1, "Q2": r.Q2, "Q3": r.Q3, "Q4": r.Q4}
+        for r in results
+    ]
+
+def hired_employees_series_query(from_year: int, to_year: int, granularity: str = "quarter"):
+    """
+    Hires per (period, department, job) for every year in [from_year, to_year],
+    bucketed with period_start() in a single grouped query over the datetime index.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity {granularity!r}")
+    return HIRED_EMPLOYEES_SERIES[granularity].params(_range(from_year, to_year))
+
+def get_hired_employees_series(from_year: int, to_year: int, granularity: str, session: Session):
+    """Columnar series: parallel `period` (bucket start date), `department`, `job` and `hired` lists."""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity {granularity!r}")
+    results = session.exec(HIRED_EMPLOYEES_SERIES[granularity], params=_range(from_year, to_year)).all()
+    return {
+        "from": from_year,
+        "to": to_year,
+        "granularity": granularity,
+        "period": [r.period for r in results],
+        "department": [r.department for r in results],
+        "job": [r.job for r in results],
+        "hired": [r.hired for r in results],
+    }
+
+def top_departments_query(year: int):
+    return TOP_DEPARTMENTS.params(_range(year, year))
+
+def get_top_departments(year: int, session: Session):
+    results = session.exec(TOP_DEPARTMENTS, params=_range(year, year))
+    return [{"id": r.id, "department": r.department, "hired": r.hired} for r in results]
+
+def hired_employees_query(after_id: int | None = None, year: int | None = None, department_id: int | None = None, job_id: int | None = None):
+    """
+    Hires in primary-key order, starting after `after_id` (keyset pagination).
+    The year filter is a datetime range and the department/job filters are
+    equalities, so each can be served by an index.
+    """
+    (query, _), params = _listing(after_id, year, department_id, job_id)
+    return query.params(params)
+
+def get_hired_employees(session: Session, after_id: int | None = None, limit: int = 100, **filters):
+    (_, page), params = _listing(after_id, **filters)
+    results = session.exec(page, params={**params, "limit": limit})
+    return [
+        {"id": r.id, "name": r.name, "datetime": r.datetime, "department_id": r.department_id, "job_id": r.job_id}
+        for r in results
+    ]
@@ -1,17 +1,54 @@
 import pandas as pd
 from sqlmodel import Session
+from sqlalchemy import Boolean, literal_column, or_
 from sqlalchemy.dialects.postgresql import insert
+from app.models import HiredEmployee
+from app.utils import partitions, rollup as hires_rollup
+from app.utils.prune import delete_missing
 
-def upsert_dataframe(df: pd.DataFrame, model, batch_size: int = 1000, engine=None):
+def upsert_dataframe(df: pd.DataFrame, model, batch_size: int = 1000, engine=None, rollup: bool = True) -> dict:
+    """
+    Batched multi-row `INSERT ... ON CONFLICT (id) DO UPDATE` for Postgres.
+
+    A conflicting row is only rewritten when some column IS DISTINCT FROM the
+    uploaded value, so re-uploading unchanged rows creates no new row versions,
+    WAL or index entries. Returns the inserted, updated and unchanged row counts.
+    On a year-partitioned hiredemployee the conflict target is (id, datetime),
+    and a hire whose datetime changed is moved rather than duplicated.
+    """
     table = model.__table__
+    df = df.drop_duplicates(subset="id", keep="last")
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    keys = partitions.conflict_columns(engine, model)
+    partitioned = len(keys) > 1
+    if partitioned:
+        partitions.ensure_partitions(engine, df["datetime"])
     with Session(engine) as session:
-        records = df.to_dict(orient="records")
+        if rollup and model is HiredEmployee:
+            hires_rollup.track_upsert(session.connection(), df)
+        if partitioned:
+            moved, kept = partitions.move_out(session.connection(), df)
+        # Nullable Int64 / datetime64 columns become plain Python values with None for nulls
+        records = df.astype(object).where(df.notna(), None).to_dict(orient="records")
         for i in range(0, len(records), batch_size):
             batch = records[i:i + batch_size]
             stmt = insert(table).values(batch)
+            columns = [c.name for c in table.columns if c.name not in keys]
             stmt = stmt.on_conflict_do_update(
-                index_elements=["id"],
-                set_={c.name: stmt.excluded[c.name] for c in table.columns if c.name != "id"}
+                index_elements=keys,
+                set_={name: stmt.excluded[name] for name in columns},
+                where=or_(*(table.c[name].is_distinct_from(stmt.excluded[name]) for name in columns)),
             )
-            session.exec(stmt)
-        session.commit()
\ No newline at end of file
+            # Only written rows come back; xmax is 0 for a freshly inserted row version
+            returned = table.c.id if partitioned else literal_column("xmax = 0", Boolean)
+            written = session.exec(stmt.returning(returned)).scalars().all()
+            if not partitioned:
+                counts["inserted"] += sum(written)
+            counts["updated"] += len(written)
+            counts["unchanged"] += len(batch) - len(written)
+        session.commit()
+    if partitioned:
+        # Rows not stored under their datetime before were inserted; a moved hire counts as updated
+        counts["inserted"] = len(df) - kept - moved
+    counts["updated"] -= counts["inserted"]
+    return counts
@@ -0,0 +1,82 @@
+import io
+import pandas as pd
+from sqlalchemy import Integer
+from app.models import HiredEmployee
+from app.utils import partitions, rollup as hires_rollup
+from app.utils.prune import delete_missing
+
+def _copy_frame(df: pd.DataFrame, table) -> pd.DataFrame:
+    """Order columns like the table and render integer columns without a trailing `.0`."""
+    out = df[[c.name for c in table.columns]].copy()
+    for c in table.columns:
+        if isinstance(c.type, Integer):
+            out[c.name] = pd.to_numeric(out[c.name]).astype("Int64")
+    return out
+
+def _copy_from(cursor, statement: str, buffer: io.StringIO):
+    """Run COPY ... FROM STDIN with psycopg2's copy_expert, or psycopg 3's cursor.copy()."""
+    if hasattr(cursor, "copy_expert"):
+        cursor.copy_expert(statement, buffer)
+        return
+    with cursor.copy(statement) as copy:
+        copy.write(buffer.getvalue())
+
+def upsert_dataframe(df: pd.DataFrame, model, batch_size: int = 50_000, engine=None, rollup: bool = True) -> dict:
+    """
+    COPY-based upsert for Postgres.
+
+    Rows are streamed with `COPY ... FROM STDIN` into a temporary staging table
+    (`batch_size` rows per COPY segment), then merged into the target table with
+    a single set-based `INSERT ... SELECT ... ON CONFLICT (id) DO UPDATE`, which
+    only rewrites rows where some column IS DISTINCT FROM the staged value.
+    Hires also update the quarterly rollup in the same transaction unless `rollup` is False.
+    On a year-partitioned hiredemployee the conflict target is (id, datetime),
+    and a hire whose datetime changed is moved rather than duplicated.
+    Returns the inserted, updated and unchanged row counts.
+    """
+    table = model.__table__
+    staging = f"_staging_{table.name}"
+    keys = partitions.conflict_columns(engine, model)
+    conflict = ", ".join(f'"{name}"' for name in keys)
+    columns = ", ".join(f'"{c.name}"' for c in table.columns)
+    updates = ", ".join(f'"{c.name}" = EXCLUDED."{c.name}"' for c in table.columns if c.name not in keys)
+    changed = " OR ".join(
+        f'"{table.name}"."{c.name}" IS DISTINCT FROM EXCLUDED."{c.name}"' for c in table.columns if c.name not in keys
+    )
+    frame = _copy_frame(df, table)
+    partitioned = len(keys) > 1
+    if partitioned:
+        partitions.ensure_partitions(engine, df["datetime"])
+
+    with engine.begin() as conn:
+        if rollup and model is HiredEmployee:
+            hires_rollup.track_upsert(conn, df)
+        if partitioned:
+            moved, kept = partitions.move_out(conn, df.drop_duplicates(subset="id", keep="last"))
+        cursor = conn.connection.cursor()
+        cursor.execute(
+            f'CREATE TEMP TABLE "{staging}" (LIKE "{table.name}" INCLUDING DEFAULTS) ON COMMIT DROP'
+        )
+        for i in range(0, len(frame), batch_size):
+            buffer = io.StringIO()
+            frame.iloc[i:i + batch_size].to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            _copy_from(cursor, f'COPY "{staging}" ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+        # DISTINCT ON keeps the last copy of an id, as the batched path would;
+        # only written rows are returned, and xmax is 0 for an inserted row version
+        # (partitioned tables cannot return xmax, see partitions.move_out)
+        cursor.execute(
+            f'WITH written AS ('
+            f'INSERT INTO "{table.name}" ({columns}) '
+            f'SELECT DISTINCT ON ("id") {columns} FROM "{staging}" ORDER BY "id", ctid DESC '
+            f'ON CONFLICT ({conflict}) DO UPDATE SET {updates} WHERE {changed} '
+            f'RETURNING {"true" if partitioned else "(xmax = 0)"} AS inserted) '
+            f'SELECT count(*) FILTER (WHERE inserted), count(*) FROM written'
+        )
+        inserted, written = cursor.fetchone()
+        cursor.close()
+    rows = int(frame["id"].nunique())
+    if partitioned:
+        # Rows not stored under their datetime before were inserted; a moved hire counts as updated
+        inserted = rows - kept - moved
+    return {"inserted": inserted, "updated": written - inserted, "unchanged": rows - written}
@@ -1,8 +1,62 @@
+import numpy as np
 import pandas as pd
 from sqlmodel import Session
+from sqlalchemy import DateTime
+from app.models import HiredEmployee
+from app.utils import rollup as hires_rollup
+from app.utils.prune import delete_missing
 
-def upsert_dataframe(df: pd.DataFrame, model, batch_size: int = 1000, engine=None):
+def _rows(df: pd.DataFrame, table):
+    """Yield plain DB-API tuples, formatting datetimes the way the SQLite dialect stores them."""
+    out = df[[c.name for c in table.columns]].copy()
+    for c in table.columns:
+        if isinstance(c.type, DateTime):
+            # Same text as sqlalchemy.dialects.sqlite.DATETIME stores, so raw
+            # rows read back (and compare) exactly like ORM-written ones
+            values = pd.to_datetime(out[c.name])
+            text = np.char.replace(
+                np.datetime_as_string(values.to_numpy().astype("datetime64[us]"), unit="us"), "T", " "
+            )
+            out[c.name] = pd.Series(text, index=out.index, dtype=object).where(values.notna(), None)
+    out = out.astype(object).where(out.notna(), None)
+    return out.itertuples(index=False, name=None)
+
+def upsert_dataframe(df: pd.DataFrame, model, batch_size: int = 1000, engine=None, rollup: bool = True) -> dict:
+    """
+    Set-based upsert for SQLite: one `INSERT ... ON CONFLICT(id) DO UPDATE`
+    statement run with executemany() over `batch_size` rows at a time.
+    A conflicting row is only rewritten when some column differs (`IS NOT`).
+    Hires also update the quarterly rollup in the same transaction unless `rollup` is False.
+    Returns the inserted, updated and unchanged row counts.
+    """
+    table = model.__table__
+    columns = ", ".join(f'"{c.name}"' for c in table.columns)
+    placeholders = ", ".join("?" for _ in table.columns)
+    updates = ", ".join(f'"{c.name}" = excluded."{c.name}"' for c in table.columns if c.name != "id")
+    changed = " OR ".join(f'"{c.name}" IS NOT excluded."{c.name}"' for c in table.columns if c.name != "id")
+    sql = (
+        f'INSERT INTO "{table.name}" ({columns}) VALUES ({placeholders}) '
+        f'ON CONFLICT("id") DO UPDATE SET {updates} WHERE {changed}'
+    )
+    df = df.drop_duplicates(subset="id", keep="last")
+    rows = list(_rows(df, table))
+    id_index = [c.name for c in table.columns].index("id")
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
     with Session(engine) as session:
-        for record in df.to_dict(orient="records"):
-            session.merge(model(**record))
-        session.commit()
\ No newline at end of file
+        conn = session.connection()
+        if rollup and model is HiredEmployee:
+            hires_rollup.track_upsert(conn, df)
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            ids = [row[id_index] for row in batch]
+            existing = conn.exec_driver_sql(
+                f'SELECT count(*) FROM "{table.name}" WHERE "id" IN ({", ".join("?" for _ in ids)})', tuple(ids)
+            ).scalar()
+            # executemany() sums the rows each statement changed; a guarded-out update changes none
+            written = conn.exec_driver_sql(sql, batch).rowcount
+            inserted = len(batch) - existing
+            counts["inserted"] += inserted
+            counts["updated"] += written - inserted
+            counts["unchanged"] += existing - (written - inserted)
+        session.commit()
+    return counts
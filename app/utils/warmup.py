@@ -0,0 +1,55 @@
+"""
+Startup warmup, run by the app's lifespan before the first request is served.
+
+The pool is filled with ready connections, and every stats query of the
+configured backend runs once for a year without hires. That leaves each
+statement compiled in the engine's cache (and, for stats_inmemory, the snapshot
+loaded), so the first real request costs the same as any later one.
+"""
+import logging
+from contextlib import ExitStack
+from sqlmodel import Session
+from app.utils.stats_sql import GRANULARITIES
+
+logger = logging.getLogger("app.startup")
+
+# A year no hire is dated in, so the warmup queries read nothing
+WARMUP_YEAR = 1
+
+def warm_pool(engine, connections: int | None = None) -> int:
+    """
+    Open `connections` connections (default: the pool size) at once and give
+    them back to the pool. Returns how many were opened.
+    """
+    if connections is None:
+        # QueuePool.size() is a method; SingletonThreadPool (sqlite://) has an
+        # int `size` and one connection per thread
+        size = getattr(engine.pool, "size", None)
+        connections = size() if callable(size) else 1
+    with ExitStack() as stack:
+        for _ in range(connections):
+            stack.enter_context(engine.connect()).exec_driver_sql("SELECT 1")
+    return connections
+
+def warm_stats(stats_function, session):
+    """Run each query of a stats backend once."""
+    stats_function.get_hired_employees_stats(WARMUP_YEAR, session)
+    stats_function.get_top_departments(WARMUP_YEAR, session)
+    for granularity in GRANULARITIES:
+        stats_function.get_hired_employees_series(WARMUP_YEAR, WARMUP_YEAR, granularity, session)
+    stats_function.get_hired_employees(session, limit=1)
+
+def warm(engines, stats_function):
+    """
+    Warm the pool and the stats queries of each engine (the primary first,
+    then any read replicas). Sessions name the primary as read sessions do
+    (see app.utils.replicas). A failure is logged rather than raised: the app
+    still starts, and the first requests on that engine pay the cost instead.
+    """
+    for engine in engines:
+        try:
+            warm_pool(engine)
+            with Session(engine, info={"primary": engines[0]}) as session:
+                warm_stats(stats_function, session)
+        except Exception:
+            logger.warning("Startup warmup failed for %s", engine.url.render_as_string(hide_password=True), exc_info=True)
@@ -0,0 +1,4 @@
+# benchmarks/__init__.py
+"""
+Performance benchmarks for Employee Analytics API (not collected by pytest).
+"""
@@ -0,0 +1,84 @@
+"""
+Per-year stats query latency on Postgres: one hiredemployee heap versus the
+year-partitioned layout (HIRES_PARTITIONING=year, app.utils.partitions).
+
+The same synthetic data (benchmarks.generate) is loaded into each layout with
+the COPY upsert, the tables are analyzed, and then each stats query of
+app.utils.stats_sql runs `--requests` times for every year of the data.
+Reported per layout, query and year: p50 and p99 in milliseconds.
+
+Usage:
+    python -m benchmarks.bench_partitions --url postgresql+psycopg2://... [--rows 1000000] [--requests 50]
+
+The tables in the target database are dropped and recreated, so point it at a
+scratch database.
+"""
+import argparse
+import json
+import statistics
+import time
+from sqlmodel import SQLModel, Session, create_engine
+from app.database import create_db_and_tables
+from app.models import Department, HiredEmployee, Job
+from app.utils import stats_sql, upsert_postgres_copy
+from benchmarks import generate
+from benchmarks.run import percentile
+
+LAYOUTS = {"heap": False, "partitioned": True}
+QUERIES = {
+    "hired_employees": stats_sql.get_hired_employees_stats,
+    "top_departments": stats_sql.get_top_departments,
+}
+
+def load(engine, partitioned: bool, rows: int):
+    SQLModel.metadata.drop_all(engine)
+    create_db_and_tables(engine, partition_hires=partitioned)
+    upsert_postgres_copy.upsert_dataframe(generate.departments(), Department, engine=engine)
+    upsert_postgres_copy.upsert_dataframe(generate.jobs(), Job, engine=engine)
+    for chunk in generate.hires(rows):
+        upsert_postgres_copy.upsert_dataframe(chunk, HiredEmployee, engine=engine, rollup=False)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+def time_years(engine, requests: int) -> dict:
+    results = {}
+    with Session(engine) as session:
+        for name, query in QUERIES.items():
+            per_year = {}
+            for year in generate.YEARS:
+                query(year, session)
+                samples = []
+                for _ in range(requests):
+                    started = time.perf_counter()
+                    query(year, session)
+                    samples.append((time.perf_counter() - started) * 1000)
+                per_year[year] = {"p50_ms": round(percentile(samples, 50), 2), "p99_ms": round(percentile(samples, 99), 2)}
+            results[name] = per_year
+    return results
+
+def run(url: str, rows: int, requests: int) -> dict:
+    engine = create_engine(url)
+    layouts = {}
+    try:
+        for layout, partitioned in LAYOUTS.items():
+            load(engine, partitioned, rows)
+            layouts[layout] = time_years(engine, requests)
+        SQLModel.metadata.drop_all(engine)
+    finally:
+        engine.dispose()
+    # Median over the years of heap p50 / partitioned p50
+    speedup = {
+        name: round(statistics.median(
+            layouts["heap"][name][year]["p50_ms"] / layouts["partitioned"][name][year]["p50_ms"] for year in generate.YEARS
+        ), 2)
+        for name in QUERIES
+    }
+    return {"rows": rows, "requests": requests, "layouts": layouts, "p50_speedup": speedup}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True, help="SQLAlchemy URL of a scratch Postgres database")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--requests", type=int, default=50, help="timed runs per query and year")
+    args = parser.parse_args()
+    print(json.dumps(run(args.url, args.rows, args.requests), indent=2))
@@ -0,0 +1,106 @@
+"""
+Cold start: import time and time to first request of the production server.
+
+- import: `import app.main` in a fresh interpreter, and which of the heavy
+  optional libraries (pandas, numpy, pyarrow) that loads
+- server: `python -m app.serve` started as a subprocess. first_request_ms is
+  the time from launch until `GET /` answers. Schema creation, worker startup
+  and the warmup are all included. first_stats_ms and next_stats_ms time the
+  first two stats requests, for two different years so the response cache
+  does not answer the second one
+
+Usage:
+    python -m benchmarks.bench_startup [--workers 2] [--repeats 5] [--url <database url>]
+
+Without --url the server runs on a fresh SQLite file.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow")
+
+_IMPORT_SCRIPT = f"""
+import json, sys, time
+started = time.perf_counter()
+import app.main
+print(json.dumps({{"seconds": time.perf_counter() - started, "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+def time_import(repeats: int, env: dict) -> dict:
+    runs = [
+        json.loads(subprocess.run([sys.executable, "-c", _IMPORT_SCRIPT], cwd=ROOT, env=env, check=True, capture_output=True, text=True).stdout)
+        for _ in range(repeats)
+    ]
+    return {
+        "median_ms": round(statistics.median(r["seconds"] for r in runs) * 1000, 1),
+        "heavy_modules_loaded": runs[-1]["loaded"],
+    }
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _get(url: str) -> float:
+    started = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=30) as response:
+        response.read()
+    return round((time.perf_counter() - started) * 1000, 1)
+
+def time_server(workers: int, env: dict, timeout: float = 60) -> dict:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    try:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"server exited with status {server.returncode}")
+            try:
+                _get(base + "/")
+                break
+            except (urllib.error.URLError, ConnectionError):
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError(f"server did not answer within {timeout}s")
+                time.sleep(0.01)
+        first_request_ms = round((time.perf_counter() - started) * 1000, 1)
+        return {
+            "workers": workers,
+            "first_request_ms": first_request_ms,
+            "first_stats_ms": _get(base + "/stats/hired_employees/2020"),
+            "next_stats_ms": _get(base + "/stats/hired_employees/2021"),
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+def run(workers: int = 2, repeats: int = 5, url: str | None = None) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {
+            **os.environ,
+            "APP_ENV": "production",
+            "DATABASE_URL": url or f"sqlite:///{os.path.join(workdir, 'startup.db')}",
+            "INGESTION_SPOOL_DIR": os.path.join(workdir, "spool"),
+        }
+        return {"import": time_import(repeats, env), "server": time_server(workers, env)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--repeats", type=int, default=5, help="fresh interpreters timed for the import")
+    parser.add_argument("--url", default=None, help="SQLAlchemy URL of a scratch database (default: a temporary SQLite file)")
+    args = parser.parse_args()
+    print(json.dumps(run(args.workers, args.repeats, args.url), indent=2))
@@ -0,0 +1,68 @@
+"""
+Per-request Python overhead of the stats queries.
+
+Runs each stats query against an empty in-memory SQLite database, so the time
+measured is what SQLAlchemy spends building, compiling and executing the
+statement rather than what the database spends answering it. Three ways are
+compared:
+
+- prebuilt: app.utils.stats_sql as the app runs it, one statement built at
+  import and executed with bound parameters (compiled-cache hit)
+- rebuilt: the statement built again for every request, as before stats_sql;
+  the compiled cache still hits, but construction and cache-key generation
+  are paid each time
+- uncompiled: rebuilt with the compiled cache bypassed, so every request also
+  compiles to SQL
+
+Usage:
+    python -m benchmarks.bench_stats_queries [--requests 2000]
+"""
+import argparse
+import json
+import time
+from sqlmodel import SQLModel, Session, create_engine
+from app.utils import stats_sql
+
+YEAR = 2020
+
+def _params(year: int) -> dict:
+    start, end = stats_sql.year_bounds(year)
+    return {"start": start, "end": end}
+
+QUERIES = {
+    "hired_employees": (lambda: stats_sql.HIRED_EMPLOYEES_STATS, stats_sql._build_stats),
+    "top_departments": (lambda: stats_sql.TOP_DEPARTMENTS, stats_sql._build_top_departments),
+    "hired_employees_series": (lambda: stats_sql.HIRED_EMPLOYEES_SERIES["month"], lambda: stats_sql._build_series("month")),
+}
+
+def _time(session: Session, requests: int, statement, execution_options=None) -> float:
+    """Mean microseconds per request; `statement` is called for each one."""
+    params = _params(YEAR)
+    options = execution_options or {}
+    session.exec(statement(), params=params, execution_options=options).all()
+    started = time.perf_counter()
+    for _ in range(requests):
+        session.exec(statement(), params=params, execution_options=options).all()
+    return round((time.perf_counter() - started) / requests * 1e6, 1)
+
+def run(requests: int) -> dict:
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    results = {}
+    with Session(engine) as session:
+        for name, (prebuilt, build) in QUERIES.items():
+            timings = {
+                "prebuilt_us": _time(session, requests, prebuilt),
+                "rebuilt_us": _time(session, requests, build),
+                "uncompiled_us": _time(session, requests, build, {"compiled_cache": None}),
+            }
+            timings["speedup"] = round(timings["rebuilt_us"] / timings["prebuilt_us"], 1)
+            results[name] = timings
+    engine.dispose()
+    return {"requests": requests, "queries": results}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2_000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.requests), indent=2))
@@ -0,0 +1,49 @@
+"""
+Compare the batched INSERT ... VALUES upsert with the COPY-based upsert on Postgres.
+
+Usage:
+    python -m benchmarks.bench_upsert_postgres --url postgresql+psycopg2://... [--rows 200000]
+
+The hiredemployee table in the target database is dropped and recreated, so
+point it at a scratch database. Both strategies load the same synthetic hires twice: once into an empty table
+(pure inserts) and once more over the loaded table (pure updates).
+"""
+import argparse
+import json
+import time
+import pandas as pd
+from sqlmodel import SQLModel, create_engine
+from app.models import HiredEmployee
+from app.utils import upsert_postgres, upsert_postgres_copy
+from benchmarks import generate
+
+STRATEGIES = {"batched": upsert_postgres, "copy": upsert_postgres_copy}
+
+def make_hires(rows: int, seed: int = 0) -> pd.DataFrame:
+    df = pd.concat(generate.hires(rows, seed), ignore_index=True)
+    # Same shape as an upload chunk: missing values as None
+    return df.astype(object).where(df.notna(), None)
+
+def run(url: str, rows: int) -> dict:
+    engine = create_engine(url)
+    df = make_hires(rows)
+    results = {}
+    for name, module in STRATEGIES.items():
+        HiredEmployee.__table__.drop(engine, checkfirst=True)
+        SQLModel.metadata.create_all(engine, tables=[HiredEmployee.__table__])
+        timings = {}
+        for phase in ("insert", "update"):
+            started = time.perf_counter()
+            module.upsert_dataframe(df, HiredEmployee, engine=engine)
+            elapsed = time.perf_counter() - started
+            timings[phase] = {"seconds": round(elapsed, 3), "rows_per_sec": round(rows / elapsed, 1)}
+        results[name] = timings
+    HiredEmployee.__table__.drop(engine, checkfirst=True)
+    return {"rows": rows, "strategies": results}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--url", required=True, help="SQLAlchemy URL of a scratch Postgres database")
+    args = parser.parse_args()
+    print(json.dumps(run(args.url, args.rows), indent=2))
@@ -0,0 +1,113 @@
+"""
+Deterministic synthetic hiring data.
+
+The same (rows, seed) always yields the same departments, jobs and hires,
+whatever the chunk size used to consume them. Hires are skewed like real
+exports: hiring grows year over year and a few departments and jobs take most
+of the hires. A small share of rows lacks a datetime, department or job.
+
+Usage:
+    python -m benchmarks.generate --rows 2000000 --out data/
+writes departments.csv, jobs.csv and hired_employees.csv to data/.
+"""
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+DEPARTMENTS = [
+    "Engineering", "Sales", "Support", "Services", "Marketing", "Product Management",
+    "Research and Development", "Business Development", "Training", "Human Resources",
+    "Accounting", "Legal",
+]
+ROLES = [
+    "Software Engineer", "Account Executive", "Support Specialist", "Consultant", "Marketing Manager",
+    "Product Manager", "Research Scientist", "Data Analyst", "Business Analyst", "Trainer",
+    "Recruiter", "Accountant", "Legal Counsel", "Designer", "QA Engineer", "Site Reliability Engineer",
+    "Sales Engineer", "Technical Writer", "Project Manager", "Financial Analyst",
+]
+LEVELS = ["Junior", "", "Senior", "Staff", "Principal"]
+FIRST_NAMES = [
+    "Alice", "Bob", "Carla", "Daniel", "Elena", "Farid", "Grace", "Hiro", "Ines", "Jonas",
+    "Kavya", "Liam", "Maria", "Nikolai", "Olivia", "Pedro", "Quinn", "Rosa", "Samir", "Tanya",
+]
+LAST_NAMES = [
+    "Anderson", "Brown", "Chen", "Diaz", "Eriksen", "Fischer", "Garcia", "Hughes", "Ivanova", "Johnson",
+    "Kim", "Lopez", "Martin", "Nguyen", "Okafor", "Patel", "Rossi", "Smith", "Tanaka", "Weber",
+]
+YEARS = list(range(2015, 2025))
+DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+def departments() -> pd.DataFrame:
+    return pd.DataFrame({"id": np.arange(1, len(DEPARTMENTS) + 1), "department": DEPARTMENTS})
+
+def jobs() -> pd.DataFrame:
+    titles = [f"{level} {role}".strip() for role in ROLES for level in LEVELS]
+    return pd.DataFrame({"id": np.arange(1, len(titles) + 1), "job": titles})
+
+def _zipf_weights(n: int, exponent: float) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+def hires(rows: int, seed: int = 0, chunk_size: int = 500_000):
+    """Yield hires as DataFrames of up to `chunk_size` rows (ids 1..rows)."""
+    n_departments, n_jobs = len(DEPARTMENTS), len(ROLES) * len(LEVELS)
+    department_weights = _zipf_weights(n_departments, 1.1)
+    job_weights = _zipf_weights(n_jobs, 0.8)
+    year_weights = 1.25 ** np.arange(len(YEARS))
+    year_weights /= year_weights.sum()
+    year_starts = np.array([np.datetime64(f"{y}-01-01T00:00:00") for y in YEARS])
+    year_seconds = np.array([(np.datetime64(f"{y + 1}-01-01") - np.datetime64(f"{y}-01-01")).astype("timedelta64[s]").astype(np.int64) for y in YEARS])
+
+    # Fixed 100k-row blocks keep the stream identical whatever chunk_size is
+    block = 100_000
+    out = []
+    buffered = 0
+    for start in range(0, rows, block):
+        n = min(block, rows - start)
+        rng = np.random.default_rng([seed, start // block])
+        ids = np.arange(start + 1, start + n + 1)
+        year_index = rng.choice(len(YEARS), size=n, p=year_weights)
+        offsets = (rng.random(n) * year_seconds[year_index]).astype(np.int64)
+        stamps = pd.Series(year_starts[year_index] + offsets.astype("timedelta64[s]"))
+        department_id = pd.array(rng.choice(n_departments, size=n, p=department_weights) + 1, dtype="Int64")
+        job_id = pd.array(rng.choice(n_jobs, size=n, p=job_weights) + 1, dtype="Int64")
+        stamps[rng.random(n) < 0.005] = pd.NaT
+        department_id[rng.random(n) < 0.01] = pd.NA
+        job_id[rng.random(n) < 0.01] = pd.NA
+        names = (
+            pd.Series(np.array(FIRST_NAMES)[rng.integers(0, len(FIRST_NAMES), size=n)])
+            + " "
+            + pd.Series(np.array(LAST_NAMES)[rng.integers(0, len(LAST_NAMES), size=n)])
+        )
+        out.append(pd.DataFrame({
+            "id": ids, "name": names, "datetime": stamps, "department_id": department_id, "job_id": job_id,
+        }))
+        buffered += n
+        while buffered >= chunk_size:
+            frame = pd.concat(out, ignore_index=True)
+            yield frame.iloc[:chunk_size].reset_index(drop=True)
+            out, buffered = [frame.iloc[chunk_size:]], buffered - chunk_size
+    if buffered:
+        yield pd.concat(out, ignore_index=True)
+
+def write_csv(directory: str, rows: int, seed: int = 0) -> dict:
+    """Write departments.csv, jobs.csv and hired_employees.csv; returns their paths."""
+    os.makedirs(directory, exist_ok=True)
+    paths = {name: os.path.join(directory, f"{name}.csv") for name in ("departments", "jobs", "hired_employees")}
+    departments().to_csv(paths["departments"], index=False)
+    jobs().to_csv(paths["jobs"], index=False)
+    for i, chunk in enumerate(hires(rows, seed)):
+        chunk.to_csv(paths["hired_employees"], mode="w" if i == 0 else "a", header=i == 0, index=False, date_format=DATETIME_FORMAT)
+    if rows == 0:
+        pd.DataFrame(columns=["id", "name", "datetime", "department_id", "job_id"]).to_csv(paths["hired_employees"], index=False)
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="data")
+    args = parser.parse_args()
+    for name, path in write_csv(args.out, args.rows, args.seed).items():
+        print(f"{name}: {path}")
@@ -0,0 +1,162 @@
+"""
+End-to-end benchmark: upload throughput, stats latency and peak memory.
+
+Generates deterministic data (benchmarks.generate), uploads it through an app
+built with create_app(...) and times the stats endpoints with the response cache
+disabled, so every request runs its query.
+
+Usage:
+    python -m benchmarks.run --backend sqlite --rows 1000000
+    python -m benchmarks.run --backend postgres --url postgresql+psycopg2://... --rows 1000000
+    python -m benchmarks.run --backend sqlite --thresholds benchmarks/thresholds.json --output result.json
+
+With --thresholds, the run exits with status 1 if any figure regresses past its
+threshold. The Postgres target database has its tables dropped and recreated,
+so point it at a scratch database.
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, create_engine
+from app.database import set_sqlite_pragmas
+from app.main import create_app
+from app.utils import stats_sql, upsert_postgres, upsert_sqlite
+from benchmarks import generate
+
+BACKENDS = {
+    "sqlite": (stats_sql, upsert_sqlite),
+    "postgres": (stats_sql, upsert_postgres),
+}
+ENDPOINTS = ("hired_employees", "top_departments")
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def peak_rss_mb() -> dict:
+    # ru_maxrss is in KiB on Linux; children covers the upload parse workers
+    return {
+        "process": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+def make_engine(backend: str, url: str | None, workdir: str):
+    if backend == "sqlite":
+        return set_sqlite_pragmas(
+            create_engine(url or f"sqlite:///{os.path.join(workdir, 'bench.db')}", connect_args={"check_same_thread": False})
+        )
+    if not url:
+        raise SystemExit("--url is required for the postgres backend")
+    return create_engine(url, pool_size=8)
+
+def upload(client: TestClient, table: str, path: str) -> dict:
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        response = client.post(f"/upload/{table}", files={"file": (os.path.basename(path), f, "text/csv")})
+    elapsed = time.perf_counter() - started
+    response.raise_for_status()
+    body = response.json()
+    return {
+        "rows": body["rows"],
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(body["rows"] / elapsed, 1),
+        "parse_seconds": body.get("parse_seconds"),
+        "write_seconds": body.get("write_seconds"),
+    }
+
+def time_endpoint(client: TestClient, endpoint: str, requests: int) -> dict:
+    samples = []
+    for i in range(requests):
+        year = generate.YEARS[i % len(generate.YEARS)]
+        started = time.perf_counter()
+        client.get(f"/stats/{endpoint}/{year}").raise_for_status()
+        samples.append(time.perf_counter() - started)
+    return {
+        "requests": requests,
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+    }
+
+def run(backend: str, rows: int, url: str | None = None, requests: int = 200, seed: int = 0) -> dict:
+    stats_function, upsert_function = BACKENDS[backend]
+    with tempfile.TemporaryDirectory() as workdir:
+        paths = generate.write_csv(os.path.join(workdir, "data"), rows, seed)
+        engine = make_engine(backend, url, workdir)
+        SQLModel.metadata.drop_all(engine)
+        SQLModel.metadata.create_all(engine)
+        app = create_app(
+            engine_override=engine,
+            stats_function=stats_function,
+            upsert_function=upsert_function,
+            stats_cache_size=0,
+            job_spool_dir=os.path.join(workdir, "jobs"),
+        )
+        with TestClient(app) as client:
+            uploads = {table: upload(client, table, paths[table]) for table in ("departments", "jobs", "hired_employees")}
+            stats = {endpoint: time_endpoint(client, endpoint, requests) for endpoint in ENDPOINTS}
+        if backend == "postgres":
+            SQLModel.metadata.drop_all(engine)
+        engine.dispose()
+    return {
+        "backend": backend,
+        "rows": rows,
+        "seed": seed,
+        "upload": uploads,
+        "stats": stats,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def check_thresholds(result: dict, thresholds: dict) -> list[str]:
+    """
+    Compare a result with thresholds such as
+    {"min_upload_rows_per_sec": 50000, "max_p99_ms": {"hired_employees": 250}, "max_peak_rss_mb": 2048}.
+    Returns a description of every regression.
+    """
+    regressions = []
+    rows_per_sec = result["upload"]["hired_employees"]["rows_per_sec"]
+    if "min_upload_rows_per_sec" in thresholds and rows_per_sec < thresholds["min_upload_rows_per_sec"]:
+        regressions.append(f"upload rows/sec {rows_per_sec} < {thresholds['min_upload_rows_per_sec']}")
+    for endpoint, limit in thresholds.get("max_p99_ms", {}).items():
+        p99 = result["stats"][endpoint]["p99_ms"]
+        if p99 > limit:
+            regressions.append(f"{endpoint} p99 {p99} ms > {limit} ms")
+    peak = max(result["peak_rss_mb"].values())
+    if "max_peak_rss_mb" in thresholds and peak > thresholds["max_peak_rss_mb"]:
+        regressions.append(f"peak RSS {peak} MiB > {thresholds['max_peak_rss_mb']} MiB")
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="sqlite")
+    parser.add_argument("--url", default=None, help="SQLAlchemy URL (required for postgres)")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--requests", type=int, default=200, help="requests per stats endpoint")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--thresholds", help="JSON file of regression thresholds")
+    parser.add_argument("--output", help="write the JSON result here as well as to stdout")
+    args = parser.parse_args(argv)
+
+    result = run(args.backend, args.rows, url=args.url, requests=args.requests, seed=args.seed)
+    if args.thresholds:
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)
+        result["thresholds"] = thresholds.get(args.backend, thresholds)
+        result["regressions"] = check_thresholds(result, result["thresholds"])
+
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    return 1 if result.get("regressions") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,20 @@
 import io
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
 import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import SQLModel, create_engine, inspect
+from sqlmodel import SQLModel, Session, create_engine, inspect
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
+from app.database import pool_options_from_env, set_sqlite_pragmas
 from app.main import create_app
-from app.utils import upsert_sqlite, stats_sqlite
+from app.models import IngestionJob
+from app.utils import export, upsert_sqlite, stats_sqlite, stats_rollup
+from app.utils.jobs import IngestionJobs
+from app.utils.warmup import warm_pool
 
 
 # -------------------------------------------------------------------
@@ -43,6 +53,13 @@ def client():
 
     SQLModel.metadata.drop_all(test_engine)
 
+def upload_references(client, ids=(1, 2)):
+    """Load departments and jobs so hires referencing them pass the reference check."""
+    departments = "id,department\n" + "".join(f"{i},Department {i}\n" for i in ids)
+    jobs = "id,job\n" + "".join(f"{i},Job {i}\n" for i in ids)
+    client.post("/upload/departments", files={"file": ("departments.csv", io.BytesIO(departments.encode()), "text/csv")})
+    client.post("/upload/jobs", files={"file": ("jobs.csv", io.BytesIO(jobs.encode()), "text/csv")})
+
 # -------------------------------------------------------------------
 # Upload Tests
 # -------------------------------------------------------------------
@@ -54,7 +71,7 @@ def test_upload_departments(client):
         files={"file": ("departments.csv", io.BytesIO(csv_content.encode()), "text/csv")},
     )
     assert response.status_code == 200, f"Unexpected error: {response.status_code}, {response.text}"
-    assert response.json() == {"message": "departments uploaded successfully"}
+    assert response.json()["message"] == "departments uploaded successfully"
 
 
 def test_upload_jobs(client):
@@ -64,10 +81,11 @@ def test_upload_jobs(client):
         files={"file": ("jobs.csv", io.BytesIO(csv_content.encode()), "text/csv")},
     )
     assert response.status_code == 200, f"Unexpected error: {response.status_code}, {response.text}"
-    assert response.json() == {"message": "jobs uploaded successfully"}
+    assert response.json()["message"] == "jobs uploaded successfully"
 
 
 def test_upload_hired_employees(client):
+    upload_references(client)
     csv_content = (
         "id,name,datetime,department_id,job_id\n"
         "1,Alice,2023-01-15,1,1\n"
@@ -78,13 +96,213 @@ def test_upload_hired_employees(client):
         files={"file": ("hired.csv", io.BytesIO(csv_content.encode()), "text/csv")},
     )
     assert response.status_code == 200, f"Unexpected error: {response.status_code}, {response.text}"
-    assert response.json() == {"message": "hired_employees uploaded successfully"}
+    assert response.json()["message"] == "hired_employees uploaded successfully"
+    assert response.json()["rejected"]["rows"] == 0
+
+def test_upload_hired_employees_in_chunks():
+    SQLModel.metadata.drop_all(test_engine)
+    SQLModel.metadata.create_all(test_engine)
+    app = create_app(
+        engine_override=test_engine,
+        stats_function=stats_sqlite,
+        upsert_function=upsert_sqlite,
+        upload_chunk_bytes=32,
+        check_references=False,
+    )
+    csv_content = "id,name,datetime,department_id,job_id\n" + "".join(
+        f"{i},Person{i},2023-0{i % 9 + 1}-01,1,1\n" for i in range(1, 8)
+    )
+    with TestClient(app) as c:
+        response = c.post(
+            "/upload/hired_employees",
+            files={"file": ("hired.csv", io.BytesIO(csv_content.encode()), "text/csv")},
+        )
+        assert response.status_code == 200, f"Unexpected error: {response.status_code}, {response.text}"
+        body = response.json()
+        assert body["rows"] == 7
+        assert body["rows_per_sec"] > 0
+        assert body["peak_chunk_bytes"] > 0
+        assert len(c.get("/stats/inspect_hired_employees").json()) == 7
+    SQLModel.metadata.drop_all(test_engine)
+
+
+def test_failed_upload_reports_committed_chunks():
+    SQLModel.metadata.drop_all(test_engine)
+    SQLModel.metadata.create_all(test_engine)
+    calls = []
+
+    def failing_upsert(df, model, **kw):
+        calls.append(len(df))
+        if len(calls) == 3:
+            raise RuntimeError("connection lost")
+        return upsert_sqlite.upsert_dataframe(df, model, **kw)
+
+    app = create_app(
+        engine_override=test_engine,
+        stats_function=stats_sqlite,
+        upsert_function=SimpleNamespace(upsert_dataframe=failing_upsert, delete_missing=upsert_sqlite.delete_missing),
+        upload_chunk_bytes=32,
+        check_references=False,
+    )
+    csv_content = "id,name,datetime,department_id,job_id\n" + "".join(
+        f"{i},Person{i},2023-0{i % 9 + 1}-01,1,1\n" for i in range(1, 8)
+    )
+    with TestClient(app) as c:
+        response = c.post(
+            "/upload/hired_employees",
+            files={"file": ("hired.csv", io.BytesIO(csv_content.encode()), "text/csv")},
+        )
+        assert response.status_code == 500
+        body = response.json()
+        assert body["detail"] == "connection lost"
+        # The chunks written before the failure stay committed
+        written = sum(calls[:2])
+        assert body["committed"] == {"rows": written, "inserted": written, "updated": 0, "unchanged": 0, "deleted": 0}
+        assert len(c.get("/stats/inspect_hired_employees").json()) == written
+    SQLModel.metadata.drop_all(test_engine)
+
+
+def test_upload_invalid_schema_returns_400(client):
+    response = client.post(
+        "/upload/jobs",
+        files={"file": ("jobs.csv", io.BytesIO(b"id,title\n1,Developer\n"), "text/csv")},
+    )
+    assert response.status_code == 400
+
+
+def test_upload_reports_rejected_rows(client):
+    upload_references(client, ids=(1,))
+    csv_content = (
+        "id,name,datetime,department_id,job_id\n"
+        "1,Alice,2023-01-15,1,1\n"
+        "2,Bob,not a date,1,1\n"
+        "x,Carla,2023-01-16,1,1\n"
+        ",Dan,2023-01-17,1,1\n"
+        "3,Elena,2023-01-18,7,1\n"
+        "4,Farid,2023-01-19,1.5,1\n"
+        "1,Alice B.,2023-01-20,1,\n"
+    )
+    response = client.post(
+        "/upload/hired_employees",
+        files={"file": ("hired.csv", io.BytesIO(csv_content.encode()), "text/csv")},
+    )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["rows"] == 1
+    assert body["rows_parsed"] == 7
+    rejected = body["rejected"]
+    assert rejected["rows"] == 6
+    assert rejected["by_reason"] == {
+        "datetime: not a datetime": 1,
+        "id: not an integer": 1,
+        "id: missing": 1,
+        "department_id: not an integer": 1,
+        "id: duplicate id, superseded by a later row": 1,
+        "department_id: unknown department": 1,
+    }
+    assert {"row": 2, "column": "datetime", "reason": "not a datetime", "value": "not a date"} in rejected["examples"]
+    assert {"row": 5, "column": "department_id", "reason": "unknown department", "value": "7"} in rejected["examples"]
+
+    rows = client.get("/stats/inspect_hired_employees").json()
+    assert [(r["id"], r["name"], r["job_id"]) for r in rows] == [(1, "Alice B.", None)]
+
+def test_rejected_last_occurrence_keeps_earlier_row(client):
+    upload_references(client, ids=(1,))
+    csv_content = (
+        "id,name,datetime,department_id,job_id\n"
+        "1,Alice,2023-01-15,1,1\n"
+        "1,Alice B.,2023-01-20,7,1\n"
+    )
+    response = client.post(
+        "/upload/hired_employees",
+        files={"file": ("hired.csv", io.BytesIO(csv_content.encode()), "text/csv")},
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["rejected"]["by_reason"] == {"department_id: unknown department": 1}
+    rows = client.get("/stats/inspect_hired_employees").json()
+    assert [(r["id"], r["name"]) for r in rows] == [(1, "Alice")]
+
+@pytest.mark.parametrize("chunk_bytes", [16, 1024 * 1024])
+def test_duplicate_ids_report_the_same_for_any_chunk_size(chunk_bytes):
+    SQLModel.metadata.drop_all(test_engine)
+    SQLModel.metadata.create_all(test_engine)
+    app = create_app(
+        engine_override=test_engine,
+        stats_function=stats_sqlite,
+        upsert_function=upsert_sqlite,
+        upload_chunk_bytes=chunk_bytes,
+        check_references=False,
+    )
+    csv_content = (
+        "id,name,datetime,department_id,job_id\n"
+        "1,Alice,2023-01-15,1,1\n"
+        "2,Bob,2023-02-15,1,1\n"
+        "1,Alice B.,2023-03-15,1,1\n"
+        "x,Dan,2023-04-15,1,1\n"
+        "2,Bob,2023-02-15,1,1\n"
+        "1,Alice C.,2023-05-15,1,1\n"
+    )
+    with TestClient(app) as c:
+        response = c.post("/upload/hired_employees", files={"file": ("hired.csv", io.BytesIO(csv_content.encode()), "text/csv")})
+        assert response.status_code == 200, response.text
+        body = response.json()
+        assert {name: body[name] for name in ("rows", "inserted", "updated", "unchanged")} == {
+            "rows": 2, "inserted": 2, "updated": 0, "unchanged": 0,
+        }
+        assert body["rejected"]["rows"] == 4
+        assert body["rejected"]["by_reason"] == {"id: duplicate id, superseded by a later row": 3, "id: not an integer": 1}
+        assert sorted(example["row"] for example in body["rejected"]["examples"]) == [1, 2, 3, 4]
+        rows = c.get("/stats/inspect_hired_employees").json()
+        assert sorted((r["id"], r["name"]) for r in rows) == [(1, "Alice C."), (2, "Bob")]
+    SQLModel.metadata.drop_all(test_engine)
+
+def test_reupload_reports_deltas_and_snapshot_deletes_missing(client):
+    upload_references(client)
+
+    def post(csv_content, **params):
+        response = client.post(
+            "/upload/hired_employees", params=params,
+            files={"file": ("hired.csv", io.BytesIO(csv_content.encode()), "text/csv")},
+        )
+        assert response.status_code == 200, response.text
+        return {name: response.json()[name] for name in ("inserted", "updated", "unchanged", "deleted")}
+
+    header = "id,name,datetime,department_id,job_id\n"
+    first = header + "1,Alice,2023-01-15,1,1\n2,Bob,2023-04-20,2,2\n3,Carla,2023-05-01,1,2\n"
+    assert post(first) == {"inserted": 3, "updated": 0, "unchanged": 0, "deleted": 0}
+    etag = client.get("/stats/hired_employees/2023").headers["etag"]
+
+    # An identical re-upload writes nothing and keeps cached stats valid
+    assert post(first) == {"inserted": 0, "updated": 0, "unchanged": 3, "deleted": 0}
+    assert client.get("/stats/hired_employees/2023", headers={"If-None-Match": etag}).status_code == 304
+
+    # A full snapshot: Bob moves, Carla is gone, Dan is new and the rejected row still keeps Alice
+    snapshot = header + "1,Alice,not a date,1,1\n2,Bob,2023-08-20,2,2\n4,Dan,2023-09-01,1,1\n"
+    assert post(snapshot, delete_missing="true") == {"inserted": 1, "updated": 1, "unchanged": 0, "deleted": 1}
+    assert [r["id"] for r in client.get("/stats/inspect_hired_employees").json()] == [1, 2, 4]
+
+    response = client.post(
+        "/upload/hired_employees?delete_missing=true", files={"file": ("hired.csv", io.BytesIO(header.encode()), "text/csv")},
+    )
+    assert response.status_code == 400
+    assert len(client.get("/stats/inspect_hired_employees").json()) == 3
+
+    # Departments still referenced by hires survive a snapshot that leaves them out
+    client.post("/upload/departments", files={"file": ("departments.csv", io.BytesIO(b"id,department\n4,Legal\n"), "text/csv")})
+    response = client.post(
+        "/upload/departments?delete_missing=true",
+        files={"file": ("departments.csv", io.BytesIO(b"id,department\n3,Sales\n"), "text/csv")},
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["deleted"] == 1
+    assert [r["department"] for r in client.get("/stats/hired_employees/2023").json()] == ["Department 1", "Department 2"]
 
 # -------------------------------------------------------------------
 # Stats Endpoints Tests
 # -------------------------------------------------------------------
 
 def test_get_hired_employees(client):
+    upload_references(client)
     csv_content = (
         "id,name,datetime,department_id,job_id\n"
         "1,Alice,2023-01-15,1,1\n"
@@ -105,6 +323,32 @@ def test_get_hired_employees(client):
     names = [r["name"] for r in rows]
     assert names == ["Alice", "Bob", "Charlie", "Diana", "Eve"]    
 
+def test_hired_employees_keyset_pages_and_export(client):
+    upload_references(client)
+    csv_content = "id,name,datetime,department_id,job_id\n" + "".join(
+        f"{i},Person{i},{2022 + i % 2}-03-01,{i % 2 + 1},1\n" for i in range(1, 8)
+    )
+    client.post("/upload/hired_employees", files={"file": ("hired.csv", io.BytesIO(csv_content.encode()), "text/csv")})
+
+    ids, url = [], "/stats/inspect_hired_employees?limit=3"
+    while url:
+        page = client.get(url)
+        ids += [r["id"] for r in page.json()]
+        url = page.links.get("next", {}).get("url")
+    assert ids == [1, 2, 3, 4, 5, 6, 7]
+
+    filtered = client.get("/stats/inspect_hired_employees", params={"year": 2023, "department_id": 2, "after_id": 1})
+    assert [r["id"] for r in filtered.json()] == [3, 5, 7]
+    assert "link" not in filtered.headers
+
+    exported = client.get("/stats/inspect_hired_employees", params={"export": True, "year": 2022})
+    assert [r["id"] for r in exported.json()] == [2, 4, 6]
+    as_csv = client.get(
+        "/stats/inspect_hired_employees", params={"export": True, "job_id": 2}, headers={"Accept": "text/csv"}
+    )
+    assert as_csv.text.splitlines() == ["id,name,datetime,department_id,job_id"]
+
+
 def test_get_hired_employees_stats(client):
     client.post(
         "/upload/departments",
@@ -149,3 +393,378 @@ def test_get_top_departments(client):
     assert response.status_code == 200
     data = response.json()
     assert any(d["department"] == "Engineering" for d in data)
+
+
+def test_get_hired_employees_stats_year_boundaries(client):
+    client.post(
+        "/upload/departments",
+        files={"file": ("departments.csv", io.BytesIO(b"id,department\n1,Engineering\n"), "text/csv")},
+    )
+    client.post(
+        "/upload/jobs",
+        files={"file": ("jobs.csv", io.BytesIO(b"id,job\n1,Developer\n"), "text/csv")},
+    )
+    csv_content = (
+        "id,name,datetime,department_id,job_id\n"
+        "1,Alice,2022-12-31T23:59:59,1,1\n"
+        "2,Bob,2023-01-01T00:00:00,1,1\n"
+        "3,Charlie,2023-12-31T23:59:59,1,1\n"
+        "4,Diana,2024-01-01T00:00:00,1,1\n"
+    )
+    client.post(
+        "/upload/hired_employees",
+        files={"file": ("hired.csv", io.BytesIO(csv_content.encode()), "text/csv")},
+    )
+
+    data = client.get("/stats/hired_employees/2023").json()
+    assert data == [{"department": "Engineering", "job": "Developer", "Q1": 1, "Q2": 0, "Q3": 0, "Q4": 1}]
+
+
+@pytest.mark.parametrize("path", [
+    "/stats/hired_employees/0",
+    "/stats/hired_employees/9999",
+    "/stats/top_departments/9999",
+    "/stats/inspect_hired_employees?year=0",
+])
+def test_years_outside_datetime_range_are_rejected(client, path):
+    # The year range ends at Jan 1 of the next year, which must be a valid datetime
+    assert client.get(path).status_code == 422
+    assert client.get("/stats/hired_employees/9998").json() == []
+
+
+@pytest.mark.parametrize("stats_module", [stats_sqlite, stats_rollup])
+def test_hired_employees_series(stats_module):
+    SQLModel.metadata.drop_all(test_engine)
+    SQLModel.metadata.create_all(test_engine)
+    app = create_app(engine_override=test_engine, stats_function=stats_module, upsert_function=upsert_sqlite)
+    with TestClient(app) as c:
+        upload_references(c)
+        csv_content = (
+            "id,name,datetime,department_id,job_id\n"
+            "1,Alice,2014-12-31T23:59:59,1,1\n"
+            "2,Bob,2015-01-04T10:00:00,1,1\n"
+            "3,Carla,2015-02-16T10:00:00,1,1\n"
+            "4,Dan,2015-11-30T10:00:00,2,1\n"
+            "5,Elena,2016-01-05T10:00:00,1,1\n"
+            "6,Farid,2017-01-01T00:00:00,1,1\n"
+        )
+        c.post("/upload/hired_employees", files={"file": ("hired.csv", io.BytesIO(csv_content.encode()), "text/csv")})
+
+        quarters = c.get("/stats/hired_employees", params={"from": 2015, "to": 2016}).json()
+        assert quarters == {
+            "from": 2015,
+            "to": 2016,
+            "granularity": "quarter",
+            "period": ["2015-01-01", "2015-10-01", "2016-01-01"],
+            "department": ["Department 1", "Department 2", "Department 1"],
+            "job": ["Job 1", "Job 1", "Job 1"],
+            "hired": [2, 1, 1],
+        }
+        months = c.get("/stats/hired_employees", params={"from": 2015, "to": 2016, "granularity": "month"}).json()
+        assert months["period"] == ["2015-01-01", "2015-02-01", "2015-11-01", "2016-01-01"]
+        assert months["hired"] == [1, 1, 1, 1]
+        weeks = c.get("/stats/hired_employees", params={"from": 2015, "to": 2015, "granularity": "week"}).json()
+        # 2015-01-04 is a Sunday and belongs to the week starting Monday 2014-12-29
+        assert weeks["period"] == ["2014-12-29", "2015-02-16", "2015-11-30"]
+
+        assert c.get("/stats/hired_employees", params={"from": 2016, "to": 2015}).status_code == 400
+        assert c.get("/stats/hired_employees", params={"from": 1, "to": 9999}).status_code == 422
+        assert c.get("/stats/hired_employees", params={"from": 0, "to": 10}).status_code == 422
+        assert c.get("/stats/hired_employees", params={"from": 1, "to": 9998}).status_code == 400
+        assert c.get("/stats/hired_employees", params={"from": 1, "to": 100}).json()["period"] == []
+        assert c.get("/stats/hired_employees", params={"from": 2015, "to": 2016, "granularity": "day"}).status_code == 422
+    SQLModel.metadata.drop_all(test_engine)
+
+
+def test_stats_export_formats(client):
+    upload_references(client)
+    csv_content = (
+        "id,name,datetime,department_id,job_id\n"
+        "1,Alice,2023-02-10,1,1\n"
+        "2,Bob,2023-05-15,1,1\n"
+        "3,Carla,2023-08-01,2,2\n"
+    )
+    client.post("/upload/hired_employees", files={"file": ("hired.csv", io.BytesIO(csv_content.encode()), "text/csv")})
+
+    as_csv = client.get("/stats/hired_employees/2023", headers={"Accept": "text/csv"})
+    assert as_csv.status_code == 200
+    assert as_csv.headers["content-type"].startswith("text/csv")
+    assert as_csv.text.splitlines() == [
+        "department,job,Q1,Q2,Q3,Q4",
+        "Department 1,Job 1,1,1,0,0",
+        "Department 2,Job 2,0,0,1,0",
+    ]
+
+    as_ndjson = client.get(
+        "/stats/hired_employees", params={"from": 2023, "to": 2023}, headers={"Accept": "application/x-ndjson"}
+    )
+    assert as_ndjson.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in as_ndjson.text.splitlines()] == [
+        {"period": "2023-01-01", "department": "Department 1", "job": "Job 1", "hired": 1},
+        {"period": "2023-04-01", "department": "Department 1", "job": "Job 1", "hired": 1},
+        {"period": "2023-07-01", "department": "Department 2", "job": "Job 2", "hired": 1},
+    ]
+
+    preferred = client.get("/stats/top_departments/2023", headers={"Accept": "text/csv;q=0.5, application/json"})
+    assert preferred.headers["content-type"] == "application/json"
+    assert client.get("/stats/top_departments/2023", headers={"Accept": "text/html"}).status_code == 406
+
+    arrow = client.get("/stats/top_departments/2023", headers={"Accept": "application/vnd.apache.arrow.stream"})
+    assert arrow.status_code == (200 if export.available("arrow") else 406)
+
+
+def test_stats_etag_and_upload_invalidation(client):
+    client.post(
+        "/upload/departments",
+        files={"file": ("departments.csv", io.BytesIO(b"id,department\n1,Engineering\n"), "text/csv")},
+    )
+    client.post(
+        "/upload/jobs",
+        files={"file": ("jobs.csv", io.BytesIO(b"id,job\n1,Developer\n"), "text/csv")},
+    )
+    hired = b"id,name,datetime,department_id,job_id\n1,Alice,2023-02-16,1,1\n"
+    client.post("/upload/hired_employees", files={"file": ("hired.csv", io.BytesIO(hired), "text/csv")})
+
+    first = client.get("/stats/hired_employees/2023")
+    etag = first.headers["etag"]
+    assert first.json()[0]["Q1"] == 1
+
+    not_modified = client.get("/stats/hired_employees/2023", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+
+    hired = b"id,name,datetime,department_id,job_id\n2,Bob,2023-03-16,1,1\n"
+    client.post("/upload/hired_employees", files={"file": ("hired.csv", io.BytesIO(hired), "text/csv")})
+
+    refreshed = client.get("/stats/hired_employees/2023", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert refreshed.json()[0]["Q1"] == 2
+    assert refreshed.headers["etag"] != etag
+
+
+def wait_for_job(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"/upload/jobs/{job_id}").json()
+        if job["state"] in ("succeeded", "failed") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def sqlite_file_engine(tmp_path):
+    # Job workers and requests write from different threads, so each needs
+    # its own connection: on the shared in-memory connection one thread's
+    # rollback discards another's uncommitted claim
+    engine = set_sqlite_pragmas(
+        create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", connect_args={"check_same_thread": False})
+    )
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture(scope="function")
+def jobs_client(tmp_path):
+    engine = sqlite_file_engine(tmp_path)
+    app = create_app(
+        engine_override=engine,
+        stats_function=stats_sqlite,
+        upsert_function=upsert_sqlite,
+        job_spool_dir=str(tmp_path / "spool"),
+    )
+    with TestClient(app) as c:
+        yield c
+    engine.dispose()
+
+
+def test_async_upload_job(jobs_client):
+    client = jobs_client
+    upload_references(client)
+    csv_content = "id,name,datetime,department_id,job_id\n1,Alice,2023-01-15,1,1\n2,Bob,2023-04-20,2,2\n"
+    response = client.post(
+        "/upload/hired_employees?async=true",
+        files={"file": ("hired.csv", io.BytesIO(csv_content.encode()), "text/csv")},
+    )
+    assert response.status_code == 202, response.text
+    job_id = response.json()["job_id"]
+
+    job = wait_for_job(client, job_id)
+    assert job["state"] == "succeeded", job
+    assert job["rows_processed"] == 2
+    assert (job["rows_inserted"], job["rows_updated"], job["rows_unchanged"], job["rows_deleted"]) == (2, 0, 0, 0)
+    assert len(client.get("/stats/inspect_hired_employees").json()) == 2
+
+    failed = client.post(
+        "/upload/jobs?async=true",
+        files={"file": ("jobs.csv", io.BytesIO(b"id,title\n1,Developer\n"), "text/csv")},
+    )
+    job = wait_for_job(client, failed.json()["job_id"])
+    assert job["state"] == "failed"
+    assert "Invalid schema" in job["error"]
+
+    assert client.get("/upload/jobs/does-not-exist").status_code == 404
+
+
+def test_queued_jobs_resume_after_restart(tmp_path):
+    engine = sqlite_file_engine(tmp_path)
+    spooled = tmp_path / "pending.upload"
+    spooled.write_bytes(b"id,department\n1,Engineering\n2,HR\n")
+    with Session(engine) as session:
+        session.add(IngestionJob(id="pending", table="departments", state="running", file_path=str(spooled)))
+        session.commit()
+
+    app = create_app(
+        engine_override=engine,
+        stats_function=stats_sqlite,
+        upsert_function=upsert_sqlite,
+        job_spool_dir=str(tmp_path),
+    )
+    with TestClient(app) as c:
+        job = wait_for_job(c, "pending")
+    assert job["state"] == "succeeded", job
+    assert job["rows_processed"] == 2
+    assert not spooled.exists()
+    engine.dispose()
+
+
+def test_resumed_job_without_its_spool_file_fails(tmp_path):
+    # Spooled on another host, whose local spool directory this one cannot see
+    engine = sqlite_file_engine(tmp_path)
+    with Session(engine) as session:
+        session.add(IngestionJob(id="elsewhere", table="departments", state="running", file_path="/elsewhere/elsewhere.csv"))
+        session.commit()
+
+    app = create_app(
+        engine_override=engine,
+        stats_function=stats_sqlite,
+        upsert_function=upsert_sqlite,
+        job_spool_dir=str(tmp_path),
+    )
+    with TestClient(app) as c:
+        job = wait_for_job(c, "elsewhere")
+    assert job["state"] == "failed"
+    assert "Spool file /elsewhere/elsewhere.csv not found" in job["error"]
+    assert "INGESTION_SPOOL_DIR" in job["error"]
+    engine.dispose()
+
+
+def test_jobs_are_claimed_by_one_worker(tmp_path):
+    SQLModel.metadata.drop_all(test_engine)
+    SQLModel.metadata.create_all(test_engine)
+    state = SimpleNamespace(sessionmaker=sessionmaker(bind=test_engine, class_=Session, expire_on_commit=False))
+    first, second = (IngestionJobs(state, spool_dir=str(tmp_path), stale_after=30) for _ in range(2))
+    with Session(test_engine) as session:
+        session.add(IngestionJob(id="job", table="departments", file_path=str(tmp_path / "job.csv")))
+        session.commit()
+
+    # Both workers see the queued job at startup; only one claim succeeds
+    assert first._pending_ids() == second._pending_ids() == ["job"]
+    assert first._claim("job").owner == first.owner
+    assert second._claim("job") is None
+    # A running job with a fresh heartbeat is not resumed by another worker
+    assert second._pending_ids() == []
+
+    # Its owner dies: once the heartbeat is stale the job is taken over
+    with Session(test_engine) as session:
+        job = session.get(IngestionJob, "job")
+        job.heartbeat_at = datetime.now(timezone.utc) - timedelta(seconds=60)
+        session.add(job)
+        session.commit()
+    assert second._pending_ids() == ["job"]
+    assert second._claim("job").owner == second.owner
+    # Late writes of the previous owner are ignored
+    first._update("job", state="failed", error="gone")
+    assert second.get("job").state == "running"
+    second._release()
+    assert first._pending_ids() == ["job"]
+    SQLModel.metadata.drop_all(test_engine)
+
+
+def test_pool_status_and_sessions_returned(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "0")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+    options = pool_options_from_env()
+    assert options["pool_size"] == 3 and options["max_overflow"] == 0 and options["pool_pre_ping"] is False
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", **options)
+    SQLModel.metadata.create_all(engine)
+    app = create_app(
+        engine_override=engine,
+        stats_function=stats_sqlite,
+        upsert_function=upsert_sqlite,
+        stats_cache_size=0,
+    )
+    with TestClient(app) as c:
+        # More requests than pooled connections: each must give its connection back
+        for _ in range(10):
+            assert c.get("/stats/top_departments/2023").status_code == 200
+        status = c.get("/internal/pool").json()
+    assert status["pool_class"] == "InstrumentedQueuePool"
+    assert status["size"] == 3
+    assert status["checkedout"] == 0
+    assert status["checkouts"] >= 10
+    assert status["wait_seconds_max"] >= status["wait_seconds_avg"] >= 0
+    engine.dispose()
+
+
+def test_default_app_on_a_sqlite_database_url(tmp_path, monkeypatch):
+    import app.database as app_db
+    monkeypatch.setattr(app_db, "DATABASE_URL", f"sqlite:///{tmp_path / 'app.db'}")
+    app_db.get_engine.cache_clear()
+    try:
+        app = create_app(parse_executor="thread", job_spool_dir=str(tmp_path / "spool"))
+        with TestClient(app) as c:
+            # The SQLite upsert is picked for the engine, not the Postgres default
+            upload_references(c)
+            csv_content = "id,name,datetime,department_id,job_id\n1,Alice,2023-01-15,1,1\n"
+            response = c.post("/upload/hired_employees", files={"file": ("hired.csv", io.BytesIO(csv_content.encode()), "text/csv")})
+            assert response.status_code == 200, response.text
+            assert c.get("/stats/hired_employees/2023").json()[0]["Q1"] == 1
+        with app_db.get_engine().connect() as connection:
+            assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+    finally:
+        app_db.get_engine().dispose()
+        app_db.get_engine.cache_clear()
+
+
+def test_startup_warmup_and_one_time_schema(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_CREATE_SCHEMA", "false")
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    engine = create_engine(f"sqlite:///{tmp_path / 'startup.db'}", **pool_options_from_env())
+    # Only the job table, which the job workers read on start; the schema step has not run
+    IngestionJob.__table__.create(engine)
+
+    def start():
+        app = create_app(engine_override=engine, stats_function=stats_sqlite, upsert_function=upsert_sqlite, stats_cache_size=0)
+        return TestClient(app)
+
+    # Workers leave the schema alone, and a failed warmup does not stop the app
+    with start() as c:
+        assert c.get("/internal/pool").status_code == 200
+    assert inspect(engine).get_table_names() == ["ingestionjob"]
+
+    SQLModel.metadata.create_all(engine)
+    cache_hits = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "hiredemployee" in statement:
+            cache_hits.append(context.cache_hit == context.dialect.CACHE_HIT)
+
+    with start() as c:
+        status = c.get("/internal/pool").json()
+        assert status["checkedin"] == 3
+        cache_hits.clear()
+        assert c.get("/stats/hired_employees/2023").status_code == 200
+    # The first request found its statement already compiled
+    assert cache_hits == [True]
+    engine.dispose()
+
+
+def test_warm_pool_without_a_sized_pool():
+    # sqlite:// defaults to SingletonThreadPool, whose `size` is an int
+    engine = create_engine("sqlite://")
+    assert warm_pool(engine) == 1
+    assert warm_pool(test_engine) == 1
+    engine.dispose()
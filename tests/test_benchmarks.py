@@ -0,0 +1,50 @@
+import os
+import pandas as pd
+import pytest
+from benchmarks import bench_partitions, bench_startup, bench_stats_queries, generate, run
+
+
+def test_generator_is_deterministic_and_chunk_independent():
+    small_chunks = pd.concat(generate.hires(250_000, seed=7, chunk_size=60_000), ignore_index=True)
+    one_chunk = pd.concat(generate.hires(250_000, seed=7, chunk_size=1_000_000), ignore_index=True)
+    assert small_chunks.equals(one_chunk)
+    assert small_chunks["id"].is_unique and len(small_chunks) == 250_000
+
+    # Hiring grows year over year and the first department dominates
+    per_year = small_chunks["datetime"].dt.year.value_counts().sort_index()
+    assert per_year.is_monotonic_increasing
+    assert small_chunks["department_id"].value_counts().idxmax() == 1
+
+
+def test_benchmark_run_and_thresholds():
+    result = run.run("sqlite", rows=2_000, requests=5)
+    assert result["upload"]["hired_employees"]["rows"] == 2_000
+    assert set(result["stats"]) == {"hired_employees", "top_departments"}
+    assert result["stats"]["top_departments"]["p99_ms"] >= result["stats"]["top_departments"]["p50_ms"]
+
+    assert run.check_thresholds(result, {"min_upload_rows_per_sec": 1, "max_p99_ms": {"hired_employees": 60_000}}) == []
+    regressions = run.check_thresholds(result, {"min_upload_rows_per_sec": 10**12, "max_peak_rss_mb": 1})
+    assert len(regressions) == 2
+
+
+def test_stats_query_benchmark_reports_each_query():
+    result = bench_stats_queries.run(requests=5)
+    assert set(result["queries"]) == {"hired_employees", "top_departments", "hired_employees_series"}
+    assert all(timings["prebuilt_us"] > 0 for timings in result["queries"].values())
+
+
+def test_startup_benchmark_serves_without_heavy_imports():
+    result = bench_startup.run(workers=1, repeats=1)
+    # Importing the app loads none of the data libraries; uploads load them on first use
+    assert result["import"]["heavy_modules_loaded"] == []
+    assert result["server"]["first_request_ms"] > 0
+    assert result["server"]["first_stats_ms"] > 0
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL is not set")
+def test_partition_benchmark_reports_each_layout_and_year():
+    result = bench_partitions.run(os.environ["TEST_POSTGRES_URL"], rows=2_000, requests=2)
+    assert set(result["layouts"]) == {"heap", "partitioned"}
+    for layout in result["layouts"].values():
+        assert set(layout["hired_employees"]) == set(generate.YEARS)
+    assert set(result["p50_speedup"]) == {"hired_employees", "top_departments"}
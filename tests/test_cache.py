@@ -0,0 +1,62 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.utils.cache import StatsCache, CachedBody
+
+
+def body(value) -> CachedBody:
+    return CachedBody(body=str(value).encode(), etag=f'"{value}"')
+
+
+def test_lru_eviction_and_generation_bump():
+    cache = StatsCache(maxsize=2)
+    calls = []
+
+    def compute(value):
+        calls.append(value)
+        return body(value)
+
+    cache.get_or_compute(("a",), lambda: compute("a"))
+    cache.get_or_compute(("b",), lambda: compute("b"))
+    cache.get_or_compute(("a",), lambda: compute("a"))  # hit, refreshes "a"
+    cache.get_or_compute(("c",), lambda: compute("c"))  # evicts "b"
+    cache.get_or_compute(("b",), lambda: compute("b"))
+    assert calls == ["a", "b", "c", "b"]
+
+    cache.bump()
+    cache.get_or_compute(("b",), lambda: compute("b"))
+    assert calls == ["a", "b", "c", "b", "b"]
+
+
+def test_concurrent_misses_run_one_computation():
+    cache = StatsCache()
+    calls = 0
+
+    def slow_query():
+        nonlocal calls
+        calls += 1
+        time.sleep(0.2)
+        return body("result")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: cache.get_or_compute(("stats", 2023), slow_query), range(8)))
+
+    assert calls == 1
+    assert {r.body for r in results} == {b"result"}
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("app.utils.cache.time.monotonic", lambda: now[0])
+    cache = StatsCache(ttl=30)
+    calls = []
+
+    def compute():
+        calls.append(now[0])
+        return body(len(calls))
+
+    cache.get_or_compute(("stats", 2023), compute)
+    now[0] += 29
+    assert cache.get_or_compute(("stats", 2023), compute).body == b"1"
+    now[0] += 2
+    assert cache.get_or_compute(("stats", 2023), compute).body == b"2"
+    assert calls == [100.0, 131.0]
@@ -0,0 +1,51 @@
+import asyncio
+import tracemalloc
+import pytest
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import Session, SQLModel, create_engine
+from app.database import set_sqlite_pragmas
+from app.models import HiredEmployee
+from app.utils import export, stats_sqlite, upsert_sqlite
+from tests.test_upsert_sqlite import make_hires
+
+ROWS = 200_000
+
+
+@pytest.fixture(scope="module")
+def make_session(tmp_path_factory):
+    engine = set_sqlite_pragmas(create_engine(f"sqlite:///{tmp_path_factory.mktemp('export') / 'export.db'}"))
+    SQLModel.metadata.create_all(engine)
+    upsert_sqlite.upsert_dataframe(make_hires(ROWS), HiredEmployee, batch_size=10_000, engine=engine, rollup=False)
+    yield sessionmaker(bind=engine, class_=Session)
+    engine.dispose()
+
+
+def test_negotiate():
+    assert export.negotiate(None) == "json"
+    assert export.negotiate("text/csv") == "csv"
+    assert export.negotiate("application/x-ndjson;q=0.9, text/csv;q=0.8") == "ndjson"
+    assert export.negotiate("text/html, */*;q=0.1") == "json"
+    assert export.negotiate("text/html") is None
+
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson", "json"])
+def test_export_streams_in_bounded_memory(make_session, fmt):
+    async def consume(query):
+        received = lines = 0
+        response = export.stream_query(make_session, query, fmt, batch_rows=1_000)
+        async for chunk in response.body_iterator:
+            received += len(chunk)
+            lines += chunk.count(b"\n")
+        return received, lines
+
+    # Warm up statement compilation and the thread pool outside the measurement
+    asyncio.run(consume(stats_sqlite.hired_employees_query(after_id=ROWS - 10)))
+    tracemalloc.start()
+    try:
+        received, lines = asyncio.run(consume(stats_sqlite.hired_employees_query()))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert lines == {"csv": ROWS + 1, "ndjson": ROWS, "json": 0}[fmt]
+    # Only a batch or two of rows is ever alive, never the whole result
+    assert peak < received / 4, (peak, received)
@@ -0,0 +1,46 @@
+import io
+import logging
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, create_engine
+from sqlalchemy.pool import StaticPool
+from app.main import create_app
+from app.utils import metrics, upsert_sqlite, stats_sqlite
+
+
+def make_client(**kwargs):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    app = create_app(engine_override=engine, stats_function=stats_sqlite, upsert_function=upsert_sqlite, **kwargs)
+    return TestClient(app)
+
+
+def test_statement_fingerprint():
+    assert metrics.statement_fingerprint('INSERT INTO "hiredemployee" ("id") VALUES (?)') == ("INSERT", "hiredemployee")
+    assert metrics.statement_fingerprint("WITH base AS (SELECT 1 FROM department) SELECT 1") == ("WITH", "department")
+
+
+def test_metrics_endpoint_reports_requests_queries_and_uploads():
+    uploads_before = metrics.UPLOAD_ROWS_UPSERTED.value(table="departments")
+    requests_before = metrics.REQUEST_LATENCY.count(method="GET", route="/stats/top_departments/{year}", status=200)
+
+    with make_client() as client:
+        client.post(
+            "/upload/departments",
+            files={"file": ("departments.csv", io.BytesIO(b"id,department\n1,Engineering\n2,HR\n"), "text/csv")},
+        )
+        client.get("/stats/top_departments/2023")
+        client.get("/stats/top_departments/2024")
+        body = client.get("/metrics").text
+
+    assert metrics.UPLOAD_ROWS_UPSERTED.value(table="departments") == uploads_before + 2
+    assert metrics.REQUEST_LATENCY.count(method="GET", route="/stats/top_departments/{year}", status=200) == requests_before + 2
+    assert 'http_request_duration_seconds_count{method="GET",route="/stats/top_departments/{year}",status="200"}' in body
+    assert 'db_query_duration_seconds_bucket{operation="INSERT",table="department",le="+Inf"}' in body
+    assert 'upload_write_seconds_total{table="departments"}' in body
+    assert "# TYPE db_query_rows_total counter" in body
+
+
+def test_slow_query_log(caplog):
+    with make_client(slow_query_threshold_ms=0) as client, caplog.at_level(logging.WARNING, logger="app.slow_query"):
+        client.get("/stats/hired_employees/2023")
+    assert any("slow query" in r.message and "hiredemployee" in r.message for r in caplog.records)
@@ -0,0 +1,135 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlmodel import SQLModel, Session, create_engine, select
+from app.database import create_db_and_tables
+from app.main import create_app
+from app.models import HiredEmployee
+from app.utils import partitions, rollup, stats_sql, upsert_postgres, upsert_postgres_copy
+
+
+# -------------------------------------------------------------------
+# Year-partitioned hiredemployee (Postgres only): set TEST_POSTGRES_URL
+# to a scratch database
+# -------------------------------------------------------------------
+
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+
+
+@pytest.fixture(scope="function")
+def pg_engine():
+    engine = create_engine(TEST_POSTGRES_URL)
+    SQLModel.metadata.drop_all(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP SCHEMA IF EXISTS archive CASCADE")
+    create_db_and_tables(engine, partition_hires=True)
+    yield engine
+    SQLModel.metadata.drop_all(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP SCHEMA IF EXISTS archive CASCADE")
+    engine.dispose()
+
+
+def hires(datetimes, names=None):
+    return pd.DataFrame({
+        "id": range(1, len(datetimes) + 1),
+        "name": names or ["x"] * len(datetimes),
+        "datetime": pd.to_datetime(datetimes),
+        "department_id": [1] * len(datetimes),
+        "job_id": [1] * len(datetimes),
+    })
+
+
+def stored(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT id, tableoid::regclass::text FROM hiredemployee ORDER BY id")).all()
+
+
+@pytest.mark.parametrize("upsert", [upsert_postgres, upsert_postgres_copy])
+def test_upsert_creates_partitions_and_moves_hires(pg_engine, upsert):
+    assert partitions.is_partitioned(pg_engine)
+    df = hires(["2021-02-01", "2022-03-01", None])
+    assert upsert.upsert_dataframe(df, HiredEmployee, engine=pg_engine) == {"inserted": 3, "updated": 0, "unchanged": 0}
+    assert stored(pg_engine) == [(1, "hiredemployee_y2021"), (2, "hiredemployee_y2022"), (3, "hiredemployee_default")]
+    assert upsert.upsert_dataframe(df, HiredEmployee, engine=pg_engine) == {"inserted": 0, "updated": 0, "unchanged": 3}
+
+    # 1 moves to a new year, 2 changes in place, 3 gets a datetime, 4 is new
+    changed = hires(["2023-05-01", "2022-03-01", "2021-01-05", "2024-01-01"], names=["x", "y", "x", "x"])
+    assert upsert.upsert_dataframe(changed, HiredEmployee, engine=pg_engine) == {"inserted": 1, "updated": 3, "unchanged": 0}
+    assert stored(pg_engine) == [
+        (1, "hiredemployee_y2023"), (2, "hiredemployee_y2022"), (3, "hiredemployee_y2021"), (4, "hiredemployee_y2024"),
+    ]
+    with pg_engine.connect() as conn:
+        assert partitions.attached_years(conn) == {2021, 2022, 2023, 2024}
+        assert rollup.diff_rollup(conn).empty
+
+
+def test_year_query_reads_only_its_partition(pg_engine):
+    upsert_postgres.upsert_dataframe(hires(["2021-02-01", "2022-03-01", "2023-04-01"]), HiredEmployee, engine=pg_engine)
+    with pg_engine.connect() as conn:
+        for build in (stats_sql.hired_employees_stats_query, stats_sql.top_departments_query):
+            sql = str(build(2022).compile(conn, compile_kwargs={"literal_binds": True}))
+            plan = "\n".join(row[0] for row in conn.exec_driver_sql(f"EXPLAIN {sql}"))
+            assert "hiredemployee_y2022" in plan
+            assert "hiredemployee_y2021" not in plan and "hiredemployee_y2023" not in plan
+            assert "hiredemployee_default" not in plan
+
+
+def test_detach_year_archives_partition_and_rollup(pg_engine):
+    upsert_postgres.upsert_dataframe(hires(["2015-02-01", "2016-03-01"]), HiredEmployee, engine=pg_engine)
+    partitions.detach_year(pg_engine, 2015)
+    with Session(pg_engine) as session:
+        assert [h.id for h in session.exec(select(HiredEmployee))] == [2]
+        assert session.exec(text("SELECT count(*) FROM archive.hiredemployee_y2015")).scalar() == 1
+        assert rollup.diff_rollup(session.connection()).empty
+    with pytest.raises(ValueError):
+        partitions.detach_year(pg_engine, 2015)
+
+    # A later upload of the year gets a fresh partition
+    upsert_postgres.upsert_dataframe(hires(["2015-02-01"]), HiredEmployee, engine=pg_engine)
+    assert stored(pg_engine)[0] == (1, "hiredemployee_y2015")
+
+
+def test_detach_year_drops_cached_stats(pg_engine):
+    app = create_app(
+        engine_override=pg_engine, stats_function=stats_sql, upsert_function=upsert_postgres,
+        parse_executor="thread", check_references=False, generation_poll_interval=0,
+    )
+    csv_content = "id,name,datetime,department_id,job_id\n1,Alice,2015-02-01,1,1\n"
+    with TestClient(app) as c:
+        for table, content in (("departments", "id,department\n1,Sales\n"), ("jobs", "id,job\n1,Engineer\n"), ("hired_employees", csv_content)):
+            response = c.post(f"/upload/{table}", files={"file": (f"{table}.csv", io.BytesIO(content.encode()), "text/csv")})
+            assert response.status_code == 200, response.text
+        assert c.get("/stats/hired_employees/2015").json()[0]["Q1"] == 1
+        partitions.detach_year(pg_engine, 2015)
+        assert c.get("/stats/hired_employees/2015").json() == []
+
+
+@pytest.mark.parametrize("upsert", [upsert_postgres, upsert_postgres_copy])
+@pytest.mark.parametrize("track_rollup", [True, False])
+def test_concurrent_moves_keep_ids_unique(pg_engine, upsert, track_rollup):
+    # Writers upload the same ids under different years at once: each moves
+    # the others' rows out, and only one row per id may remain
+    years = ["2019", "2020", "2021", "2022"]
+    partitions.ensure_partitions(pg_engine, pd.to_datetime([f"{year}-06-01" for year in years]))
+    for round_ in range(3):
+        barrier = threading.Barrier(len(years))
+
+        def write(year):
+            df = hires([f"{year}-06-01"] * 200)
+            barrier.wait()
+            upsert.upsert_dataframe(df, HiredEmployee, engine=pg_engine, rollup=track_rollup)
+
+        with ThreadPoolExecutor(max_workers=len(years)) as pool:
+            for future in [pool.submit(write, year) for year in years]:
+                future.result()
+
+    with pg_engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*), count(DISTINCT id) FROM hiredemployee")).one() == (200, 200)
@@ -0,0 +1,76 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pytest
+from sqlalchemy.engine import make_url
+from sqlmodel import SQLModel, Session, create_engine, select
+from app.models import HiredEmployee, HiredEmployeeQuarterly
+from app.utils import rollup, upsert_postgres, upsert_postgres_copy
+
+
+# -------------------------------------------------------------------
+# Postgres-only tests: set TEST_POSTGRES_URL to a scratch database
+# -------------------------------------------------------------------
+
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+
+
+@pytest.fixture(scope="function")
+def pg_engine(request):
+    url = make_url(TEST_POSTGRES_URL)
+    # Parametrized with a driver module name to run a test on that driver
+    driver = getattr(request, "param", None)
+    if driver is not None:
+        pytest.importorskip(driver)
+        url = url.set(drivername=f"postgresql+{driver}")
+    engine = create_engine(url)
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    SQLModel.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.mark.parametrize("pg_engine", ["psycopg2", "psycopg"], indirect=True)
+def test_copy_upsert_inserts_and_updates(pg_engine):
+    df = pd.DataFrame({
+        "id": [1, 2, 2],
+        "name": ["Alice", "Bob", "Bobby"],
+        "datetime": pd.to_datetime(["2023-01-15", "2023-04-20", "2023-04-21"]),
+        "department_id": [1, None, 2],
+        "job_id": [1, 2, 2],
+    })
+    upsert_postgres_copy.upsert_dataframe(df, HiredEmployee, engine=pg_engine)
+    upsert_postgres_copy.upsert_dataframe(df.iloc[:1].assign(name="Alicia"), HiredEmployee, engine=pg_engine)
+
+    with Session(pg_engine) as session:
+        rows = {r.id: r for r in session.exec(select(HiredEmployee))}
+    assert rows[1].name == "Alicia"
+    assert rows[2].name == "Bobby"
+    assert rows[2].department_id == 2
+
+
+@pytest.mark.parametrize("upsert", [upsert_postgres, upsert_postgres_copy])
+def test_concurrent_uploads_of_the_same_ids_keep_rollup_consistent(pg_engine, upsert):
+    def hires(start):
+        ids = range(start, start + 300)
+        return pd.DataFrame({"id": ids, "name": "x", "datetime": pd.Timestamp("2021-02-01"), "department_id": 1, "job_id": 1})
+
+    for round_ in range(3):
+        # Four writers start together on the same new ids, as parallel uploads would
+        barrier = threading.Barrier(4)
+
+        def write():
+            barrier.wait()
+            upsert.upsert_dataframe(hires(round_ * 1000), HiredEmployee, engine=pg_engine)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            for future in [pool.submit(write) for _ in range(4)]:
+                future.result()
+
+    with pg_engine.connect() as conn:
+        assert rollup.diff_rollup(conn).empty
+        assert conn.execute(select(HiredEmployeeQuarterly.hired_count)).scalars().all() == [900]
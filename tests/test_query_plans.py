@@ -0,0 +1,54 @@
+import os
+import pytest
+from sqlmodel import SQLModel, create_engine
+from app.utils import stats_sql
+
+
+# -------------------------------------------------------------------
+# EXPLAIN checks: the year filter of every stats query must be served
+# by the hiredemployee datetime index, never by a full table scan
+# -------------------------------------------------------------------
+
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+
+def explain(conn, query, prefix):
+    sql = str(query.compile(conn, compile_kwargs={"literal_binds": True}))
+    return "\n".join(str(row[-1]) for row in conn.exec_driver_sql(f"{prefix} {sql}"))
+
+
+@pytest.mark.parametrize("build", [
+    stats_sql.hired_employees_stats_query,
+    stats_sql.top_departments_query,
+    lambda year: stats_sql.hired_employees_series_query(year - 5, year, "week"),
+])
+def test_sqlite_stats_use_datetime_index(build):
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with engine.connect() as conn:
+        plan = explain(conn, build(2023), "EXPLAIN QUERY PLAN")
+    assert "SEARCH hiredemployee USING COVERING INDEX ix_hiredemployee_datetime_department_id_job_id" in plan
+    assert not any(line.split()[:2] == ["SCAN", "hiredemployee"] for line in plan.splitlines())
+
+
+@pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+@pytest.mark.parametrize("build", [
+    stats_sql.hired_employees_stats_query,
+    stats_sql.top_departments_query,
+    lambda year: stats_sql.hired_employees_series_query(year - 5, year, "week"),
+])
+def test_postgres_stats_use_datetime_index(build):
+    engine = create_engine(TEST_POSTGRES_URL)
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    try:
+        with engine.connect() as conn:
+            # An empty table is cheapest to seq-scan; take that option away so
+            # the plan shows whether an index is usable at all
+            conn.exec_driver_sql("SET enable_seqscan = off")
+            plan = explain(conn, build(2023), "EXPLAIN")
+        assert "ix_hiredemployee_datetime_department_id_job_id" in plan
+        assert "Seq Scan on hiredemployee" not in plan
+    finally:
+        SQLModel.metadata.drop_all(engine)
+        engine.dispose()
@@ -0,0 +1,237 @@
+import io
+import sqlite3
+import time
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+from sqlmodel import SQLModel, create_engine
+from app.main import create_app
+from app.models import HiredEmployee
+from app.utils import stats_inmemory, stats_sql, upsert_sqlite
+from app.utils.replicas import bump_generation
+
+
+def sqlite_engine(path):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def replicate(primary_path, replica, replica_path):
+    # Stands in for streaming replication: the replica becomes a copy of the primary
+    replica.dispose()
+    with sqlite3.connect(primary_path) as source, sqlite3.connect(replica_path) as target:
+        source.backup(target)
+
+
+def served_by(engine):
+    """Record the quarterly and top-departments stats statements an engine runs."""
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "hiredemployee_descriptions" in statement or "base_query" in statement:
+            statements.append(statement)
+
+    return statements
+
+
+def eventually(get, expected, timeout=5.0):
+    """`get()` once it returns `expected` (stats_inmemory reloads in the background), else its last value."""
+    deadline = time.monotonic() + timeout
+    while (value := get()) != expected and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return value
+
+
+def upload(client, table, content):
+    response = client.post(f"/upload/{table}", files={"file": (f"{table}.csv", io.BytesIO(content.encode()), "text/csv")})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.fixture
+def databases(tmp_path):
+    paths = {name: tmp_path / f"{name}.db" for name in ("primary", "replica_a", "replica_b")}
+    engines = {name: sqlite_engine(path) for name, path in paths.items()}
+    yield paths, engines
+    for engine in engines.values():
+        engine.dispose()
+
+
+def make_client(primary, read_engines):
+    app = create_app(
+        engine_override=primary,
+        read_engines=read_engines,
+        stats_function=stats_sql,
+        upsert_function=upsert_sqlite,
+        parse_executor="thread",
+        stats_cache_size=0,
+    )
+    return TestClient(app)
+
+
+def test_reads_follow_writes_then_move_to_replicas(databases):
+    paths, engines = databases
+    primary, replica_a, replica_b = engines["primary"], engines["replica_a"], engines["replica_b"]
+    on_primary, on_a, on_b = served_by(primary), served_by(replica_a), served_by(replica_b)
+
+    with make_client(primary, [replica_a, replica_b]) as client:
+        # Startup warmup ran each statement once on every engine
+        for statements in (on_primary, on_a, on_b):
+            statements.clear()
+        upload(client, "departments", "id,department\n1,Sales\n")
+        upload(client, "jobs", "id,job\n1,Engineer\n")
+        report = upload(client, "hired_employees", "id,name,datetime,department_id,job_id\n1,Alice,2021-02-01,1,1\n")
+        assert report["generation"] == 3
+        # Writes never reach the replicas
+        with replica_a.connect() as connection:
+            assert connection.execute(text("SELECT count(*) FROM hiredemployee")).scalar() == 0
+
+        # Replicas are behind this process's writes, so the primary answers
+        for _ in range(4):
+            assert client.get("/stats/hired_employees/2021").json()[0]["Q1"] == 1
+        assert len(on_primary) == 4 and not on_a and not on_b
+
+        for name in ("replica_a", "replica_b"):
+            replicate(paths["primary"], engines[name], paths[name])
+        on_primary.clear()
+        for _ in range(4):
+            assert client.get("/stats/hired_employees/2021").json()[0]["Q1"] == 1
+        # Caught up: round robin over both replicas
+        assert not on_primary and len(on_a) == 2 and len(on_b) == 2
+
+        # A generation from elsewhere (another worker's upload) is honoured too
+        on_a.clear()
+        on_b.clear()
+        assert client.get("/stats/top_departments/2021", headers={"X-Min-Generation": "4"}).status_code == 200
+        assert len(on_primary) == 1 and not on_a and not on_b
+        assert client.get("/stats/top_departments/2021", headers={"X-Min-Generation": "x"}).status_code == 400
+
+
+def test_unreachable_replica_fails_over(databases, tmp_path):
+    paths, engines = databases
+    primary, replica_a = engines["primary"], engines["replica_a"]
+    missing = create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    on_primary, on_a = served_by(primary), served_by(replica_a)
+
+    with make_client(primary, [missing, replica_a]) as client:
+        on_primary.clear()
+        on_a.clear()
+        for _ in range(4):
+            assert client.get("/stats/hired_employees/2021").status_code == 200
+        assert len(on_a) == 4 and not on_primary
+        replicas = client.get("/internal/pool").json()["replicas"]
+        assert [r["healthy"] for r in replicas] == [False, True]
+
+        # With every replica down, the primary serves
+        client.app.state.read_router.mark_down(replica_a)
+        assert client.get("/stats/hired_employees/2021").status_code == 200
+        assert len(on_primary) == 1
+
+
+def test_inmemory_stats_on_replicas_follow_uploads(databases):
+    paths, engines = databases
+    primary, replica_a = engines["primary"], engines["replica_a"]
+    app = create_app(
+        engine_override=primary,
+        read_engines=[replica_a],
+        stats_function=stats_inmemory,
+        upsert_function=upsert_sqlite,
+        parse_executor="thread",
+        stats_cache_size=0,
+    )
+    hires = "id,name,datetime,department_id,job_id\n"
+    with TestClient(app) as client:
+        upload(client, "departments", "id,department\n1,Sales\n")
+        upload(client, "jobs", "id,job\n1,Engineer\n")
+        upload(client, "hired_employees", hires + "1,Alice,2021-02-01,1,1\n")
+        replicate(paths["primary"], replica_a, paths["replica_a"])
+        on_a = served_by(replica_a)
+        assert client.get("/stats/hired_employees/2021").json()[0]["Q1"] == 1
+
+        # Once the replica has the next upload too, reads go back to it and
+        # see the upload through the one snapshot the uploads update
+        upload(client, "hired_employees", hires + "2,Bob,2021-03-01,1,1\n")
+        replicate(paths["primary"], replica_a, paths["replica_a"])
+        assert client.get("/stats/hired_employees/2021").json()[0]["Q1"] == 2
+        assert client.app.state.read_router.status()[0]["generation"] == 4
+    assert replica_a not in stats_inmemory._stores
+    assert not on_a
+
+
+def test_cached_stats_honour_min_generation(databases):
+    primary = databases[1]["primary"]
+    app = create_app(
+        engine_override=primary, stats_function=stats_sql, upsert_function=upsert_sqlite, parse_executor="thread",
+        generation_poll_interval=3600,
+    )
+    with TestClient(app) as client:
+        upload(client, "departments", "id,department\n1,Sales\n")
+        upload(client, "jobs", "id,job\n1,Engineer\n")
+        assert client.get("/stats/hired_employees/2021").json() == []
+
+        # Another worker's upload, before this process polls for it
+        hires = pd.DataFrame({
+            "id": [1], "name": ["Alice"], "datetime": pd.to_datetime(["2021-02-01"]), "department_id": [1], "job_id": [1],
+        })
+        upsert_sqlite.upsert_dataframe(hires, HiredEmployee, engine=primary)
+        generation = bump_generation(primary)
+        assert client.get("/stats/hired_employees/2021").json() == []
+        response = client.get("/stats/hired_employees/2021", headers={"X-Min-Generation": str(generation)})
+        assert response.json()[0]["Q1"] == 1
+
+
+@pytest.mark.parametrize("stats_module", [stats_sql, stats_inmemory])
+def test_workers_see_each_others_uploads(databases, stats_module):
+    def worker():
+        # A second engine on the same file, as another worker process would have
+        engine = sqlite_engine(databases[0]["primary"])
+        app = create_app(
+            engine_override=engine, stats_function=stats_module, upsert_function=upsert_sqlite,
+            parse_executor="thread", generation_poll_interval=0,
+        )
+        return TestClient(app), engine
+
+    (writer, writer_engine), (reader, reader_engine) = worker(), worker()
+    with writer, reader:
+        upload(writer, "departments", "id,department\n1,Sales\n")
+        upload(writer, "jobs", "id,job\n1,Engineer\n")
+        # The reader caches (and for stats_inmemory loads) the data as it is now
+        assert reader.get("/stats/hired_employees/2021").json() == []
+        def q1():
+            rows = reader.get("/stats/hired_employees/2021").json()
+            return rows[0]["Q1"] if rows else 0
+
+        upload(writer, "hired_employees", "id,name,datetime,department_id,job_id\n1,Alice,2021-02-01,1,1\n")
+        assert eventually(q1, 1) == 1
+        upload(writer, "hired_employees", "id,name,datetime,department_id,job_id\n2,Bob,2021-03-01,1,1\n")
+        assert eventually(q1, 2) == 2
+    for engine in (writer_engine, reader_engine):
+        engine.dispose()
+
+
+def test_other_workers_writes_leave_reads_on_replicas(databases):
+    paths, engines = databases
+    replica_a = engines["replica_a"]
+    writer = make_client(engines["primary"], [])
+    # The reader is another worker process: its own engine on the primary's file
+    reader_primary = sqlite_engine(paths["primary"])
+    reader = TestClient(create_app(
+        engine_override=reader_primary, read_engines=[replica_a], stats_function=stats_sql,
+        upsert_function=upsert_sqlite, parse_executor="thread", generation_poll_interval=0,
+    ))
+    on_primary, on_a = served_by(reader_primary), served_by(replica_a)
+    with writer, reader:
+        upload(writer, "departments", "id,department\n1,Sales\n")
+        replicate(paths["primary"], replica_a, paths["replica_a"])
+        on_primary.clear()
+        on_a.clear()
+        # The replica is behind the writer's upload: the reader notices it, and
+        # keeps reading from the replica all the same
+        upload(writer, "jobs", "id,job\n1,Engineer\n")
+        assert reader.get("/stats/top_departments/2021").status_code == 200
+        assert reader.app.state.read_router.observed == 2
+        assert len(on_a) == 1 and not on_primary
+    reader_primary.dispose()
@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+from sqlmodel import SQLModel, Session, create_engine
+from sqlalchemy.pool import StaticPool
+from app.models import HiredEmployee, Department, Job
+from app.utils import rollup, stats_rollup, stats_sqlite, upsert_sqlite
+
+
+@pytest.fixture(scope="function")
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    upsert_sqlite.upsert_dataframe(
+        pd.DataFrame({"id": [1, 2, 3], "department": ["Engineering", "HR", "Sales"]}), Department, engine=engine
+    )
+    upsert_sqlite.upsert_dataframe(
+        pd.DataFrame({"id": [1, 2], "job": ["Developer", "Manager"]}), Job, engine=engine
+    )
+    yield engine
+    engine.dispose()
+
+
+def hires(rows):
+    df = pd.DataFrame(rows, columns=["id", "name", "datetime", "department_id", "job_id"])
+    df["datetime"] = pd.to_datetime(df["datetime"])
+    return df
+
+
+def test_rollup_tracks_inserts_updates_and_moves(engine):
+    upsert_sqlite.upsert_dataframe(hires([
+        (1, "Alice", "2023-01-15", 1, 1),
+        (2, "Bob", "2023-04-20", 2, 2),
+        (3, "Charlie", "2023-05-01", 2, 1),
+        (4, "Diana", None, 1, 1),
+        (5, "Eve", "2022-11-30", 3, None),
+    ]), HiredEmployee, engine=engine)
+    # Move Bob to another quarter and department, Charlie to another year,
+    # date Diana, and upload Eve twice (the last row wins)
+    upsert_sqlite.upsert_dataframe(hires([
+        (2, "Bob", "2023-08-20", 1, 2),
+        (3, "Charlie", "2024-02-01", 2, 1),
+        (4, "Diana", "2023-01-02", 1, 1),
+        (5, "Eve", "2022-11-30", 3, 1),
+        (5, "Eve", "2023-03-30", 3, 1),
+    ]), HiredEmployee, engine=engine)
+
+    with engine.connect() as conn:
+        assert rollup.diff_rollup(conn).empty
+    # A snapshot without Charlie and Diana takes them out of their buckets
+    upsert_sqlite.delete_missing(HiredEmployee, [1, 2, 5], engine=engine)
+    with engine.connect() as conn:
+        assert rollup.diff_rollup(conn).empty
+    with Session(engine) as session:
+        for year in (2022, 2023, 2024):
+            assert stats_rollup.get_hired_employees_stats(year, session) == stats_sqlite.get_hired_employees_stats(year, session)
+            assert stats_rollup.get_top_departments(year, session) == stats_sqlite.get_top_departments(year, session)
+
+
+def test_rollup_check_detects_and_repairs_drift(engine):
+    upsert_sqlite.upsert_dataframe(hires([(1, "Alice", "2023-01-15", 1, 1)]), HiredEmployee, engine=engine)
+    # Hires written without rollup maintenance leave the rollup behind
+    upsert_sqlite.upsert_dataframe(hires([(2, "Bob", "2023-02-15", 1, 1)]), HiredEmployee, engine=engine, rollup=False)
+
+    with engine.begin() as conn:
+        mismatches = rollup.diff_rollup(conn)
+        assert mismatches.to_dict(orient="records") == [
+            {"year": 2023, "quarter": 1, "department_id": 1, "job_id": 1, "hired_count_expected": 2, "hired_count_actual": 1}
+        ]
+        rollup.rebuild_rollup(conn)
+        assert rollup.diff_rollup(conn).empty
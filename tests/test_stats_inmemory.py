@@ -0,0 +1,157 @@
+import io
+import threading
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, Session, create_engine
+from sqlalchemy.pool import StaticPool
+from app.main import create_app
+from app.models import HiredEmployee, Department, Job
+from app.utils import schema, stats_inmemory, stats_sqlite, upsert_sqlite
+from benchmarks import generate
+
+YEARS = range(2014, 2026)
+
+
+@pytest.fixture(scope="function")
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def assert_same_results(engine):
+    with Session(engine) as session:
+        for year in YEARS:
+            assert stats_inmemory.get_hired_employees_stats(year, session) == stats_sqlite.get_hired_employees_stats(year, session)
+            assert stats_inmemory.get_top_departments(year, session) == stats_sqlite.get_top_departments(year, session)
+        for granularity in ("quarter", "month", "week"):
+            assert stats_inmemory.get_hired_employees_series(2015, 2024, granularity, session) == (
+                stats_sqlite.get_hired_employees_series(2015, 2024, granularity, session)
+            )
+
+
+def upsert(engine, df, model):
+    upsert_sqlite.upsert_dataframe(df, model, engine=engine)
+    stats_inmemory.after_upsert(df, model, engine)
+
+
+def test_inmemory_matches_sql_on_generated_data(engine):
+    assert_same_results(engine)
+    # Two departments share a name, so grouping by name is exercised too
+    departments = generate.departments()
+    departments.loc[departments["id"] == 12, "department"] = "Engineering"
+    upsert(engine, departments, Department)
+    # Leave some jobs out so the inner join drops their hires
+    upsert(engine, generate.jobs().iloc[:-10], Job)
+    for chunk in generate.hires(30_000, seed=7, chunk_size=10_000):
+        upsert(engine, chunk, HiredEmployee)
+    # Rewrite part of the data: moved hires must leave their old buckets
+    for chunk in generate.hires(12_000, seed=8, chunk_size=6_000):
+        upsert(engine, chunk, HiredEmployee)
+    assert_same_results(engine)
+    # A snapshot upload that drops every third hire and two departments
+    for model, ids in ((HiredEmployee, [i for i in range(1, 30_001) if i % 3]), (Department, list(range(1, 11)))):
+        deleted = upsert_sqlite.delete_missing(model, ids, engine=engine)
+        stats_inmemory.after_delete(deleted, model, engine)
+    assert_same_results(engine)
+    stats_inmemory.reload(engine)
+    assert_same_results(engine)
+
+
+def test_inmemory_snapshot_follows_uploads(engine):
+    app = create_app(engine_override=engine, stats_function=stats_inmemory, upsert_function=upsert_sqlite, stats_cache_size=0)
+    with TestClient(app) as c:
+        c.post("/upload/departments", files={"file": ("d.csv", io.BytesIO(b"id,department\n1,Engineering\n2,HR\n"), "text/csv")})
+        c.post("/upload/jobs", files={"file": ("j.csv", io.BytesIO(b"id,job\n1,Developer\n"), "text/csv")})
+        hired = b"id,name,datetime,department_id,job_id\n1,Alice,2023-02-16,1,1\n2,Bob,2023-05-01,2,1\n"
+        c.post("/upload/hired_employees", files={"file": ("h.csv", io.BytesIO(hired), "text/csv")})
+        # Loaded lazily here, then updated in place by the uploads below
+        assert c.get("/stats/hired_employees/2023").json() == [
+            {"department": "Engineering", "job": "Developer", "Q1": 1, "Q2": 0, "Q3": 0, "Q4": 0},
+            {"department": "HR", "job": "Developer", "Q1": 0, "Q2": 1, "Q3": 0, "Q4": 0},
+        ]
+
+        # An update moving a hire, a new hire and a renamed department
+        hired = b"id,name,datetime,department_id,job_id\n2,Bob,2023-08-01,1,1\n3,Carla,2022-12-31T23:59:59,2,1\n"
+        c.post("/upload/hired_employees", files={"file": ("h.csv", io.BytesIO(hired), "text/csv")})
+        c.post("/upload/departments", files={"file": ("d.csv", io.BytesIO(b"id,department\n2,People\n"), "text/csv")})
+        assert c.get("/stats/hired_employees/2023").json() == [
+            {"department": "Engineering", "job": "Developer", "Q1": 1, "Q2": 0, "Q3": 1, "Q4": 0},
+        ]
+        assert_same_results(engine)
+
+
+def test_external_writes_reload_in_the_background(engine, monkeypatch):
+    upsert(engine, generate.departments(), Department)
+    upsert(engine, generate.jobs(), Job)
+    before = stats_inmemory.snapshot(engine)
+
+    def hire(i, datetime):
+        return pd.DataFrame({
+            "id": [i], "name": ["Alice"], "datetime": pd.to_datetime([datetime]), "department_id": [1], "job_id": [1],
+        })
+
+    # Another process's write goes straight to the database
+    upsert_sqlite.upsert_dataframe(hire(1, "2020-01-01"), HiredEmployee, engine=engine)
+    loaded, release, reloaded = threading.Event(), threading.Event(), threading.Event()
+    load = stats_inmemory._Store.load
+
+    def held_load(store, engine):
+        load(store, engine)
+        loaded.set()
+        release.wait(5)
+
+    monkeypatch.setattr(stats_inmemory._Store, "load", held_load)
+    stats_inmemory.after_external_write(engine, on_reload=reloaded.set)
+    assert loaded.wait(5)
+    # Reads keep the current snapshot while the new one is built...
+    assert stats_inmemory.snapshot(engine) is before
+    # ...and this process's writes after the load are replayed onto it
+    upsert(engine, hire(2, "2020-05-01"), HiredEmployee)
+    release.set()
+    assert reloaded.wait(5)
+    assert stats_inmemory.snapshot(engine).ids.tolist() == [1, 2]
+    assert_same_results(engine)
+
+
+def test_cube_covers_only_the_months_of_the_data(engine, caplog):
+    upsert(engine, generate.departments(), Department)
+    upsert(engine, generate.jobs(), Job)
+    hires = pd.DataFrame({
+        "id": [1, 2, 3],
+        "name": ["Alice", "Bob", "Carla"],
+        "datetime": pd.to_datetime(["2015-03-01", "2015-04-01", "1850-01-01"]),
+        "department_id": [1, 1, 1],
+        "job_id": [1, 1, 1],
+    })
+    # Uploads accept the 1850 hire; the cube leaves it out, counted and logged
+    assert schema.validate(hires, HiredEmployee)[1].empty
+    stats_inmemory.snapshot(engine)
+    with caplog.at_level("WARNING", logger="app.stats_inmemory"):
+        upsert(engine, hires, HiredEmployee)
+    assert "1 hires before 1900 or after 2099" in caplog.text
+    snap = stats_inmemory.snapshot(engine)
+    assert snap.monthly.shape[0] == 2
+    assert snap.outside_cube == 1
+
+    # A wide range allocates only the years that have data
+    months, offset = stats_inmemory._months(snap, 1900, 2099)
+    assert (months.shape[0], offset) == (12, (2015 - 1900) * 12)
+    assert stats_inmemory._months(snap, 1900, 1999)[0].shape[0] == 0
+    with Session(engine) as session:
+        for granularity in ("quarter", "month"):
+            assert stats_inmemory.get_hired_employees_series(1900, 2099, granularity, session) == (
+                stats_sqlite.get_hired_employees_series(1900, 2099, granularity, session)
+            )
+        assert stats_inmemory.get_hired_employees_stats(1999, session) == []
+        assert stats_inmemory.get_top_departments(1999, session) == []
+
+    # Writes inside the cube's bounds update it in place; one after it grows it
+    upsert(engine, hires.iloc[:2].assign(datetime=pd.to_datetime(["2015-04-01", "2015-03-01"])), HiredEmployee)
+    assert stats_inmemory.snapshot(engine).monthly is snap.monthly
+    upsert(engine, hires.iloc[2:].assign(datetime=pd.to_datetime(["2016-01-01"])), HiredEmployee)
+    grown = stats_inmemory.snapshot(engine)
+    assert grown.monthly.shape[0] == 11 and grown.outside_cube == 0
+    assert_same_results(engine)
@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import SQLModel, Session, create_engine
+from app.database import connect_args_from_env
+from app.utils import stats_sql
+
+
+@pytest.fixture(scope="function")
+def engine():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_stats_statements_compile_once(engine):
+    cache_hits = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        cache_hits.append(context.cache_hit == context.dialect.CACHE_HIT)
+
+    with Session(engine) as session:
+        for year in (2020, 2021, 2022):
+            stats_sql.get_hired_employees_stats(year, session)
+            stats_sql.get_top_departments(year, session)
+            stats_sql.get_hired_employees_series(year - 2, year, "week", session)
+            stats_sql.get_hired_employees(session, after_id=year, limit=10, department_id=1)
+    # Only the first request of each kind compiles
+    assert cache_hits == [False] * 4 + [True] * 8
+
+
+def test_query_builders_bind_values():
+    query = stats_sql.hired_employees_query(after_id=5, year=2021, job_id=3)
+    # Different values, same statement
+    assert query._generate_cache_key() == stats_sql.hired_employees_query(after_id=6, year=2020, job_id=4)._generate_cache_key()
+    compiled = query.compile(dialect=sqlite.dialect())
+    assert compiled.params == {"after_id": 5, "start": stats_sql.year_bounds(2021)[0], "end": stats_sql.year_bounds(2022)[0], "job_id": 3}
+
+
+@pytest.mark.parametrize("granularity,sql", [
+    ("quarter", "to_char(date_trunc('quarter', hiredemployee.datetime), 'YYYY-MM-DD')"),
+    ("week", "to_char(date_trunc('week', hiredemployee.datetime), 'YYYY-MM-DD')"),
+])
+def test_date_functions_compile_per_dialect(granularity, sql):
+    query = stats_sql.HIRED_EMPLOYEES_SERIES[granularity]
+    assert sql in str(query.compile(dialect=postgresql.dialect()))
+    assert "date_trunc" not in str(query.compile(dialect=sqlite.dialect()))
+    assert "EXTRACT(quarter FROM" in str(stats_sql.HIRED_EMPLOYEES_STATS.compile(dialect=postgresql.dialect()))
+
+
+def test_prepare_threshold_only_for_psycopg(monkeypatch):
+    monkeypatch.setenv("DB_PREPARE_THRESHOLD", "2")
+    assert connect_args_from_env("psycopg2") == {}
+    assert connect_args_from_env("psycopg") == {"prepare_threshold": 2}
+    monkeypatch.setenv("DB_PREPARE_THRESHOLD", "-1")
+    assert connect_args_from_env("psycopg") == {"prepare_threshold": None}
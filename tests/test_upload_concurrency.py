@@ -0,0 +1,85 @@
+import io
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, create_engine
+from app.database import set_sqlite_pragmas
+from app.main import create_app
+from app.models import HiredEmployee
+from app.utils import upsert_sqlite, stats_sqlite
+
+
+class PausingUpsert:
+    """upsert_sqlite that holds the write of the first hires chunk until released."""
+
+    delete_missing = staticmethod(upsert_sqlite.delete_missing)
+
+    def __init__(self):
+        self.paused = threading.Event()
+        self.release = threading.Event()
+        self.released_in_time = None
+
+    def upsert_dataframe(self, df, model, **kw):
+        result = upsert_sqlite.upsert_dataframe(df, model, **kw)
+        if model is HiredEmployee and not self.paused.is_set():
+            self.paused.set()
+            self.released_in_time = self.release.wait(timeout=30)
+        return result
+
+
+@pytest.fixture(scope="function")
+def upsert():
+    return PausingUpsert()
+
+
+@pytest.fixture(scope="function")
+def client(tmp_path, upsert):
+    engine = set_sqlite_pragmas(
+        create_engine(f"sqlite:///{tmp_path / 'concurrency.db'}", connect_args={"check_same_thread": False})
+    )
+    SQLModel.metadata.create_all(engine)
+    app = create_app(
+        engine_override=engine,
+        stats_function=stats_sqlite,
+        upsert_function=upsert,
+        stats_cache_size=0,
+        upload_chunk_bytes=64 * 1024,
+    )
+    with TestClient(app) as c:
+        yield c
+    engine.dispose()
+
+
+def test_stats_are_served_while_an_upload_is_writing(client, upsert):
+    client.post(
+        "/upload/departments",
+        files={"file": ("departments.csv", io.BytesIO(b"id,department\n1,Engineering\n2,HR\n"), "text/csv")},
+    )
+    client.post("/upload/jobs", files={"file": ("jobs.csv", io.BytesIO(b"id,job\n1,Developer\n"), "text/csv")})
+    rows = 20_000
+    csv_content = "id,name,datetime,department_id,job_id\n" + "".join(
+        f"{i},Employee {i},2023-{i % 12 + 1:02d}-15T09:30:00,{i % 2 + 1},1\n" for i in range(1, rows + 1)
+    )
+
+    upload_result = {}
+
+    def upload():
+        upload_result["response"] = client.post(
+            "/upload/hired_employees",
+            files={"file": ("hired.csv", io.BytesIO(csv_content.encode()), "text/csv")},
+        )
+
+    uploader = threading.Thread(target=upload)
+    uploader.start()
+    assert upsert.paused.wait(timeout=30)
+    # The upload is held inside a chunk write; stats must still be answered.
+    # With the upload on the event loop, these requests would wait for it
+    for _ in range(5):
+        assert client.get("/stats/top_departments/2023").status_code == 200
+    assert uploader.is_alive()
+    upsert.release.set()
+    uploader.join()
+
+    assert upsert.released_in_time
+    assert upload_result["response"].status_code == 200, upload_result["response"].text
+    assert upload_result["response"].json()["rows"] == rows
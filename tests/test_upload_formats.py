@@ -0,0 +1,130 @@
+import gzip
+import io
+import pytest
+from fastapi.testclient import TestClient
+from app.main import create_app
+from app.utils import stats_sqlite, upsert_sqlite
+from app.utils.ingest import UnsupportedUploadError, detect_format
+from tests.test_api import sqlite_file_engine, upload_references, wait_for_job
+
+HIRES_CSV = b"id,name,datetime,department_id,job_id\n1,Alice,2023-01-15,1,1\n2,Bob,2023-04-20,2,2\n3,Carol,2023-07-01,1,2\n"
+
+
+@pytest.fixture(scope="function")
+def client(tmp_path):
+    engine = sqlite_file_engine(tmp_path)
+    app = create_app(
+        engine_override=engine,
+        stats_function=stats_sqlite,
+        upsert_function=upsert_sqlite,
+        parse_executor="thread",
+        upload_chunk_bytes=64,
+        job_spool_dir=str(tmp_path / "spool"),
+    )
+    with TestClient(app) as c:
+        upload_references(c)
+        yield c
+    engine.dispose()
+
+
+def hire_ids(client):
+    return [row["id"] for row in client.get("/stats/inspect_hired_employees").json()]
+
+
+@pytest.mark.parametrize("head,filename,content_type,content_encoding,expected", [
+    (b"id,name", "hired.csv", "text/csv", None, ("csv", None)),
+    (b"\x1f\x8b\x08\x00", "hired.csv.gz", None, None, ("csv", "gzip")),
+    (b"\x1f\x8b\x08\x00", "upload", "application/octet-stream", None, ("csv", "gzip")),
+    (b"id,name", "hired.csv", "text/csv", "gzip", ("csv", "gzip")),
+    (b"\x28\xb5\x2f\xfd", "hired.csv.zst", None, None, ("csv", "zstd")),
+    (b"PAR1\x15\x04", "upload", None, None, ("parquet", None)),
+    (b"PAR1\x15\x04", "hired.parquet", None, None, ("parquet", None)),
+    (b"ARROW1\x00\x00", "upload", None, None, ("arrow", None)),
+    (b"\xff\xff\xff\xff", "hired.arrows", "application/vnd.apache.arrow.stream", None, ("arrow", None)),
+])
+def test_detect_format(head, filename, content_type, content_encoding, expected):
+    assert detect_format(head, filename, content_type, content_encoding) == expected
+
+
+def test_detect_format_rejects_unknown_encoding():
+    with pytest.raises(UnsupportedUploadError):
+        detect_format(b"id", "hired.csv", "text/csv", "br")
+
+
+def test_gzip_csv_upload_is_streamed(client):
+    # Two gzip members split mid-record, read 64 decompressed bytes at a time
+    payload = gzip.compress(HIRES_CSV[:50]) + gzip.compress(HIRES_CSV[50:])
+    response = client.post("/upload/hired_employees", files={"file": ("hired.csv.gz", io.BytesIO(payload), "application/gzip")})
+    assert response.status_code == 200, response.text
+    assert response.json()["rows"] == 3
+    assert hire_ids(client) == [1, 2, 3]
+
+
+def test_gzip_content_encoding_and_async_upload(client):
+    response = client.post(
+        "/upload/hired_employees?async=true",
+        files={"file": ("hired.csv", io.BytesIO(gzip.compress(HIRES_CSV)), "text/csv", {"Content-Encoding": "gzip"})},
+    )
+    assert response.status_code == 202, response.text
+    job = wait_for_job(client, response.json()["job_id"])
+    assert job["state"] == "succeeded", job
+    assert job["rows_processed"] == 3
+
+
+def test_bad_compressed_uploads(client):
+    truncated = gzip.compress(HIRES_CSV)[:-12]
+    response = client.post("/upload/hired_employees", files={"file": ("hired.csv.gz", io.BytesIO(truncated), "application/gzip")})
+    assert response.status_code == 400
+    assert "decompress" in response.json()["detail"]
+    response = client.post(
+        "/upload/hired_employees",
+        files={"file": ("hired.csv", io.BytesIO(HIRES_CSV), "text/csv", {"Content-Encoding": "br"})},
+    )
+    assert response.status_code == 415
+
+
+def test_zstd_csv_upload(client):
+    zstandard = pytest.importorskip("zstandard")
+    payload = zstandard.ZstdCompressor().compress(HIRES_CSV)
+    response = client.post("/upload/hired_employees", files={"file": ("hired.csv.zst", io.BytesIO(payload), "application/zstd")})
+    assert response.status_code == 200, response.text
+    assert hire_ids(client) == [1, 2, 3]
+
+
+def hires_table(pa):
+    return pa.table({
+        "id": pa.array([1, 2, 3], pa.int64()),
+        "name": ["Alice", "Bob", None],
+        "datetime": pa.array([1673740800, 1681948800, None], pa.timestamp("s")),
+        "department_id": pa.array([1, 2, 9], pa.int32()),
+        "job_id": pa.array([1, None, 2], pa.int64()),
+        "extra": ["x", "y", "z"],
+    })
+
+
+def test_parquet_upload_by_row_group(client):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+    buffer = io.BytesIO()
+    pq.write_table(hires_table(pa), buffer, row_group_size=2)
+    response = client.post("/upload/hired_employees", files={"file": ("hired.parquet", io.BytesIO(buffer.getvalue()), "application/octet-stream")})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    # Department 9 is unknown; the hire without a job is still loaded
+    assert body["rows"] == 2 and body["rejected"]["by_reason"] == {"department_id: unknown department": 1}
+    assert hire_ids(client) == [1, 2]
+
+
+@pytest.mark.parametrize("random_access", [False, True])
+def test_arrow_upload(client, random_access):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+    table = hires_table(pa)
+    buffer = io.BytesIO()
+    new_writer = pa.ipc.new_file if random_access else pa.ipc.new_stream
+    with new_writer(buffer, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=1):
+            writer.write_batch(batch)
+    response = client.post("/upload/hired_employees", files={"file": ("upload", io.BytesIO(buffer.getvalue()), "application/octet-stream")})
+    assert response.status_code == 200, response.text
+    assert hire_ids(client) == [1, 2]
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sqlmodel import SQLModel, Session, create_engine, select, func
+from app.database import set_sqlite_pragmas
+from app.models import HiredEmployee
+from app.utils import upsert_sqlite
+
+
+@pytest.fixture(scope="function")
+def sqlite_engine(tmp_path):
+    engine = set_sqlite_pragmas(create_engine(f"sqlite:///{tmp_path / 'upsert.db'}"))
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def make_hires(rows: int) -> pd.DataFrame:
+    ids = np.arange(1, rows + 1)
+    return pd.DataFrame({
+        "id": ids,
+        "name": "Employee " + pd.Series(ids).astype(str),
+        "datetime": pd.Timestamp("2020-01-01") + pd.to_timedelta(ids, unit="min"),
+        "department_id": ids % 12 + 1,
+        "job_id": ids % 183 + 1,
+    })
+
+
+def test_pragmas_are_applied(sqlite_engine):
+    with sqlite_engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+
+
+def test_upsert_batches_inserts_and_updates(sqlite_engine):
+    df = make_hires(25)
+    df.loc[3, "datetime"] = pd.NaT
+    upsert_sqlite.upsert_dataframe(df, HiredEmployee, batch_size=10, engine=sqlite_engine)
+    upsert_sqlite.upsert_dataframe(df.iloc[:2].assign(name="Renamed"), HiredEmployee, batch_size=10, engine=sqlite_engine)
+
+    with Session(sqlite_engine) as session:
+        rows = {r.id: r for r in session.exec(select(HiredEmployee))}
+    assert len(rows) == 25
+    assert rows[1].name == rows[2].name == "Renamed"
+    assert rows[3].name == "Employee 3"
+    assert rows[4].datetime is None
+    assert rows[5].datetime == df.loc[4, "datetime"].to_pydatetime()
+
+
+def test_upsert_skips_unchanged_rows_and_deletes_missing(sqlite_engine):
+    df = make_hires(30)
+    df.loc[5, "job_id"] = None
+    assert upsert_sqlite.upsert_dataframe(df, HiredEmployee, batch_size=7, engine=sqlite_engine) == {
+        "inserted": 30, "updated": 0, "unchanged": 0,
+    }
+    changed = pd.concat([df.iloc[:10], make_hires(32).iloc[30:]], ignore_index=True)
+    changed.loc[2, "name"] = "Renamed"
+    changed.loc[4, "department_id"] = None
+    changed.loc[5, "job_id"] = 1
+    assert upsert_sqlite.upsert_dataframe(changed, HiredEmployee, batch_size=7, engine=sqlite_engine) == {
+        "inserted": 2, "updated": 3, "unchanged": 7,
+    }
+
+    deleted = upsert_sqlite.delete_missing(HiredEmployee, changed["id"].to_numpy(), engine=sqlite_engine, batch_size=7)
+    assert deleted.tolist() == list(range(11, 31))
+    with Session(sqlite_engine) as session:
+        assert session.exec(select(func.count()).select_from(HiredEmployee)).one() == 12